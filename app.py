@@ -3,17 +3,39 @@
 #----------------------------------------------------------------------------#
 
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify
+import base64
+import hashlib
+import hmac
+import itertools
+import os
+import random
+from datetime import date, datetime, timedelta, timezone
+from flask import Flask, Blueprint, render_template, request, Response, flash, redirect, url_for, jsonify, abort, stream_with_context
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 import logging
+import click
 from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
-from flask_migrate import Migrate
+from choices import GENRES
+from search import Searcher
+import formatting
+# importer, exporter, dataset, benchmark and partitioning are imported by
+# the commands and views that use them, so web workers never load them;
+# scheduling and availability by the routes that use them, on first use
+import pool
+import assets
+import warmup
+from metrics import Metrics
+from cache import PageCache, conditional
+from compression import Compressor
+from sqlalchemy import cast, event, select, tuple_
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.sql import func
+try:
+  import orjson
+except ImportError:
+  orjson = None
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -25,7 +47,18 @@ app.config.from_object('config')
 
 
 db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+pool.init_app(app, db)
+if os.environ.get('FLASK_RUN_FROM_CLI'):
+  # alembic is only needed by 'flask db'; web workers never load it
+  from flask_migrate import Migrate
+  migrate = Migrate(app, db)
+page_cache = PageCache(app)
+metrics = Metrics(app, db.engine)
+metrics.collector(page_cache.prometheus)
+metrics.collector(lambda: pool.prometheus(db.engine))
+# registered after metrics, so response sizes are measured compressed
+compressor = Compressor(app)
+metrics.collector(compressor.prometheus)
 
 #----------------------------------------------------------------------------#
 # Models.
@@ -33,6 +66,9 @@ migrate = Migrate(app, db)
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_venue_state_city_name_id', 'state', 'city', 'name', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -46,10 +82,17 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
     website = db.Column(db.String(120))
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, server_default='0')
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=func.timezone('utc', func.now()))
     shows = db.relationship('Show', backref='venue', lazy=True, cascade="all,delete")
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_artist_name_id', 'name', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -62,29 +105,503 @@ class Artist(db.Model):
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, server_default='0')
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=func.timezone('utc', func.now()))
     shows = db.relationship('Show', backref='artist', lazy=True, cascade="all,delete")
 
 class Show(db.Model):
   __tablename__ = 'Show'
-
+  __table_args__ = (
+    db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+    db.Index('ix_show_start_time_id', 'start_time', 'id'),
+  )
+
+  # partitioned by start_time month on PostgreSQL, where the primary key is
+  # (id, start_time); id alone still identifies a show (see partitioning.py)
   id = db.Column(db.Integer, primary_key=True)
   venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'))
   artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'))
-  start_time = db.Column(db.DateTime)
+  start_time = db.Column(db.DateTime, nullable=False)
+  version = db.Column(db.Integer, nullable=False, server_default='1')
+  updated_at = db.Column(db.DateTime, nullable=False, server_default=func.timezone('utc', func.now()))
+
+# version and updated_at (UTC) are maintained by database triggers (see the
+# row_and_table_versions and utc_updated_at migrations), which also bump
+# TableVersion on every statement that writes to Venue, Artist or Show
+class TableVersion(db.Model):
+  __tablename__ = 'table_versions'
+
+  name = db.Column(db.String(64), primary_key=True)
+  version = db.Column(db.BigInteger, nullable=False, server_default='1')
+  updated_at = db.Column(db.DateTime, nullable=False, server_default=func.timezone('utc', func.now()))
+
+# upcoming_shows_count / past_shows_count on Venue and Artist split shows at
+# rolled_to; triggers keep them exact on every Show write and
+# 'flask roll-counters' advances rolled_to (see the show_counters migration)
+class ShowCounters(db.Model):
+  __tablename__ = 'show_counters'
+
+  id = db.Column(db.Integer, primary_key=True)
+  rolled_to = db.Column(db.DateTime, nullable=False, server_default=func.now())
+
+# shows per venue and UTC day, kept by triggers on Show (see the show_days
+# migration); the /shows calendar reads these instead of Show
+class ShowDay(db.Model):
+  __tablename__ = 'show_days'
+  __table_args__ = (
+    db.Index('ix_show_days_day_venue_id', 'day', 'venue_id'),
+  )
+
+  venue_id = db.Column(db.Integer, primary_key=True)
+  day = db.Column(db.Date, primary_key=True)
+  shows = db.Column(db.Integer, nullable=False)
+
+# last input record committed by a bulk import, per import source
+class ImportCheckpoint(db.Model):
+  __tablename__ = 'import_checkpoints'
+
+  source = db.Column(db.String, primary_key=True)
+  record = db.Column(db.Integer, nullable=False)
+  updated_at = db.Column(db.DateTime, nullable=False, server_default=func.now())
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+def is_upcoming():
+  # a show starting exactly now is upcoming; everything earlier is past
+  return Show.start_time >= func.now()
+
+def history_criteria():
+  # the past shows detail pages list: those of the last SHOW_HISTORY_DAYS,
+  # which lets the planner skip every older partition of Show, or all of
+  # them when it is None
+  days = app.config['SHOW_HISTORY_DAYS']
+  return [] if days is None else [Show.start_time >= datetime.utcnow() - timedelta(days=days)]
+
+def limit_history(data, entity):
+  # with SHOW_HISTORY_DAYS the past list is cut short: the maintained
+  # counter gives the full count, and the page says how far back it lists
+  days = app.config['SHOW_HISTORY_DAYS']
+  if days is not None:
+    data["past_shows_count"] = entity.past_shows_count
+    data["past_shows_days"] = days
+
+def split_shows(rows, *fields):
+  # partition detail-page rows (one per show, or a single show-less row)
+  # into past and upcoming lists, judged by the database's now()
+  shows = {"past_shows": [], "upcoming_shows": []}
+  for row in rows:
+    if row.start_time is None:
+      continue
+    show = {field: getattr(row, field) for field in fields}
+    show["start_time"] = row.start_time
+    shows["upcoming_shows" if row.upcoming else "past_shows"].append(show)
+  shows["past_shows_count"] = len(shows["past_shows"])
+  shows["upcoming_shows_count"] = len(shows["upcoming_shows"])
+  return shows
+
+def venues_with_upcoming_counts(*criteria):
+  # every venue with its maintained upcoming show count, ordered so that
+  # venues of the same area are adjacent
+  return select(Venue.id, Venue.name, Venue.city, Venue.state,
+      Venue.upcoming_shows_count.label('num_upcoming_shows')) \
+    .where(*criteria) \
+    .order_by(Venue.state, Venue.city, Venue.name)
+
+def artists_with_upcoming_counts(*criteria):
+  # every artist with its maintained upcoming show count
+  return select(Artist.id, Artist.name,
+      Artist.upcoming_shows_count.label('num_upcoming_shows')) \
+    .where(*criteria) \
+    .order_by(Artist.name)
+
+def shows_with_names(*criteria):
+  # shows joined to the names of their venue and artist
+  return select(Show.id, Venue.id.label("venue_id"), Venue.name.label("venue_name"), \
+      Artist.id.label("artist_id"), Artist.name.label("artist_name"), \
+      Artist.image_link.label("artist_image_link"), Show.start_time) \
+    .select_from(Show) \
+    .join(Artist, Artist.id == Show.artist_id) \
+    .join(Venue, Venue.id == Show.venue_id) \
+    .where(*criteria)
+
+def show_tile(row):
+  data_dict = dict()
+  data_dict["venue_id"] = row.venue_id
+  data_dict["venue_name"] = row.venue_name
+  data_dict["artist_id"] = row.artist_id
+  data_dict["artist_name"] = row.artist_name
+  data_dict["artist_image_link"] = row.artist_image_link
+  data_dict["start_time"] = row.start_time
+  return data_dict
+
+def show_filters():
+  # ?from=&to= (ISO 8601; a date-only 'to' includes that whole day),
+  # ?city= (the venue's) and ?genre= (the artist's); the args in use are
+  # returned too, for pagination links
+  criteria, args = [], {}
+  start, end = datetime_arg('from'), datetime_arg('to')
+  if start:
+    criteria.append(Show.start_time >= start)
+    args["from"] = request.args['from']
+  if end:
+    if len(request.args['to']) == 10:
+      end += timedelta(days=1)
+    criteria.append(Show.start_time < end)
+    args["to"] = request.args['to']
+  if request.args.get('city'):
+    criteria.append(Venue.city == request.args['city'])
+    args["city"] = request.args['city']
+  if request.args.get('genre'):
+    criteria.append(has_genre(Artist.genres, request.args['genre']))
+    args["genre"] = request.args['genre']
+  return criteria, args
+
+def calendar_window(view, anchor):
+  # (first, last, previous, next): the days shown, last exclusive, in whole
+  # Monday-to-Sunday weeks, and the anchors of the neighbouring periods
+  if view == 'week':
+    first = anchor - timedelta(days=anchor.weekday())
+    return first, first + timedelta(days=7), first - timedelta(days=7), first + timedelta(days=7)
+  month = anchor.replace(day=1)
+  next_month = (month + timedelta(days=32)).replace(day=1)
+  first = month - timedelta(days=month.weekday())
+  last = next_month + timedelta(days=(7 - next_month.weekday()) % 7)
+  return first, last, (month - timedelta(days=1)).replace(day=1), next_month
+
+def calendar_args():
+  # ?view=month|week&date=YYYY-MM-DD, defaulting to the current month
+  view = 'week' if request.args.get('view') == 'week' else 'month'
+  try:
+    anchor = date.fromisoformat(request.args['date']) if request.args.get('date') else datetime.utcnow().date()
+  except ValueError:
+    abort(400)
+  return view, anchor
+
+def calendar_weeks(first, last, anchor, view, counts=None, shows=None):
+  # rows of seven day cells; counts: {day: n}, shows: {day: [tiles]}
+  weeks, day = [], first
+  while day < last:
+    if day.weekday() == 0:
+      weeks.append([])
+    weeks[-1].append({"date": day, "in_period": view == 'week' or day.month == anchor.month,
+      "count": (counts or {}).get(day, 0), "shows": (shows or {}).get(day, [])})
+    day += timedelta(days=1)
+  return weeks
+
+def shows_by_day(rows):
+  days = {}
+  for row in rows:
+    days.setdefault(row.start_time.date(), []).append(show_tile(row))
+  return days
+
+# kind -> (model, its column on Show)
+AVAILABILITY = {'venues': (Venue, Show.venue_id), 'artists': (Artist, Show.artist_id)}
+
+def availability_args():
+  # (start, end, minimum): ?from=&to= as on /shows (a date-only 'to'
+  # includes that whole day), AVAILABILITY_DAYS from today by default, and
+  # ?min= the shortest free slot listed, in minutes (default: one show)
+  start = datetime_arg('from') or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+  end = datetime_arg('to')
+  if end is None:
+    end = start + timedelta(days=app.config['AVAILABILITY_DAYS'])
+  elif len(request.args['to']) == 10:
+    end += timedelta(days=1)
+  minimum = request.args.get('min', app.config['SHOW_LENGTH_MINUTES'], type=int)
+  if end <= start or end - start > timedelta(days=app.config['AVAILABILITY_MAX_DAYS']) or minimum < 1:
+    abort(400)
+  return start, end, timedelta(minutes=minimum)
+
+def availability_data(kind, limit):
+  # (start, end, minimum, entities): the window and the venues or artists
+  # matching ?id= (repeatable), ?city=, ?state= and ?genre=, in id order,
+  # each with its free slots [(from, to)] in the window; limit + 1 of them
+  # at most, so callers can tell there are more. One query, the entities
+  # outer joined to their shows in the window.
+  import availability
+  model, column = AVAILABILITY[kind]
+  start, end, minimum = availability_args()
+  length = timedelta(minutes=app.config['SHOW_LENGTH_MINUTES'])
+  criteria = entity_filters(model)
+  if request.args.getlist('id', type=int):
+    criteria.append(model.id.in_(request.args.getlist('id', type=int)))
+  entities = select(model.id, model.name, model.city, model.state).where(*criteria) \
+    .order_by(model.id).limit(limit + 1).subquery()
+  busy = db.and_(column == entities.c.id, *availability.overlapping(Show.start_time, start, end, length))
+  rows = db.session.execute(select(entities, Show.start_time) \
+    .select_from(entities.outerjoin(Show, busy)).order_by(entities.c.id, Show.start_time)).all()
+  free = availability.free_slots(((row[0], row[4]) for row in rows), start, end, length, minimum)
+  names = dict((row[0], row) for row in rows)
+  return start, end, minimum, [{"id": id, "name": names[id][1], "city": names[id][2], "state": names[id][3],
+    "free": slots} for id, slots in free.items()]
+
+def venue_details_query(venue_id):
+  # the venue and its shows (see history_criteria()) in one round trip
+  return select(Venue, Artist.id.label("artist_id"), Artist.name.label("artist_name"), \
+      Artist.image_link.label("artist_image_link"), Show.start_time, is_upcoming().label("upcoming")) \
+    .outerjoin(Show, db.and_(Show.venue_id == Venue.id, *history_criteria())) \
+    .outerjoin(Artist, Artist.id == Show.artist_id) \
+    .where(Venue.id == venue_id) \
+    .order_by(Show.start_time)
+
+def venue_details_data(rows):
+  # the venue page from venue_details_query() rows, split in a single
+  # pass; None if there is no such venue
+  if len(rows) == 0:
+    return None
+
+  venue = rows[0].Venue
+  data = dict()
+  data["id"] = venue.id
+  data["name"] = venue.name
+  data["genres"] = venue.genres
+  data["address"] = venue.address
+  data["city"] = venue.city
+  data["state"] = venue.state
+  data["phone"] = venue.phone
+  data["website"] = venue.website
+  data["facebook_link"] = venue.facebook_link
+  data["seeking_talent"] = venue.seeking_talent
+  data["seeking_description"] = venue.seeking_description
+  data["image_link"] = venue.image_link
+  data.update(split_shows(rows, "artist_id", "artist_name", "artist_image_link"))
+  limit_history(data, venue)
+  return data
+
+def venue_details(venue_id):
+  return venue_details_data(db.session.execute(venue_details_query(venue_id)).all())
+
+def artist_details_query(artist_id):
+  # the artist and its shows (see history_criteria()) in one round trip
+  return select(Artist, Venue.id.label("venue_id"), Venue.name.label("venue_name"), \
+      Venue.image_link.label("venue_image_link"), Show.start_time, is_upcoming().label("upcoming")) \
+    .outerjoin(Show, db.and_(Show.artist_id == Artist.id, *history_criteria())) \
+    .outerjoin(Venue, Venue.id == Show.venue_id) \
+    .where(Artist.id == artist_id) \
+    .order_by(Show.start_time)
+
+def artist_details_data(rows):
+  # the artist page from artist_details_query() rows, like venue_details_data()
+  if len(rows) == 0:
+    return None
+
+  artist = rows[0].Artist
+  data = dict()
+  data["id"] = artist.id
+  data["name"] = artist.name
+  data["genres"] = artist.genres
+  data["city"] = artist.city
+  data["state"] = artist.state
+  data["phone"] = artist.phone
+  data["website"] = artist.website
+  data["facebook_link"] = artist.facebook_link
+  data["seeking_venue"] = artist.seeking_venue
+  data["seeking_description"] = artist.seeking_description
+  data["image_link"] = artist.image_link
+  data.update(split_shows(rows, "venue_id", "venue_name", "venue_image_link"))
+  limit_history(data, artist)
+  return data
+
+def artist_details(artist_id):
+  return artist_details_data(db.session.execute(artist_details_query(artist_id)).all())
+
+# relevance search over name, city and genres (see search.py)
+venue_search = Searcher(db, Venue, GENRES)
+artist_search = Searcher(db, Artist, GENRES)
+
+# stable sort keys used for keyset pagination; each ends in the primary key
+VENUE_KEYS = [Venue.state, Venue.city, Venue.name, Venue.id]
+ARTIST_KEYS = [Artist.name, Artist.id]
+SHOW_KEYS = [Show.start_time, Show.id]
+
+def group_venues_by_area(rows):
+  # rows are ordered by (state, city), so each area is a contiguous run
+  areas = []
+  for (state, city), venues in itertools.groupby(rows, key=lambda row: (row.state, row.city)):
+    areas.append({
+      "city": city,
+      "state": state,
+      "venues": [{"id": row.id, "name": row.name, "num_upcoming_shows": row.num_upcoming_shows} for row in venues]
+    })
+  return areas
+
+def search_count_query(model, criteria):
+  # counts at most SEARCH_COUNT_LIMIT + 1 matches: a common word matches
+  # tens of thousands of names and counting them all costs more than the page
+  matches = select(model.id).where(criteria).limit(app.config['SEARCH_COUNT_LIMIT'] + 1).subquery()
+  return select(func.count()).select_from(matches)
+
+def search_results(rows, count):
+  data = []
+  for row in rows:
+    data.append({"id": row.id, "name": row.name, "num_upcoming_shows": row.num_upcoming_shows})
+  limit = app.config['SEARCH_COUNT_LIMIT']
+  return {"count": min(count, limit), "more": count > limit, "data": data}
+
+def artists_query():
+  return select(Artist.id, Artist.name)
+
+#----------------------------------------------------------------------------#
+# Validators.
+#----------------------------------------------------------------------------#
+
+def last_show_transition_query(*criteria):
+  # the latest start time already passed: when a show last moved from
+  # upcoming to past, which changes pages without any write
+  return select(Show.start_time) \
+    .where(Show.start_time < func.now(), *criteria) \
+    .order_by(Show.start_time.desc()) \
+    .limit(1)
+
+def last_show_transition(*criteria):
+  return db.session.execute(last_show_transition_query(*criteria)).scalar()
+
+def table_versions_query(tables):
+  return select(TableVersion.name, TableVersion.version, TableVersion.updated_at) \
+    .where(TableVersion.name.in_(tables)) \
+    .order_by(TableVersion.name)
+
+def row_version_query(model, id):
+  return select(model.version, model.updated_at).where(model.id == id)
+
+def make_validators(versions, timestamps):
+  # the representation also varies with the request's locale and timezone,
+  # and with the asset build its URLs point at
+  parts = [versions, str(formatting.request_locale()), str(formatting.request_timezone()), assets.version()]
+  etag = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+  timestamps = [stamp for stamp in timestamps if stamp is not None]
+  return etag, max(timestamps) if timestamps else None
+
+def listing_validators(tables, rows, transition):
+  # from the table_versions rows of tables and, if Show is one of them,
+  # the last show transition
+  versions = [(row.name, row.version) for row in rows]
+  timestamps = [row.updated_at for row in rows]
+  if 'Show' in tables:
+    versions.append(transition)
+    timestamps.append(transition)
+  return make_validators(versions, timestamps)
+
+def row_validators(model, id, row, transition):
+  if row is None:
+    return None
+  return make_validators([model.__name__, id, row.version, transition], [row.updated_at, transition])
+
+def listing_validator(*tables):
+  # validator for listing pages: the versions of the tables they read
+  def validator():
+    transition = last_show_transition() if 'Show' in tables else None
+    return listing_validators(tables, db.session.execute(table_versions_query(tables)).all(), transition)
+  validator.tables = tables
+  return validator
+
+def venue_validator(venue_id):
+  row = db.session.execute(row_version_query(Venue, venue_id)).first()
+  transition = last_show_transition(Show.venue_id == venue_id) if row is not None else None
+  return row_validators(Venue, venue_id, row, transition)
+venue_validator.model, venue_validator.show_key = Venue, Show.venue_id
+
+def artist_validator(artist_id):
+  row = db.session.execute(row_version_query(Artist, artist_id)).first()
+  transition = last_show_transition(Show.artist_id == artist_id) if row is not None else None
+  return row_validators(Artist, artist_id, row, transition)
+artist_validator.model, artist_validator.show_key = Artist, Show.artist_id
+
+#----------------------------------------------------------------------------#
+# Pagination.
+#----------------------------------------------------------------------------#
+
+def page_size(limit=None):
+  # clamp the requested page size to the configured bounds
+  if not limit or limit < 1:
+    return app.config['PAGE_SIZE']
+  return min(limit, app.config['MAX_PAGE_SIZE'])
+
+def encode_cursor(direction, values):
+  payload = json.dumps([direction] + [v.isoformat() if isinstance(v, datetime) else v for v in values])
+  return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, keys):
+  # returns (forward, values) or aborts with 400 on a malformed cursor
+  try:
+    payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    direction, values = payload[0], payload[1:]
+    if direction not in ('n', 'p') or len(values) != len(keys):
+      raise ValueError(cursor)
+    for i, key in enumerate(keys):
+      if values[i] is not None and key.type.python_type is datetime:
+        values[i] = datetime.fromisoformat(values[i])
+  except (ValueError, TypeError, IndexError, NotImplementedError):
+    abort(400)
+  return direction == 'n', values
+
+def page_query(query, keys, cursor=None, limit=None):
+  # keyset pagination: seek past the last seen (key, ..., id) tuple instead
+  # of OFFSET, so every page costs the same however deep the user goes.
+  # keys must be selected by the query under their own column names.
+  # Returns the query for one page plus what page_rows() needs afterwards.
+  limit = page_size(limit)
+  forward = True
+  if cursor:
+    forward, values = decode_cursor(cursor, keys)
+    bound = tuple_(*keys) > tuple_(*values) if forward else tuple_(*keys) < tuple_(*values)
+    query = query.where(bound)
+  ordering = keys if forward else [key.desc() for key in keys]
+  return query.order_by(None).order_by(*ordering).limit(limit + 1), forward, limit
+
+def page_rows(rows, keys, cursor, forward, limit):
+  # the rows of the page, in key order, and its cursors
+  has_more = len(rows) > limit
+  rows = rows[:limit]
+  if not forward:
+    rows.reverse()
+
+  def key_of(row):
+    return [getattr(row, key.key) for key in keys]
+
+  page = {"limit": limit, "next_cursor": None, "prev_cursor": None}
+  if rows:
+    if has_more if forward else cursor:
+      page["next_cursor"] = encode_cursor('n', key_of(rows[-1]))
+    if cursor if forward else has_more:
+      page["prev_cursor"] = encode_cursor('p', key_of(rows[0]))
+  return rows, page
+
+def paginate(query, keys, cursor=None, limit=None):
+  query, forward, limit = page_query(query, keys, cursor, limit)
+  return page_rows(db.session.execute(query).all(), keys, cursor, forward, limit)
+
+def page_args():
+  # cursor and limit arguments shared by every paginated route
+  return request.values.get('cursor'), request.values.get('limit', type=int)
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+# the 'datetime' filter formats native datetimes with cached babel patterns
+formatting.init_app(app)
+# asset_url() / asset_urls() for the fingerprinted files of 'flask assets build'
+assets.init_app(app)
+# compiled templates are kept on disk (TEMPLATE_CACHE_DIR) across workers
+warmup.init_app(app)
 
-app.jinja_env.filters['datetime'] = format_datetime
+#----------------------------------------------------------------------------#
+# Streaming.
+#----------------------------------------------------------------------------#
+
+def stream_template(template_name, **context):
+  # render incrementally, flushing every STREAM_BUFFER template chunks, so
+  # the first tiles reach the client before the query is exhausted
+  app.update_template_context(context)
+  stream = app.jinja_env.get_template(template_name).stream(context)
+  stream.enable_buffering(app.config['STREAM_BUFFER'])
+  return stream
 
 #----------------------------------------------------------------------------#
 # Controllers.
@@ -99,113 +616,55 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@conditional(listing_validator('Venue', 'Show'))
+@page_cache.cached(lambda: ['venues', 'shows'])
 def venues():
-  # display all venues
-  num_upcoming_shows = db.session.query(Venue).join(Show).filter(Show.start_time > func.now()).with_entities(Venue.id, Venue.name, Show.start_time)
-  num_upcoming_shows_dict = dict()
-  for row in num_upcoming_shows:
-    if row.id in num_upcoming_shows_dict:
-      num_upcoming_shows_dict[row.id] = num_upcoming_shows_dict[row.id] + 1
-    else:
-      num_upcoming_shows_dict[row.id] = 1
-
-  result = db.session.query(Venue).with_entities(Venue.id, Venue.name, Venue.city, Venue.state)
-  result_dict = dict()
-  for row in result:
-    if((row.city, row.state) not in result_dict):
-      result_dict[(row.city, row.state)] = []
-      result_dict[(row.city, row.state)].append({"id" :row.id, "name" : row.name, "num_upcoming_shows" : num_upcoming_shows_dict.get(row.id, 0)})
-    else:
-      result_dict[(row.city, row.state)].append({"id" :row.id, "name" : row.name, "num_upcoming_shows" : num_upcoming_shows_dict.get(row.id, 0)})
-  
-  data = []
-  for key in result_dict:
-    city_state_dict = {}
-    city_state_dict["city"] = key[0]
-    city_state_dict["state"] = key[1]
-    city_state_dict["venues"] = result_dict[key]
-    data.append(city_state_dict)
-  return render_template('pages/venues.html', areas=data);
+  # display all venues grouped by area
+  cursor, limit = page_args()
+  rows, page = paginate(venues_with_upcoming_counts(), VENUE_KEYS, cursor, limit)
+  return render_template('pages/venues.html', areas=group_venues_by_area(rows), page=page)
 
 
-@app.route('/venues/search', methods=['POST'])
+@app.route('/venues/search', methods=['GET', 'POST'])
+@conditional(listing_validator('Venue', 'Show'))
+@page_cache.cached(lambda: ['venues', 'shows'])
 def search_venues():
   # search for venues using partial string matching and is case-insensitive
   # example - search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  name = request.form.get('search_term', '')
-  num_upcoming_shows = db.session.query(Venue).join(Show).filter(Show.start_time > func.now()).with_entities(Venue.id, Venue.name, Show.start_time)
-  
-  num_upcoming_shows_dict = dict()
-  for row in num_upcoming_shows:
-    if row.id in num_upcoming_shows_dict:
-      num_upcoming_shows_dict[row.id] = num_upcoming_shows_dict[row.id] + 1
-    else:
-      num_upcoming_shows_dict[row.id] = 1
-  print(num_upcoming_shows_dict)
-  
-  result = db.session.query(Venue).filter(Venue.name.ilike("%" + name + "%")).with_entities(Venue.id, Venue.name)
-  data = []
-  for row in result:
-    single_data = {}
-    single_data["id"] = row.id
-    single_data["name"] = row.name
-    single_data["num_upcoming_shows_dict"] = num_upcoming_shows_dict.get(id, 0)
-    data.append(single_data)
+  name = request.values.get('search_term', '')
+  criteria, rank = venue_search.search(name)
+  cursor, limit = page_args()
+  query = venues_with_upcoming_counts(criteria).add_columns(rank)
+  rows, page = paginate(query, [rank, Venue.name, Venue.id], cursor, limit)
+  page["args"] = {"search_term": name}
+  response = search_results(rows, db.session.execute(search_count_query(Venue, criteria)).scalar())
+
+  return render_template('pages/search_venues.html', results=response, search_term=name, page=page)
+
+@app.route('/search/autocomplete')
+@conditional(listing_validator('Venue', 'Artist'))
+@page_cache.cached(lambda: ['venues', 'artists'])
+def search_autocomplete():
+  # prefix completion for the venue and artist search boxes
+  prefix = request.args.get('q', '').strip()
+  kind = request.args.get('type')
+  limit = min(request.args.get('limit', 10, type=int), 25)
   response = {}
-  response["count"] = len(data)
-  response["data"] = (data) 
-
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+  if prefix:
+    if kind in (None, 'venues'):
+      response["venues"] = [{"id": id, "name": name} for id, name in venue_search.complete(prefix, limit)]
+    if kind in (None, 'artists'):
+      response["artists"] = [{"id": id, "name": name} for id, name in artist_search.complete(prefix, limit)]
+  return jsonify(response)
 
 @app.route('/venues/<int:venue_id>')
+@conditional(venue_validator)
+@page_cache.cached(lambda venue_id: ['venue:%d' % venue_id, 'artists'], vary=(formatting.request_locale, formatting.request_timezone))
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
-  result = db.session.query(Venue).filter_by(id = venue_id).all()
-  print(type(result), len(result))
-  if(len(result) == 0):
+  data = venue_details(venue_id)
+  if data is None:
     return not_found_error("Venue does not exist")
-  print(result[0].genres)
-  data = dict()
-  data["id"] = result[0].id
-  data["name"] = result[0].name
-  data["genres"] = result[0].genres
-  data["address"] = result[0].address
-  data["city"] = result[0].city
-  data["state"] = result[0].state
-  data["phone"] = result[0].phone
-  data["website"] = result[0].website
-  data["facebook_link"] = result[0].facebook_link
-  data["seeking_talent"] = result[0].seeking_talent
-  data["seeking_description"] = result[0].seeking_description
-  data["image_link"] = result[0].image_link
-
-  upcoming_shows = db.session.query(Artist).join(Show).filter(Show.venue_id == venue_id, Show.start_time > func.now()).with_entities(Artist.id, Artist.name, Artist.image_link, Show.start_time)
-  
-  upcoming_shows_list = []
-  for row in upcoming_shows:
-    upcoming_shows_dict = dict()
-    upcoming_shows_dict["artist_id"] = row.id
-    upcoming_shows_dict["artist_name"] = row.name
-    upcoming_shows_dict["artist_image_link"] = row.image_link
-    upcoming_shows_dict["start_time"] = format_datetime(str(row.start_time))
-    upcoming_shows_list.append(upcoming_shows_dict)
-
-  data["upcoming_shows"] = upcoming_shows_list
-  data["upcoming_shows_count"] = len(upcoming_shows_list)
-
-  past_shows = db.session.query(Artist).join(Show).filter(Show.venue_id == venue_id, Show.start_time < func.now()).with_entities(Artist.id, Artist.name, Artist.image_link, Show.start_time)
-  
-  past_shows_list = []
-  for row in past_shows:
-    past_shows_dict = dict()
-    past_shows_dict["artist_id"] = row.id
-    past_shows_dict["artist_name"] = row.name
-    past_shows_dict["artist_image_link"] = row.image_link
-    past_shows_dict["start_time"] = format_datetime(str(row.start_time))
-    past_shows_list.append(past_shows_dict)
-
-  data["past_shows"] = past_shows_list
-  data["past_shows_count"] = len(past_shows_list)
 
   return render_template('pages/show_venue.html', venue=data)
 
@@ -214,6 +673,7 @@ def show_venue(venue_id):
 
 @app.route('/venues/create', methods=['GET'])
 def create_venue_form():
+  from forms import VenueForm
   form = VenueForm()
   return render_template('forms/new_venue.html', form=form)
 
@@ -242,8 +702,11 @@ def create_venue_submission():
         seeking_talent = seeking_talent, seeking_description = seeking_description, website = website)
     db.session.add(venue)
     db.session.commit()
+    page_cache.invalidate('venues')
     flash('Venue ' + request.form['name'] + ' was successfully listed!')
-  except:
+  except Exception:
+    app.logger.exception('could not create venue %r', name)
+    db.session.rollback()
     flash('Venue ' + request.form['name'] + ' could not be listed!')  
   finally:
     db.session.close()
@@ -254,9 +717,14 @@ def delete_venue(venue_id):
   # delete a record based on venue id
   success = True
   try:
+    # shows first, in the same transaction, so the counters of the artists
+    # who played here are decremented along with them
+    Show.query.filter_by(venue_id = venue_id).delete()
     Venue.query.filter_by(id = venue_id).delete()
     db.session.commit()
-  except:
+    page_cache.invalidate('venues', 'venue:%s' % venue_id, 'shows', 'artists')
+  except Exception:
+    app.logger.exception('could not delete venue %s', venue_id)
     success = False
     db.session.rollback()
   finally:
@@ -270,96 +738,47 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@conditional(listing_validator('Artist'))
+@page_cache.cached(lambda: ['artists'])
 def artists():
-  # retrive all artists 	
-  result = db.session.query(Artist).with_entities(Artist.id, Artist.name)
+  # retrive artists one page at a time	
+  cursor, limit = page_args()
+  rows, page = paginate(artists_query(), ARTIST_KEYS, cursor, limit)
   data = []
   
-  for row in result:
+  for row in rows:
     result_dict = dict()
     result_dict["id"] = row.id
     result_dict["name"] = row.name
     data.append(result_dict)
 
-  return render_template('pages/artists.html', artists=data)
+  return render_template('pages/artists.html', artists=data, page=page)
 
-@app.route('/artists/search', methods=['POST'])
+@app.route('/artists/search', methods=['GET', 'POST'])
+@conditional(listing_validator('Artist', 'Show'))
+@page_cache.cached(lambda: ['artists', 'shows'])
 def search_artists():
   # search for artists using partial string matching and is case-insensitive 	
   # example seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
-  name = request.form.get('search_term', '')
-  num_upcoming_shows = db.session.query(Artist).join(Show).filter(Show.start_time > func.now()).with_entities(Artist.id, Artist.name, Show.start_time)
-  
-  num_upcoming_shows_dict = dict()
-  for row in num_upcoming_shows:
-    if row.id in num_upcoming_shows_dict:
-      num_upcoming_shows_dict[row.id] = num_upcoming_shows_dict[row.id] + 1
-    else:
-      num_upcoming_shows_dict[row.id] = 1
-  
-  result = db.session.query(Artist).filter(Artist.name.ilike("%" + name + "%")).with_entities(Artist.id, Artist.name)
-  data = []
-  for row in result:
-    single_data = {}
-    single_data["id"] = row.id
-    single_data["name"] = row.name
-    single_data["num_upcoming_shows"] = num_upcoming_shows_dict.get(id, 0)
-    data.append(single_data)
-  response = {}
-  response["count"] = len(data)
-  response["data"] = (data) 
+  name = request.values.get('search_term', '')
+  criteria, rank = artist_search.search(name)
+  cursor, limit = page_args()
+  query = artists_with_upcoming_counts(criteria).add_columns(rank)
+  rows, page = paginate(query, [rank, Artist.name, Artist.id], cursor, limit)
+  page["args"] = {"search_term": name}
+  response = search_results(rows, db.session.execute(search_count_query(Artist, criteria)).scalar())
 
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  return render_template('pages/search_artists.html', results=response, search_term=name, page=page)
 
 @app.route('/artists/<int:artist_id>')
+@conditional(artist_validator)
+@page_cache.cached(lambda artist_id: ['artist:%d' % artist_id, 'venues'], vary=(formatting.request_locale, formatting.request_timezone))
 def show_artist(artist_id):
-  # shows the venue page with the given venue_id
-  result = db.session.query(Artist).filter_by(id = artist_id).all()
-  if(len(result) == 0):
+  # shows the artist page with the given artist_id
+  data = artist_details(artist_id)
+  if data is None:
     return not_found_error("Artist does not exist")
   
-  data = dict()
-  data["id"] = result[0].id
-  data["name"] = result[0].name
-  data["genres"] = result[0].genres
-  data["city"] = result[0].city
-  data["state"] = result[0].state
-  data["phone"] = result[0].phone
-  data["website"] = result[0].website
-  data["facebook_link"] = result[0].facebook_link
-  data["seeking_venue"] = result[0].seeking_venue
-  data["seeking_description"] = result[0].seeking_description
-  data["image_link"] = result[0].image_link
-  
-  print(data["genres"])
-  upcoming_shows = db.session.query(Venue).join(Show).filter(Show.artist_id == artist_id, Show.start_time > func.now()).with_entities(Venue.id, Venue.name, Venue.image_link, Show.start_time)
-  
-  upcoming_shows_list = []
-  for row in upcoming_shows:
-    upcoming_shows_dict = dict()
-    upcoming_shows_dict["venue_id"] = row.id
-    upcoming_shows_dict["venue_name"] = row.name
-    upcoming_shows_dict["venue_image_link"] = row.image_link
-    upcoming_shows_dict["start_time"] = format_datetime(str(row.start_time))
-    upcoming_shows_list.append(upcoming_shows_dict)
-
-  data["upcoming_shows"] = upcoming_shows_list
-  data["upcoming_shows_count"] = len(upcoming_shows_list)
-
-  past_shows = db.session.query(Venue).join(Show).filter(Show.artist_id == artist_id, Show.start_time < func.now()).with_entities(Venue.id, Venue.name, Venue.image_link, Show.start_time)
-  
-  past_shows_list = []
-  for row in past_shows:
-    past_shows_dict = dict()
-    past_shows_dict["venue_id"] = row.id
-    past_shows_dict["venue_name"] = row.name
-    past_shows_dict["venue_image_link"] = row.image_link
-    past_shows_dict["start_time"] = format_datetime(str(row.start_time))
-    past_shows_list.append(past_shows_dict)
-
-  data["past_shows"] = past_shows_list
-  data["past_shows_count"] = len(past_shows_list)
-  
   return render_template('pages/show_artist.html', artist=data)
 
 #  Update
@@ -371,6 +790,7 @@ def edit_artist(artist_id):
   if artist_obj is None:
     return not_found_error("Artist does not exist")
     
+  from forms import ArtistForm
   form = ArtistForm()
   artist={
     "id": artist_obj.id,
@@ -427,6 +847,7 @@ def edit_artist_submission(artist_id):
     artist_obj.seeking_venue = False
     artist_obj.seeking_description = ''
   db.session.commit()
+  page_cache.invalidate('artists', 'artist:%d' % artist_id)
 
   return redirect(url_for('show_artist', artist_id=artist_id))
 
@@ -435,6 +856,7 @@ def edit_venue(venue_id):
   venue_obj = Venue.query.get(venue_id)
   if venue_obj is None:
     return not_found_error("Venue does not exist")
+  from forms import VenueForm
   form = VenueForm()
 
   venue={
@@ -494,6 +916,7 @@ def edit_venue_submission(venue_id):
     venue_obj.seeking_talent = False
     venue_obj.seeking_description = ''
   db.session.commit()
+  page_cache.invalidate('venues', 'venue:%d' % venue_id)
 
   return redirect(url_for('show_venue', venue_id=venue_id))
 
@@ -502,6 +925,7 @@ def edit_venue_submission(venue_id):
 
 @app.route('/artists/create', methods=['GET'])
 def create_artist_form():
+  from forms import ArtistForm
   form = ArtistForm()
   return render_template('forms/new_artist.html', form=form)
 
@@ -530,8 +954,10 @@ def create_artist_submission():
         seeking_venue = seeking_venue, seeking_description = seeking_description, website = website)
     db.session.add(artist)
     db.session.commit()
+    page_cache.invalidate('artists')
     flash('artist ' + request.form['name'] + ' was successfully listed!')
-  except Exception as e:
+  except Exception:
+    app.logger.exception('could not create artist %r', name)
     flash('artist ' + request.form['name'] + ' could not be listed!')  
   finally:
     db.session.close()
@@ -542,12 +968,13 @@ def create_artist_submission():
 def delete_artist(artist_id):
   # delete artist based on id	
   success = True
-  print(artist_id)
   try:
+    Show.query.filter_by(artist_id = artist_id).delete()
     Artist.query.filter_by(id = artist_id).delete()
     db.session.commit()
-  except Exception as e:
-    print(e)
+    page_cache.invalidate('artists', 'artist:%s' % artist_id, 'shows', 'venues')
+  except Exception:
+    app.logger.exception('could not delete artist %s', artist_id)
     success = False
     db.session.rollback()
   finally:
@@ -561,47 +988,246 @@ def delete_artist(artist_id):
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@conditional(listing_validator('Venue', 'Artist', 'Show'))
+@page_cache.cached(lambda: ['shows', 'venues', 'artists'], vary=(formatting.request_locale, formatting.request_timezone))
 def shows():
-  # retrive all shows	
-  result = db.session.query(Show).join(Artist).join(Venue).with_entities(Venue.id.label("venue_id"), \
-     Venue.name.label("venue_name"), Artist.id.label("artist_id"), Artist.name.label("artist_name"),  \
-       Artist.image_link, Show.start_time)
-  data = []
-  for row in result:
-    data_dict = dict()
-    data_dict["venue_id"] = row.venue_id
-    data_dict["venue_name"] = row.venue_name
-    data_dict["artist_id"] = row.artist_id
-    data_dict["artist_name"] = row.artist_name
-    data_dict["artist_image_link"] = row.image_link
-    data_dict["start_time"] = str(row.start_time)
-    data.append(data_dict)
-  return render_template('pages/shows.html', shows=data)
+  # retrive shows one page at a time, in start time order, optionally
+  # within ?from=&to= and for a ?city= or ?genre=; ?all=1 streams every
+  # matching show through a server-side cursor as the template renders
+  criteria, args = show_filters()
+  if request.args.get('all'):
+    rows = db.session.execute(shows_with_names(*criteria).order_by(*SHOW_KEYS) \
+      .execution_options(stream_results=True)) \
+      .yield_per(app.config['STREAM_BATCH_SIZE'])
+    data = (show_tile(row) for row in rows)
+    return Response(stream_with_context(stream_template('pages/shows.html', shows=data, page=None,
+      filters=args, genres=GENRES)))
+  cursor, limit = page_args()
+  rows, page = paginate(shows_with_names(*criteria), SHOW_KEYS, cursor, limit)
+  page["args"] = args
+  data = [show_tile(row) for row in rows]
+  return render_template('pages/shows.html', shows=data, page=page, filters=args, genres=GENRES)
+
+@app.route('/shows/calendar')
+@conditional(listing_validator('Venue', 'Artist', 'Show'))
+@page_cache.cached(lambda: ['shows', 'venues', 'artists'])
+def shows_calendar():
+  # shows per day for a month or week, from the per-day buckets; a genre
+  # filter has to look at the artists, so it counts Show rows instead
+  view, anchor = calendar_args()
+  first, last, previous, following = calendar_window(view, anchor)
+  city, genre = request.args.get('city'), request.args.get('genre')
+  if genre:
+    day = cast(Show.start_time, db.Date)
+    query = db.session.query(day, func.count(Show.id)) \
+      .join(Artist, Artist.id == Show.artist_id) \
+      .filter(Show.start_time >= first, Show.start_time < last, has_genre(Artist.genres, genre)) \
+      .group_by(day)
+    if city:
+      query = query.join(Venue, Venue.id == Show.venue_id).filter(Venue.city == city)
+  else:
+    query = db.session.query(ShowDay.day, func.sum(ShowDay.shows)) \
+      .filter(ShowDay.day >= first, ShowDay.day < last) \
+      .group_by(ShowDay.day)
+    if city:
+      query = query.join(Venue, Venue.id == ShowDay.venue_id).filter(Venue.city == city)
+  counts = dict((day, int(count)) for day, count in query)
+  filters = dict((key, value) for key, value in (('city', city), ('genre', genre)) if value)
+  weeks = calendar_weeks(first, last, anchor, view, counts=counts)
+  for week in weeks:
+    for day in week:
+      day["link"] = url_for('shows', **dict(filters, **{"from": day["date"].isoformat(), "to": day["date"].isoformat()}))
+  return render_template('pages/calendar.html', title='Shows', view=view, anchor=anchor, weeks=weeks,
+    previous=previous, following=following, filters=filters, args=filters, genres=GENRES)
+
+@app.route('/venues/<int:venue_id>/calendar')
+@conditional(venue_validator)
+@page_cache.cached(lambda venue_id: ['venue:%d' % venue_id, 'artists'], vary=(formatting.request_locale, formatting.request_timezone))
+def venue_calendar(venue_id):
+  venue = db.session.query(Venue.id, Venue.name).filter(Venue.id == venue_id).first()
+  if venue is None:
+    return not_found_error("Venue does not exist")
+  view, anchor = calendar_args()
+  first, last, previous, following = calendar_window(view, anchor)
+  rows = db.session.execute(shows_with_names(Show.venue_id == venue_id, Show.start_time >= first,
+    Show.start_time < last).order_by(*SHOW_KEYS))
+  return render_template('pages/calendar.html', title=venue.name, view=view, anchor=anchor,
+    weeks=calendar_weeks(first, last, anchor, view, shows=shows_by_day(rows)), previous=previous,
+    following=following, args={"venue_id": venue_id}, show_venue=False)
+
+@app.route('/artists/<int:artist_id>/calendar')
+@conditional(artist_validator)
+@page_cache.cached(lambda artist_id: ['artist:%d' % artist_id, 'venues'], vary=(formatting.request_locale, formatting.request_timezone))
+def artist_calendar(artist_id):
+  artist = db.session.query(Artist.id, Artist.name).filter(Artist.id == artist_id).first()
+  if artist is None:
+    return not_found_error("Artist does not exist")
+  view, anchor = calendar_args()
+  first, last, previous, following = calendar_window(view, anchor)
+  rows = db.session.execute(shows_with_names(Show.artist_id == artist_id, Show.start_time >= first,
+    Show.start_time < last).order_by(*SHOW_KEYS))
+  return render_template('pages/calendar.html', title=artist.name, view=view, anchor=anchor,
+    weeks=calendar_weeks(first, last, anchor, view, shows=shows_by_day(rows)), previous=previous,
+    following=following, args={"artist_id": artist_id}, show_venue=True)
+
+@app.route('/venues/availability', defaults={'kind': 'venues'})
+@app.route('/artists/availability', defaults={'kind': 'artists'})
+def availability_page(kind):
+  # free slots of the first MAX_PAGE_SIZE matching venues or artists (see
+  # availability_data); the API takes more
+  start, end, minimum, entities = availability_data(kind, app.config['MAX_PAGE_SIZE'])
+  more = len(entities) > app.config['MAX_PAGE_SIZE']
+  entities = entities[:app.config['MAX_PAGE_SIZE']]
+  filters = dict((key, request.args[key]) for key in ('city', 'state', 'genre') if request.args.get(key))
+  return render_template('pages/availability.html', kind=kind, entities=entities, more=more, start=start, end=end,
+    last_day=(end - timedelta(microseconds=1)).date(), minutes=int(minimum.total_seconds()) // 60,
+    ids=request.args.getlist('id', type=int), filters=filters, genres=GENRES)
 
 @app.route('/shows/create')
 def create_shows():
+  from forms import ShowForm
   form = ShowForm()
   return render_template('forms/new_show.html', form=form)
 
+def existing_ids(model, ids):
+  # the ones among ids that exist, checked 500 at a time
+  ids, found = sorted(ids), set()
+  for start in range(0, len(ids), 500):
+    found.update(db.session.execute(select(model.id).where(model.id.in_(ids[start:start + 500]))).scalars())
+  return found
+
+def schedule_shows(requested, partial=False):
+  # ([(index, id, row)], {index: problem}) for a batch of requested shows,
+  # inserted in the session's transaction. A problem is {"errors": {field:
+  # [message]}} or {"conflicts": [...]} (see scheduling.py); unless partial,
+  # nothing is inserted when any show has one.
+  import scheduling
+  length = timedelta(minutes=app.config['SHOW_LENGTH_MINUTES'])
+  rows, rejected = {}, {}
+  for index, data in enumerate(requested):
+    row, errors = scheduling.parse(data)
+    if errors:
+      rejected[index] = {"errors": errors}
+    else:
+      rows[index] = row
+  venue_ids = existing_ids(Venue, set(row['venue_id'] for row in rows.values()))
+  artist_ids = existing_ids(Artist, set(row['artist_id'] for row in rows.values()))
+  for index, row in list(rows.items()):
+    errors = {}
+    if row['venue_id'] not in venue_ids:
+      errors['venue_id'] = ['No such venue.']
+    if row['artist_id'] not in artist_ids:
+      errors['artist_id'] = ['No such artist.']
+    if errors:
+      rejected[index] = {"errors": errors}
+      del rows[index]
+  connection = db.session.connection()
+  conflicts = scheduling.booked_conflicts(connection, Show.__table__, rows, length)
+  conflicts.update(scheduling.batch_conflicts(rows, length, conflicts))
+  for index, found in conflicts.items():
+    rejected[index] = {"conflicts": found}
+  if rejected and not partial:
+    return [], rejected
+  accepted = [index for index in sorted(rows) if index not in rejected]
+  ids = scheduling.insert(connection, Show.__table__, [rows[index] for index in accepted])
+  return [(index, id, rows[index]) for index, id in zip(accepted, ids)], rejected
+
+def commit_schedule(requested, partial=False):
+  # schedule_shows and commit; when a concurrent writer booked one of the
+  # slots in between (the database's exclusion constraint fires), the batch
+  # is checked again, reporting that booking as a conflict
+  import scheduling
+  for attempt in range(2):
+    try:
+      created, rejected = schedule_shows(requested, partial)
+      db.session.commit()
+    except IntegrityError as e:
+      db.session.rollback()
+      if attempt or not scheduling.is_conflict(e):
+        raise
+      continue
+    if created:
+      page_cache.invalidate(*show_tags(row for _, _, row in created))
+    return created, rejected
+
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
   # Add new show	
-  artist_id = request.form['artist_id']
-  venue_id = request.form['venue_id']
-  start_time = request.form['start_time']
+  data = {field: request.form.get(field) for field in ('artist_id', 'venue_id', 'start_time')}
   try:
-    show = Show(venue_id = venue_id, artist_id = artist_id, start_time = start_time)
-    db.session.add(show)
-    db.session.commit()
-    flash('Show was successfully listed!')
-  except Exception as e: 
-    print(e)
+    created, rejected = commit_schedule([data])
+    if created:
+      flash('Show was successfully listed!')
+    elif 'conflicts' in rejected[0]:
+      flash('Show could not be listed: the venue or the artist is already booked at that time!')
+    else:
+      flash('Show could not be listed check whether Artist id and Venue id is correct!')
+  except Exception:
+    app.logger.exception('could not create show %r', data)
     flash('Show could not be listed check whether Artist id and Venue id is correct!')  
   finally:
     db.session.close()
   return render_template('pages/home.html')
 
 
+@app.route('/metrics')
+def all_metrics():
+  # request, SQL, render, page cache and pool metrics for this worker
+  return Response(metrics.exposition(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/cache')
+def cache_metrics():
+  # page cache hit/miss counters for this worker, in Prometheus text format
+  return Response(page_cache.prometheus(), mimetype='text/plain; version=0.0.4')
+
+#  Health
+#  ----------------------------------------------------------------
+
+@app.route('/healthz')
+def healthz():
+  # liveness: the process serves requests; never touches the database
+  return json_response({"status": "ok", "pool": pool.pool_stats(db.engine)})
+
+@app.route('/readyz')
+def readyz():
+  # readiness: the database answers, checked on the probe's own connection
+  ready, database = app.extensions['readiness_probe'].check()
+  return json_response({"status": "ready" if ready else "unavailable", "database": database,
+    "pool": pool.pool_stats(db.engine)}, 200 if ready else 503)
+
+#  Admin
+#  ----------------------------------------------------------------
+
+EXPORTS = {'venues': Venue.__table__, 'artists': Artist.__table__, 'shows': Show.__table__}
+
+def require_admin():
+  # admin endpoints are disabled (404) unless ADMIN_TOKEN is configured
+  token = app.config.get('ADMIN_TOKEN')
+  if not token:
+    abort(404)
+  supplied = request.headers.get('Authorization', '')
+  if not hmac.compare_digest(supplied.encode('utf-8'), ('Bearer ' + token).encode('utf-8')):
+    abort(403)
+
+@app.route('/admin/export/<kind>')
+def admin_export(kind):
+  # one table from its own snapshot, as gzip-compressed NDJSON or ?format=csv
+  import exporter
+  require_admin()
+  fmt = request.args.get('format', 'ndjson')
+  if kind not in EXPORTS or fmt not in exporter.FORMATS:
+    abort(404)
+  table = EXPORTS[kind]
+
+  def generate():
+    with exporter.Snapshot(db.engine, app.config['STREAM_BATCH_SIZE']) as snapshot:
+      for data in exporter.gzipped(exporter.encode(fmt, snapshot.batches(table), table, dumps)):
+        yield data
+
+  response = Response(generate(), mimetype='application/gzip')
+  response.headers['Content-Disposition'] = 'attachment; filename=%s.%s.gz' % (kind, fmt)
+  return response
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -611,6 +1237,687 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 
+#----------------------------------------------------------------------------#
+# API.
+#----------------------------------------------------------------------------#
+
+api = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+VENUE_FIELDS = [Venue.id, Venue.name, Venue.city, Venue.state, Venue.address, Venue.phone, Venue.genres, \
+  Venue.image_link, Venue.facebook_link, Venue.website, Venue.seeking_talent, Venue.seeking_description, \
+  Venue.upcoming_shows_count, Venue.past_shows_count, Venue.updated_at]
+ARTIST_FIELDS = [Artist.id, Artist.name, Artist.city, Artist.state, Artist.phone, Artist.genres, \
+  Artist.image_link, Artist.facebook_link, Artist.website, Artist.seeking_venue, Artist.seeking_description, \
+  Artist.upcoming_shows_count, Artist.past_shows_count, Artist.updated_at]
+
+def json_default(value):
+  if isinstance(value, datetime):
+    return value.isoformat()
+  raise TypeError(repr(value))
+
+def dumps(data):
+  # orjson when installed, otherwise the compact stdlib encoder
+  if orjson is not None:
+    return orjson.dumps(data, default=json_default)
+  return json.dumps(data, default=json_default, separators=(',', ':')).encode('utf-8')
+
+def json_response(data, status=200):
+  return Response(dumps(data), status=status, mimetype='application/json')
+
+def wants_ndjson():
+  return request.args.get('format') == 'ndjson' or \
+    request.accept_mimetypes.best == 'application/x-ndjson'
+
+def ndjson_response(query):
+  # the full result set, fetched through a server-side cursor in batches of
+  # STREAM_BATCH_SIZE rows, so memory stays flat however many rows there are
+  batch_size = app.config['STREAM_BATCH_SIZE']
+  rows = db.session.execute(query.execution_options(stream_results=True)).yield_per(batch_size)
+
+  def generate():
+    buffer = []
+    for row in rows:
+      buffer.append(dumps(row._asdict()))
+      if len(buffer) == batch_size:
+        yield b'\n'.join(buffer) + b'\n'
+        buffer = []
+    if buffer:
+      yield b'\n'.join(buffer) + b'\n'
+
+  return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def listing_response(query, keys):
+  if wants_ndjson():
+    return ndjson_response(query.order_by(None).order_by(*keys))
+  cursor, limit = page_args()
+  rows, page = paginate(query, keys, cursor, limit)
+  page["data"] = [row._asdict() for row in rows]
+  return json_response(page)
+
+def has_genre(column, genre):
+  return column.op('@>')(cast(array([genre]), column.type))
+
+def datetime_arg(name):
+  # ISO 8601; a value with an offset becomes naive UTC, like the stored
+  # start times (see scheduling.parse), so it compares with them and with
+  # a naive ?from= or ?to=
+  value = request.args.get(name)
+  if not value:
+    return None
+  try:
+    value = datetime.fromisoformat(value)
+  except ValueError:
+    abort(400)
+  if value.tzinfo is not None:
+    value = value.astimezone(timezone.utc).replace(tzinfo=None)
+  return value
+
+def entity_filters(model):
+  criteria = []
+  for field in ('city', 'state'):
+    if request.args.get(field):
+      criteria.append(getattr(model, field) == request.args[field])
+  if request.args.get('genre'):
+    criteria.append(has_genre(model.genres, request.args['genre']))
+  return criteria
+
+@api.errorhandler(400)
+@api.errorhandler(403)
+@api.errorhandler(404)
+@api.errorhandler(413)
+def api_error(error):
+  return json_response({"error": error.name}, error.code)
+
+@api.route('/venues')
+@conditional(listing_validator('Venue'))
+def api_venues():
+  # ?city=&state=&genre=&q=, cursor-paginated or ?format=ndjson
+  query = select(*VENUE_FIELDS).where(*entity_filters(Venue))
+  keys = [Venue.id]
+  if request.args.get('q'):
+    criteria, rank = venue_search.search(request.args['q'])
+    query = query.where(criteria).add_columns(rank)
+    keys = [rank, Venue.name, Venue.id]
+  return listing_response(query, keys)
+
+@api.route('/venues/<int:venue_id>')
+@conditional(venue_validator)
+def api_venue(venue_id):
+  data = venue_details(venue_id)
+  if data is None:
+    abort(404)
+  return json_response(data)
+
+@api.route('/artists')
+@conditional(listing_validator('Artist'))
+def api_artists():
+  # ?city=&state=&genre=&q=, cursor-paginated or ?format=ndjson
+  query = select(*ARTIST_FIELDS).where(*entity_filters(Artist))
+  keys = [Artist.id]
+  if request.args.get('q'):
+    criteria, rank = artist_search.search(request.args['q'])
+    query = query.where(criteria).add_columns(rank)
+    keys = [rank, Artist.name, Artist.id]
+  return listing_response(query, keys)
+
+@api.route('/artists/<int:artist_id>')
+@conditional(artist_validator)
+def api_artist(artist_id):
+  data = artist_details(artist_id)
+  if data is None:
+    abort(404)
+  return json_response(data)
+
+@api.route('/shows')
+@conditional(listing_validator('Venue', 'Artist', 'Show'))
+def api_shows():
+  # ?venue_id=&artist_id=&from=&to=&city=&genre= (as on /shows),
+  # cursor-paginated or ?format=ndjson
+  criteria, _ = show_filters()
+  if request.args.get('venue_id', type=int):
+    criteria.append(Show.venue_id == request.args.get('venue_id', type=int))
+  if request.args.get('artist_id', type=int):
+    criteria.append(Show.artist_id == request.args.get('artist_id', type=int))
+  return listing_response(shows_with_names(*criteria), SHOW_KEYS)
+
+@api.route('/venues/availability', defaults={'kind': 'venues'})
+@api.route('/artists/availability', defaults={'kind': 'artists'})
+def api_availability(kind):
+  # ?id=&city=&state=&genre=&from=&to=&min= (see availability_data), 400
+  # when more than AVAILABILITY_MAX_IDS venues or artists match
+  start, end, minimum, entities = availability_data(kind, app.config['AVAILABILITY_MAX_IDS'])
+  if len(entities) > app.config['AVAILABILITY_MAX_IDS']:
+    abort(400)
+  for entity in entities:
+    entity["free"] = [{"from": since, "to": until} for since, until in entity["free"]]
+  return json_response({"from": start, "to": end, "min_minutes": int(minimum.total_seconds()) // 60,
+    "show_minutes": app.config['SHOW_LENGTH_MINUTES'], "data": entities})
+
+@api.route('/shows', methods=['POST'])
+def api_schedule_shows():
+  # {"shows": [{"venue_id", "artist_id", "start_time"}, ...], "partial": false}
+  # (admin only): 201 when every show was added, else the rejected ones by
+  # index - 409 when any was for a conflict, 422 when all were invalid. The
+  # rest are then added only when "partial" is true.
+  require_admin()
+  body = request.get_json(silent=True)
+  if not isinstance(body, dict) or not isinstance(body.get('shows'), list) \
+      or not isinstance(body.get('partial', False), bool):
+    abort(400)
+  if len(body['shows']) > app.config['SCHEDULE_MAX_SHOWS']:
+    abort(413)
+  created, rejected = commit_schedule(body['shows'], body.get('partial', False))
+  return json_response({
+    "created": [{"index": index, "id": id} for index, id, _ in created],
+    "rejected": [dict(index=index, **rejected[index]) for index in sorted(rejected)],
+  }, 201 if not rejected else 409 if any('conflicts' in problem for problem in rejected.values()) else 422)
+
+app.register_blueprint(api)
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+def plan_check_paths():
+  # one representative request per read route, against existing rows
+  venue_id = db.session.query(func.min(Venue.id)).scalar() or 1
+  artist_id = db.session.query(func.min(Artist.id)).scalar() or 1
+  return [
+    '/venues',
+    '/venues/search?search_term=music',
+    '/venues/%d' % venue_id,
+    '/venues/%d/edit' % venue_id,
+    '/artists',
+    '/artists/search?search_term=band',
+    '/artists/%d' % artist_id,
+    '/artists/%d/edit' % artist_id,
+    '/shows',
+    '/search/autocomplete?q=the',
+  ]
+
+@app.cli.command('check-plans')
+def check_plans():
+  """EXPLAIN every query issued by the read routes; fail on sequential scans.
+
+  Runs against the configured (seeded) database with enable_seqscan off,
+  so any Seq Scan left in a plan means no usable index exists for it.
+  """
+  if db.engine.dialect.name != 'postgresql':
+    raise click.ClickException('check-plans needs a PostgreSQL database')
+  missing = pool.missing_extensions(db.session.connection(), app.config['DB_EXTENSIONS'])
+  if missing:
+    raise click.ClickException('missing extension(s): %s (see DB_EXTENSIONS in config.py)' % ', '.join(missing))
+  paths = plan_check_paths()
+  statements = []
+
+  def capture(conn, cursor, statement, parameters, context, executemany):
+    if statement.lstrip().upper().startswith('SELECT'):
+      statements.append((statement, parameters))
+
+  event.listen(db.engine, 'before_cursor_execute', capture)
+  # a page served from the cache issues no queries, leaving nothing to check
+  cache_enabled, app.config['CACHE_ENABLED'] = app.config['CACHE_ENABLED'], False
+  client = app.test_client()
+  failures = 0
+  raw = db.engine.raw_connection()
+  try:
+    cursor = raw.cursor()
+    cursor.execute('SET enable_seqscan = off')
+    for path in paths:
+      del statements[:]
+      status = client.get(path).status_code
+      scans = []
+      for statement, parameters in statements:
+        cursor.execute('EXPLAIN ' + statement, parameters)
+        scans += [line for (line,) in cursor.fetchall() if 'Seq Scan' in line]
+      if status >= 500 or scans:
+        failures += 1
+      click.echo('%s %s (%d queries, HTTP %d)' % ('FAIL' if scans or status >= 500 else 'ok  ', path, len(statements), status))
+      for line in scans:
+        click.echo('       ' + line.strip())
+  finally:
+    event.remove(db.engine, 'before_cursor_execute', capture)
+    app.config['CACHE_ENABLED'] = cache_enabled
+    raw.close()
+  if failures:
+    raise click.ClickException('%d route(s) regressed to sequential scans' % failures)
+
+def venue_row(data):
+  seeking = data['seeking_talent'] == 'Yes'
+  return {"name": data['name'], "city": data['city'], "state": data['state'], "address": data['address'],
+    "phone": data['phone'], "image_link": data['image_link'], "genres": data['genres'],
+    "website": data['website'], "facebook_link": data['facebook_link'], "seeking_talent": seeking,
+    "seeking_description": data['seeking_description'] if seeking else ''}
+
+def artist_row(data):
+  seeking = data['seeking_venue'] == 'Yes'
+  return {"name": data['name'], "city": data['city'], "state": data['state'], "phone": data['phone'],
+    "image_link": data['image_link'], "genres": data['genres'], "website": data['website'],
+    "facebook_link": data['facebook_link'], "seeking_venue": seeking,
+    "seeking_description": data['seeking_description'] if seeking else ''}
+
+def show_row(data):
+  return {"venue_id": int(data['venue_id']), "artist_id": int(data['artist_id']), "start_time": data['start_time']}
+
+def show_tags(rows):
+  tags = set(['shows'])
+  for row in rows:
+    tags.add('venue:%d' % row['venue_id'])
+    tags.add('artist:%d' % row['artist_id'])
+  return tags
+
+# kind -> (form in forms.py, model, form data -> row, committed rows -> page cache tags)
+IMPORTS = {
+  'venues': ('VenueForm', Venue, venue_row, lambda rows: ['venues']),
+  'artists': ('ArtistForm', Artist, artist_row, lambda rows: ['artists']),
+  # every cached detail page also carries the 'venues' or 'artists' tag, so
+  # three tags cover a batch without a tag file per venue and artist
+  'shows': ('ShowForm', Show, show_row, lambda rows: ['shows', 'venues', 'artists']),
+}
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(IMPORTS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=None, type=int, help='Rows per batch and commit.')
+@click.option('--copy/--no-copy', 'use_copy', default=False, help='Load batches with PostgreSQL COPY.')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint and start from the first record.')
+@click.option('--errors', type=click.File('w'), default='-', help='Where to write rejected records (NDJSON).')
+def import_command(kind, path, fmt, batch_size, use_copy, restart, errors):
+  """Bulk-load venues, artists or shows from CSV or NDJSON.
+
+  Records are validated like the create forms; list fields in CSV are
+  separated by '|'. Rejected records are reported and skipped, and the
+  import resumes after the last committed batch when run again.
+  """
+  import forms
+  import importer
+  form_name, model, convert, tags = IMPORTS[kind]
+  checkpoints = importer.Checkpoints(db, ImportCheckpoint.__table__, importer.source_key(kind, path))
+  if restart:
+    checkpoints.clear()
+  loader = importer.BulkLoader(db, model.__table__, use_copy)
+
+  def report(number, problems):
+    errors.write(json.dumps({"record": number, "errors": problems}) + '\n')
+
+  def loaded(rows):
+    page_cache.invalidate(*tags(rows))
+
+  started = datetime.now()
+  records = importer.read_records(path, fmt or importer.detect_format(path))
+  stats = importer.run_import(db, records, importer.FormValidator(getattr(forms, form_name)), convert, loader, checkpoints,
+    batch_size or app.config['IMPORT_BATCH_SIZE'], report, loaded)
+  elapsed = (datetime.now() - started).total_seconds()
+  click.echo('%(loaded)d loaded, %(rejected)d rejected, %(skipped)d skipped (already imported)' % stats, err=True)
+  click.echo('%.1fs, %d records/s' % (elapsed, stats['read'] / elapsed if elapsed else 0), err=True)
+
+@app.cli.command('export')
+@click.argument('directory', type=click.Path(file_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['ndjson', 'csv']), default='ndjson', show_default=True)
+@click.option('--table', 'kinds', multiple=True, type=click.Choice(sorted(EXPORTS)), help='Only these tables (repeatable).')
+@click.option('--restart', is_flag=True, help='Ignore the manifest and export every table again.')
+def export_command(directory, fmt, kinds, restart):
+  """Export venues, artists and shows from one consistent snapshot.
+
+  Writes DIRECTORY/<table>.<format>.gz and a manifest.json. Rerunning an
+  interrupted export skips the tables already written, unless the data
+  changed in between, in which case every table is exported again.
+  """
+  import exporter
+  tables = dict((kind, table) for kind, table in EXPORTS.items() if not kinds or kind in kinds)
+  started = datetime.now()
+  manifest = exporter.export_catalog(db.engine, tables, TableVersion.__table__, directory, fmt,
+    app.config['STREAM_BATCH_SIZE'], dumps=dumps, restart=restart, log=lambda message: click.echo(message, err=True))
+  click.echo('snapshot at %s, %.1fs' % (manifest['snapshot_at'], (datetime.now() - started).total_seconds()), err=True)
+
+@app.cli.command('roll-counters')
+def roll_counters():
+  """Move shows that have started since the last run from upcoming to past.
+
+  Run it from cron or a scheduler every few minutes: listing pages count
+  a show as upcoming until the first run after it starts.
+  """
+  moved = db.session.execute(select(func.fyyur_roll_show_counters())).scalar()
+  db.session.commit()
+  if moved:
+    page_cache.invalidate('venues', 'artists')
+  click.echo('%d show(s) moved from upcoming to past' % moved, err=True)
+
+def counter_drift(model, key, boundary):
+  # rows whose maintained counters differ from a recount at the boundary
+  counts = db.session.query(key.label('id'),
+      func.count().filter(Show.start_time >= boundary).label('upcoming'),
+      func.count().filter(Show.start_time < boundary).label('past')) \
+    .group_by(key).subquery()
+  upcoming, past = func.coalesce(counts.c.upcoming, 0), func.coalesce(counts.c.past, 0)
+  return db.session.query(model.id, model.upcoming_shows_count, model.past_shows_count,
+      upcoming.label('upcoming'), past.label('past')) \
+    .outerjoin(counts, counts.c.id == model.id) \
+    .filter((model.upcoming_shows_count != upcoming) | (model.past_shows_count != past)) \
+    .order_by(model.id) \
+    .all()
+
+def bucket_drift():
+  # (venue_id, day, kept, actual) for every show_days row that is wrong,
+  # missing or left over
+  day = cast(Show.start_time, db.Date)
+  actual = db.session.query(Show.venue_id.label('venue_id'), day.label('day'), func.count().label('shows')) \
+    .filter(Show.venue_id.isnot(None), Show.start_time.isnot(None)) \
+    .group_by(Show.venue_id, day).subquery()
+  kept = ShowDay.__table__
+  joined = actual.join(kept, db.and_(kept.c.venue_id == actual.c.venue_id, kept.c.day == actual.c.day), full=True)
+  return db.session.query(func.coalesce(actual.c.venue_id, kept.c.venue_id).label('venue_id'),
+      func.coalesce(actual.c.day, kept.c.day).label('day'),
+      func.coalesce(kept.c.shows, 0).label('kept'), func.coalesce(actual.c.shows, 0).label('actual')) \
+    .select_from(joined) \
+    .filter(func.coalesce(kept.c.shows, 0) != func.coalesce(actual.c.shows, 0)) \
+    .all()
+
+@app.cli.command('reconcile-counters')
+@click.option('--repair', is_flag=True, help='Overwrite drifted counters with the recounted values.')
+def reconcile_counters(repair):
+  """Recount upcoming/past counters and per-day buckets; report or repair drift.
+
+  Show writes wait for the duration of the check, so run it off-peak.
+  Exits non-zero when drift is found and not repaired.
+  """
+  # the locks keep writers and roll-counters out until we commit; show_days
+  # first, in the order the Show triggers take them
+  db.session.execute(db.text('LOCK TABLE show_days IN SHARE MODE'))
+  boundary = db.session.query(ShowCounters.rolled_to).filter(ShowCounters.id == 1).with_for_update().scalar()
+  drifted = 0
+  for model, key in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+    rows = counter_drift(model, key, boundary)
+    for row in rows:
+      click.echo('%s %d: upcoming %d -> %d, past %d -> %d' % (model.__tablename__, row.id,
+        row.upcoming_shows_count, row.upcoming, row.past_shows_count, row.past))
+    if rows and repair:
+      db.session.execute(model.__table__.update().where(model.id == db.bindparam('_id')).values(
+        upcoming_shows_count=db.bindparam('_upcoming'), past_shows_count=db.bindparam('_past')),
+        [{'_id': row.id, '_upcoming': row.upcoming, '_past': row.past} for row in rows])
+    drifted += len(rows)
+  rows = bucket_drift()
+  for row in rows:
+    click.echo('show_days venue %d %s: %d -> %d' % (row.venue_id, row.day, row.kept, row.actual))
+  if rows and repair:
+    for row in rows:
+      ShowDay.query.filter_by(venue_id=row.venue_id, day=row.day).delete()
+    buckets = [{'venue_id': row.venue_id, 'day': row.day, 'shows': row.actual} for row in rows if row.actual]
+    if buckets:
+      db.session.execute(ShowDay.__table__.insert(), buckets)
+  drifted += len(rows)
+  db.session.commit()
+  if drifted and repair:
+    page_cache.invalidate('venues', 'artists', 'shows')
+  click.echo('%d row(s) drifted%s' % (drifted, ', repaired' if drifted and repair else ''), err=True)
+  if drifted and not repair:
+    raise click.ClickException('counters drifted; rerun with --repair')
+
+def partitioned_connection():
+  import partitioning
+  connection = db.session.connection()
+  if db.engine.dialect.name != 'postgresql' or not partitioning.is_partitioned(connection):
+    raise click.ClickException('Show is not partitioned (PostgreSQL only, see the partition_shows_by_month migration)')
+  return connection
+
+@app.cli.group('partitions')
+def partitions_command():
+  """Create, list and archive the monthly partitions of Show."""
+
+@partitions_command.command('list')
+def list_partitions():
+  """Print every monthly partition with its range and row count."""
+  import partitioning
+  connection = partitioned_connection()
+  for name, first, last in partitioning.partitions(connection):
+    rows = connection.execute(db.text('SELECT count(*) FROM "%s"' % name)).scalar()
+    click.echo('%-16s %s .. %s %10d' % (name, first, last, rows))
+  click.echo('%-16s %24s %10d' % (partitioning.DEFAULT, '', partitioning.default_rows(connection)))
+
+@partitions_command.command('ensure')
+@click.option('--ahead', default=None, type=int, help='Months after the current one [default: PARTITION_MONTHS_AHEAD].')
+def ensure_partitions(ahead):
+  """Create the partitions of the coming months.
+
+  Run it daily from cron or a scheduler. Shows of a month that had no
+  partition yet wait in the default partition and are moved into their
+  month when it is created.
+  """
+  import partitioning
+  connection = partitioned_connection()
+  created = partitioning.ensure(connection, app.config['PARTITION_MONTHS_AHEAD'] if ahead is None else ahead)
+  db.session.commit()
+  for name, moved in created:
+    click.echo('created %s%s' % (name, ' (%d show(s) moved from the default partition)' % moved if moved else ''), err=True)
+  click.echo('%d partition(s) created' % len(created), err=True)
+
+@partitions_command.command('archive')
+@click.option('--before', default=None, help='YYYY-MM: archive the months before this one [default: ARCHIVE_AFTER_MONTHS ago].')
+@click.option('--drop', is_flag=True, help='Drop the detached partitions instead of keeping them in the archive schema.')
+def archive_partitions(before, drop):
+  """Detach the partitions of old months from Show.
+
+  Their shows leave the live table, the past show counters and the
+  calendar buckets; they stay queryable as archive."Show_yYYYYmMM" unless
+  --drop is given. Detaching locks Show briefly, so run it off-peak.
+  """
+  import partitioning
+  connection = partitioned_connection()
+  try:
+    first_kept = partitioning.parse_month(before) if before else \
+      partitioning.add_months(partitioning.month_floor(datetime.utcnow()), -app.config['ARCHIVE_AFTER_MONTHS'])
+  except ValueError:
+    raise click.BadParameter('expected YYYY-MM', param_hint='--before')
+  try:
+    archived = partitioning.archive(connection, first_kept, drop)
+  except ValueError as e:
+    raise click.ClickException(str(e))
+  db.session.commit()
+  if archived:
+    page_cache.clear()
+  for name, rows in archived:
+    click.echo('%s %s (%d show(s))' % ('dropped' if drop else 'archived', name, rows), err=True)
+  click.echo('%d partition(s) before %s %s' % (len(archived), first_kept, 'dropped' if drop else 'archived'), err=True)
+
+@app.cli.group('assets')
+def assets_command():
+  """Build the fingerprinted, precompressed static assets."""
+
+@assets_command.command('build')
+def build_assets():
+  """Bundle, minify and fingerprint static/ into ASSETS_DIR.
+
+  Run it on every deploy, before the workers start. Pages already cached
+  point at the previous build, so the page cache is cleared.
+  """
+  manifest = assets.build(app)
+  page_cache.clear()
+  for bundle, name in sorted(manifest['bundles'].items()):
+    click.echo('%-10s %s' % (bundle, name), err=True)
+  click.echo('%d file(s), %d bundle(s) in %s' % (len(manifest['files']), len(manifest['bundles']), app.config['ASSETS_DIR']), err=True)
+
+@app.cli.group('templates')
+def templates_command():
+  """Precompile the Jinja templates into the bytecode cache."""
+
+@templates_command.command('compile')
+@click.option('--verbose', is_flag=True, help='Print the timings of every template.')
+def compile_templates(verbose):
+  """Compile every template into TEMPLATE_CACHE_DIR.
+
+  Run it on every deploy, before the workers start. Prints how long the
+  templates take to compile from source and to load from the cache, the
+  first-request cost each new worker saves.
+  """
+  if app.jinja_env.bytecode_cache is None:
+    raise click.ClickException('TEMPLATE_CACHE_DIR is not set')
+  compiled, loaded = warmup.compile_all(app)
+  if verbose:
+    for (name, compile_time), (_, load_time) in zip(compiled, loaded):
+      click.echo('%-40s %8.2f ms %8.2f ms' % (name, compile_time * 1000, load_time * 1000))
+  click.echo('%d templates: %.1f ms compiling, %.1f ms from the bytecode cache' % (
+    len(compiled), sum(t for _, t in compiled) * 1000, sum(t for _, t in loaded) * 1000), err=True)
+
+@app.cli.command('profile-startup')
+@click.option('--runs', default=5, show_default=True, help='Fresh interpreters per mode; medians are reported.')
+@click.option('--top', default=15, show_default=True, help='Modules listed per mode.')
+def profile_startup(runs, top):
+  """Report how long a new process takes to import the app, per module.
+
+  Imports app.py in fresh interpreters with -X importtime, as a web worker
+  does (templates warmed up) and as a CLI command does (migrations
+  loaded), and lists the modules it imports directly, slowest first.
+  """
+  import benchmark
+  for mode, env in (('web worker', {}), ('CLI command', {'FLASK_RUN_FROM_CLI': 'true'})):
+    total, modules = benchmark.startup_profile('app', runs, env, app.root_path)
+    click.echo('%s: %.1f ms to import app' % (mode, total * 1000))
+    for name, seconds in sorted(modules.items(), key=lambda item: -item[1])[:top]:
+      click.echo('  %-24s %8.1f ms' % (name, seconds * 1000))
+
+@app.cli.command('seed')
+@click.option('--venues', default=1000, show_default=True)
+@click.option('--artists', default=5000, show_default=True)
+@click.option('--shows', default=50000, show_default=True)
+@click.option('--seed', 'seed_value', default=1, show_default=True, help='Same seed, same dataset.')
+@click.option('--batch-size', default=50000, show_default=True, help='Rows per COPY and commit.')
+def seed_command(venues, artists, shows, seed_value, batch_size):
+  """Add a synthetic, realistically skewed dataset to the database.
+
+  For example --venues 10000 --artists 100000 --shows 5000000. Shows go to
+  the generated venues and artists, or to existing ones when none are
+  generated.
+  """
+  import dataset
+  import importer
+  rng = random.Random(seed_value)
+  use_copy = db.engine.dialect.name == 'postgresql'
+  ids = {}
+  for kind, model, count, rows in (
+      ('venues', Venue, venues, lambda start: dataset.venue_rows(rng, venues, GENRES, start)),
+      ('artists', Artist, artists, lambda start: dataset.artist_rows(rng, artists, GENRES, start))):
+    after = dataset.max_id(db, model.__table__)
+    if count:
+      loader = importer.BulkLoader(db, model.__table__, use_copy)
+      dataset.load(db, loader, rows(after), batch_size)
+      click.echo('%s: %d' % (kind, count), err=True)
+    ids[kind] = dataset.new_ids(db, model.__table__, after if count else 0)
+  if shows:
+    if not ids['venues'] or not ids['artists']:
+      raise click.ClickException('shows need at least one venue and one artist')
+    loader = importer.BulkLoader(db, Show.__table__, use_copy)
+    # random times overlap: such shows are added, but left unbooked (see scheduling.py)
+    dataset.load(db, loader, dataset.show_rows(rng, shows, ids['venues'], ids['artists']), batch_size,
+      lambda count: click.echo('shows: %d' % count, err=True),
+      {'fyyur.unchecked_bookings': 'on'} if use_copy else None)
+  if use_copy:
+    db.session.execute(db.text('ANALYZE "Venue", "Artist", "Show"'))
+    db.session.commit()
+  page_cache.clear()
+
+def benchmark_paths():
+  # every read route, for the busiest and for a random venue and artist
+  busiest_venue = db.session.query(Show.venue_id).group_by(Show.venue_id) \
+    .order_by(func.count().desc()).limit(1).scalar() or 1
+  busiest_artist = db.session.query(Show.artist_id).group_by(Show.artist_id) \
+    .order_by(func.count().desc()).limit(1).scalar() or 1
+  rng = random.Random(0)
+  venue_id = rng.randint(*db.session.query(func.min(Venue.id), func.max(Venue.id)).one()) \
+    if db.session.query(Venue.id).first() else 1
+  artist_id = rng.randint(*db.session.query(func.min(Artist.id), func.max(Artist.id)).one()) \
+    if db.session.query(Artist.id).first() else 1
+  month = datetime.utcnow().date().replace(day=1)
+  return [
+    '/',
+    '/venues',
+    '/venues/search?search_term=the',
+    '/search/autocomplete?q=blu',
+    '/venues/%d' % busiest_venue,
+    '/venues/%d' % venue_id,
+    '/venues/%d/edit' % busiest_venue,
+    '/venues/create',
+    '/artists',
+    '/artists/search?search_term=wolf',
+    '/artists/%d' % busiest_artist,
+    '/artists/%d' % artist_id,
+    '/artists/%d/edit' % busiest_artist,
+    '/artists/create',
+    '/shows',
+    '/shows?from=%s&to=%s' % (month.isoformat(), (month + timedelta(days=30)).isoformat()),
+    '/shows/calendar',
+    '/shows/calendar?genre=Jazz',
+    '/venues/%d/calendar' % busiest_venue,
+    '/artists/%d/calendar' % busiest_artist,
+    '/venues/availability?city=New+York',
+    '/artists/availability?id=%d' % busiest_artist,
+    '/shows/create',
+    '/api/v1/venues',
+    '/api/v1/venues?q=blue',
+    '/api/v1/venues/%d' % busiest_venue,
+    '/api/v1/artists',
+    '/api/v1/artists/%d' % busiest_artist,
+    '/api/v1/shows',
+    '/api/v1/shows?venue_id=%d' % busiest_venue,
+    '/api/v1/venues/availability?city=New+York',
+    '/healthz',
+    '/readyz',
+    '/metrics',
+    '/metrics/cache',
+  ]
+
+@app.cli.command('benchmark')
+@click.option('--http', 'base_url', help='Benchmark a running server at this URL instead of the test client.')
+@click.option('--requests', 'count', default=200, show_default=True, help='Timed requests per path.')
+@click.option('--concurrency', default=4, show_default=True, help='Parallel connections (--http only).')
+@click.option('--warmup', default=5, show_default=True)
+@click.option('--route', 'patterns', multiple=True, help='Only paths containing this text (repeatable).')
+@click.option('--cache/--no-cache', default=False, show_default=True, help='Page cache on (test client only).')
+@click.option('--output', type=click.Path(dir_okay=False), help='Defaults to benchmarks/<timestamp>-<commit>.json.')
+@click.option('--compare', 'previous', type=click.File('r'), help='Earlier result file to compare p95 against.')
+def benchmark_command(base_url, count, concurrency, warmup, patterns, cache, output, previous):
+  """Measure throughput and p50/p95/p99 latency of every read route.
+
+  Exits non-zero when any request fails with a 5xx or a connection error.
+  """
+  import benchmark
+  paths = [path for path in benchmark_paths() if not patterns or any(p in path for p in patterns)]
+  adapter = app.url_map.bind('localhost')
+  covered = set(adapter.match(path.split('?')[0])[0] for path in benchmark_paths())
+  skipped = sorted(rule.endpoint for rule in app.url_map.iter_rules()
+    if 'GET' in rule.methods and rule.endpoint not in covered and rule.endpoint != 'static')
+  if skipped:
+    click.echo('not benchmarked: %s' % ', '.join(skipped), err=True)
+  dataset_size = dict((model.__tablename__, db.session.query(func.count(model.id)).scalar())
+    for model in (Venue, Artist, Show))
+  db.session.remove()
+
+  def progress(path, summary):
+    click.echo('%-48s %8s rps  p50 %8s  p95 %8s  p99 %8s ms%s' % (path, summary['rps'], summary['p50_ms'],
+      summary['p95_ms'], summary['p99_ms'], '  %d errors' % summary['errors'] if summary['errors'] else ''))
+
+  if base_url:
+    routes = benchmark.run_http(base_url, paths, count, concurrency, warmup, progress)
+    settings = {"requests": count, "concurrency": concurrency, "url": base_url}
+  else:
+    app.config['CACHE_ENABLED'] = cache
+    routes = benchmark.run_client(app, paths, count, warmup, progress)
+    settings = {"requests": count, "concurrency": 1, "cache": cache}
+  result = benchmark.report('http' if base_url else 'client', routes, dataset_size, settings)
+  if not output:
+    os.makedirs('benchmarks', exist_ok=True)
+    output = os.path.join('benchmarks', '%s-%s.json' % (result['timestamp'].replace(':', ''), result['commit'] or 'unknown'))
+  benchmark.save(output, result)
+  click.echo('saved %s' % output, err=True)
+  if previous is not None:
+    click.echo('p95 ms, previous -> current:')
+    for line in benchmark.compare(json.load(previous), result):
+      click.echo(line)
+  failed = [path for path, summary in routes.items() if summary['errors']]
+  if failed:
+    raise click.ClickException('%d path(s) returned errors, left out of their latencies: %s' % (
+      len(failed), ', '.join(failed)))
+
 #----------------------------------------------------------------------------#
 # Error handler.
 #----------------------------------------------------------------------------#
@@ -630,11 +1937,13 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
+    warmup.on_start(app)
     app.run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
+    warmup.on_start(app)
     app.run(host='0.0.0.0', port=port)
 '''
@@ -0,0 +1,358 @@
+#----------------------------------------------------------------------------#
+# ASGI entry point with asyncio database access for the read routes.
+#
+#   uvicorn asgi:application --workers 2
+#
+# GET requests for the venue, artist and show listings, the venue and
+# artist pages and the searches are served on the event loop. Their
+# queries are the select() statements the Flask views execute (app.py),
+# built without a session and executed on an AsyncEngine (asyncpg, same
+# pool settings), and queries that don't depend on each other - the
+# conditional GET validators, a search page and its count, venue and
+# artist completions - run concurrently on separate connections.
+# Responses are rendered from the same templates inside the Flask request
+# context, and go through the app's request hooks, page cache and ETag /
+# Last-Modified checks like the sync views. Rendering, the page cache's
+# disk I/O and the after-request hooks run on a thread pool, so the event
+# loop only waits on sockets.
+#
+# Every other request (forms, writes, the API, ?all=1 streams, static
+# files) goes to the Flask app as WSGI, on a thread pool as large as the
+# sync engine's connection pool, and its response is streamed back chunk
+# by chunk. PostgreSQL only: the sync app keeps serving SQLite during
+# development.
+#----------------------------------------------------------------------------#
+
+import asyncio
+import contextvars
+import functools
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Response, g, jsonify, render_template, request, request_started
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import app as fyyur
+import pool
+import warmup
+from cache import add_validators, as_utc, not_modified
+
+ROUTES = {}
+
+
+def route(endpoint, unless=None):
+    # serve GET requests for endpoint here; unless() -> True leaves one to Flask
+    def decorator(handler):
+        ROUTES[endpoint] = (handler, unless)
+        return handler
+    return decorator
+
+
+async def nothing():
+    return None
+
+
+async def offload(function, *args, **kwargs):
+    # function on the loop's default thread pool, in the current context
+    # (so inside the request context it is called from)
+    call = functools.partial(contextvars.copy_context().run, function, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(None, call)
+
+
+class AsyncReads(object):
+    # runs the statements built by app.py on the AsyncEngine, one session
+    # (and connection) per statement so that several can run at once
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def all(self, query):
+        async with AsyncSession(self.engine) as session:
+            return (await session.execute(query)).all()
+
+    async def first(self, query):
+        rows = await self.all(query.limit(1))
+        return rows[0] if rows else None
+
+    async def scalar(self, query):
+        row = await self.first(query)
+        return row[0] if row is not None else None
+
+    async def paginate(self, query, keys, cursor=None, limit=None):
+        query, forward, limit = fyyur.page_query(query, keys, cursor, limit)
+        return fyyur.page_rows(await self.all(query), keys, cursor, forward, limit)
+
+    async def validators(self, view, kwargs):
+        # what the view's conditional() validator computes, or None
+        validator = getattr(view, 'validator', None)
+        if validator is None:
+            return None
+        tables = getattr(validator, 'tables', None)
+        if tables is not None:
+            rows, transition = await asyncio.gather(
+                self.all(fyyur.table_versions_query(tables)),
+                self.scalar(fyyur.last_show_transition_query()) if 'Show' in tables else nothing())
+            return fyyur.listing_validators(tables, rows, transition)
+        (id,) = kwargs.values()
+        row, transition = await asyncio.gather(
+            self.first(fyyur.row_version_query(validator.model, id)),
+            self.scalar(fyyur.last_show_transition_query(validator.show_key == id)))
+        return fyyur.row_validators(validator.model, id, row, transition)
+
+
+#  Routes
+#  ----------------------------------------------------------------
+
+@route('venues')
+async def venues(reads):
+    cursor, limit = fyyur.page_args()
+    rows, page = await reads.paginate(fyyur.venues_with_upcoming_counts(), fyyur.VENUE_KEYS, cursor, limit)
+    return await offload(render_template, 'pages/venues.html', areas=fyyur.group_venues_by_area(rows), page=page)
+
+
+@route('search_venues')
+async def search_venues(reads):
+    Venue = fyyur.Venue
+    name = request.values.get('search_term', '')
+    criteria, rank = fyyur.venue_search.search(name)
+    cursor, limit = fyyur.page_args()
+    query = fyyur.venues_with_upcoming_counts(criteria).add_columns(rank)
+    (rows, page), count = await asyncio.gather(
+        reads.paginate(query, [rank, Venue.name, Venue.id], cursor, limit),
+        reads.scalar(fyyur.search_count_query(Venue, criteria)))
+    page["args"] = {"search_term": name}
+    return await offload(render_template, 'pages/search_venues.html', results=fyyur.search_results(rows, count),
+                         search_term=name, page=page)
+
+
+@route('show_venue')
+async def show_venue(reads, venue_id):
+    data = fyyur.venue_details_data(await reads.all(fyyur.venue_details_query(venue_id)))
+    if data is None:
+        return await offload(fyyur.not_found_error, "Venue does not exist")
+    return await offload(render_template, 'pages/show_venue.html', venue=data)
+
+
+@route('artists')
+async def artists(reads):
+    cursor, limit = fyyur.page_args()
+    rows, page = await reads.paginate(fyyur.artists_query(), fyyur.ARTIST_KEYS, cursor, limit)
+    data = [{"id": row.id, "name": row.name} for row in rows]
+    return await offload(render_template, 'pages/artists.html', artists=data, page=page)
+
+
+@route('search_artists')
+async def search_artists(reads):
+    Artist = fyyur.Artist
+    name = request.values.get('search_term', '')
+    criteria, rank = fyyur.artist_search.search(name)
+    cursor, limit = fyyur.page_args()
+    query = fyyur.artists_with_upcoming_counts(criteria).add_columns(rank)
+    (rows, page), count = await asyncio.gather(
+        reads.paginate(query, [rank, Artist.name, Artist.id], cursor, limit),
+        reads.scalar(fyyur.search_count_query(Artist, criteria)))
+    page["args"] = {"search_term": name}
+    return await offload(render_template, 'pages/search_artists.html', results=fyyur.search_results(rows, count),
+                         search_term=name, page=page)
+
+
+@route('show_artist')
+async def show_artist(reads, artist_id):
+    data = fyyur.artist_details_data(await reads.all(fyyur.artist_details_query(artist_id)))
+    if data is None:
+        return await offload(fyyur.not_found_error, "Artist does not exist")
+    return await offload(render_template, 'pages/show_artist.html', artist=data)
+
+
+@route('search_autocomplete')
+async def search_autocomplete(reads):
+    prefix = request.args.get('q', '').strip()
+    kind = request.args.get('type')
+    limit = min(request.args.get('limit', 10, type=int), 25)
+    response = {}
+    if prefix:
+        searches = [(name, searcher) for name, searcher in
+                    (('venues', fyyur.venue_search), ('artists', fyyur.artist_search)) if kind in (None, name)]
+        results = await asyncio.gather(*[reads.all(searcher.complete_query(prefix, limit))
+                                         for _, searcher in searches])
+        for (name, _), rows in zip(searches, results):
+            response[name] = [{"id": row.id, "name": row.name} for row in rows]
+    return jsonify(response)
+
+
+@route('shows', unless=lambda: request.args.get('all'))
+async def shows(reads):
+    criteria, args = fyyur.show_filters()
+    cursor, limit = fyyur.page_args()
+    rows, page = await reads.paginate(fyyur.shows_with_names(*criteria), fyyur.SHOW_KEYS, cursor, limit)
+    page["args"] = args
+    data = [fyyur.show_tile(row) for row in rows]
+    return await offload(render_template, 'pages/shows.html', shows=data, page=page, filters=args,
+                         genres=fyyur.GENRES)
+
+
+#  Application
+#  ----------------------------------------------------------------
+
+def wsgi_environ(scope, body=b''):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': 'HTTP/%s' % scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1').upper().replace('-', '_'), value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        environ[name] = environ[name] + ',' + value if name in environ else value
+    return environ
+
+
+def asgi_headers(headers):
+    return [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+
+class Application(object):
+
+    def __init__(self, app, engine, threads):
+        self.app = app
+        self.reads = AsyncReads(engine)
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif not (scope['type'] == 'http' and scope['method'] == 'GET' and await self.serve(scope, send)):
+            await self.call_wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await asyncio.get_running_loop().run_in_executor(self.executor, warmup.on_start, self.app)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.reads.engine.dispose()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def serve(self, scope, send):
+        # answer a request for one of ROUTES like Flask's full_dispatch_request();
+        # False when it belongs to the Flask app
+        app = self.app
+        with app.request_context(wsgi_environ(scope)):
+            handler, unless = ROUTES.get(request.endpoint, (None, None)) \
+                if request.routing_exception is None else (None, None)
+            if handler is None or (unless is not None and unless()):
+                return False
+            try:
+                try:
+                    request_started.send(app)
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = await self.dispatch(handler, app.view_functions[request.endpoint], request.view_args)
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                response = await offload(app.finalize_request, rv)
+            except Exception as e:
+                response = app.handle_exception(e)
+            headers = response.get_wsgi_headers(request.environ)
+            body = b''.join(response.get_app_iter(request.environ))
+            response.close()
+            await send({'type': 'http.response.start', 'status': response.status_code,
+                        'headers': asgi_headers(headers.items())})
+            await send({'type': 'http.response.body', 'body': body})
+        return True
+
+    async def call_wsgi(self, scope, receive, send):
+        # the Flask app on a pool thread; each chunk it yields is sent as is
+        body = []
+        while True:
+            message = await receive()
+            body.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        environ = wsgi_environ(scope, b''.join(body))
+        loop = asyncio.get_running_loop()
+
+        def forward(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def run():
+            started = []
+
+            def start_response(status, headers, exc_info=None):
+                started[:] = [{'type': 'http.response.start', 'status': int(status.split(' ', 1)[0]),
+                               'headers': asgi_headers(headers)}]
+
+            iterable = self.app(environ, start_response)
+            try:
+                for chunk in iterable:
+                    if started:
+                        forward(started.pop())
+                    if chunk:
+                        forward({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                if started:
+                    forward(started.pop())
+                forward({'type': 'http.response.body', 'body': b''})
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+
+        await loop.run_in_executor(self.executor, run)
+
+    async def dispatch(self, handler, view, kwargs):
+        # what the view's conditional() and page_cache.cached() decorators do
+        validators = await self.reads.validators(view, kwargs)
+        if validators is not None:
+            etag, last_modified = validators[0], as_utc(validators[1])
+            g.page_etag = etag
+            if not_modified(etag, last_modified):
+                return add_validators(Response(status=304), etag, last_modified)
+        response = await self.cached(handler, view, kwargs)
+        if validators is not None:
+            add_validators(response, etag, last_modified)
+        return response
+
+    async def cached(self, handler, view, kwargs):
+        page_cache = fyyur.page_cache
+        tags = getattr(view, 'cache_tags', None)
+        if tags is None or not page_cache.active():
+            return self.app.make_response(await handler(self.reads, **kwargs))
+        key = page_cache.request_key(tags, kwargs, view.cache_vary)
+        hit = await offload(page_cache.get, key)
+        if hit is not None:
+            body, mimetype = hit
+            return Response(body, mimetype=mimetype)
+        response = self.app.make_response(await handler(self.reads, **kwargs))
+        await offload(page_cache.store_response, key, response)
+        return response
+
+
+def create_application(app):
+    config = app.config
+    engine = create_async_engine(pool.async_url(config['SQLALCHEMY_DATABASE_URI'], config),
+                                 **pool.async_engine_options(config))
+    if config['DB_PGBOUNCER'] and config['DB_STATEMENT_TIMEOUT_MS']:
+        pool.set_local_timeout(engine.sync_engine, config['DB_STATEMENT_TIMEOUT_MS'])
+    if config['METRICS_ENABLED']:
+        fyyur.metrics.instrument(engine.sync_engine)
+    return Application(app, engine, config['DB_POOL_SIZE'] + config['DB_MAX_OVERFLOW'])
+
+
+application = create_application(fyyur.app)
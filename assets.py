@@ -0,0 +1,226 @@
+#----------------------------------------------------------------------------#
+# Static asset pipeline.
+#
+# 'flask assets build' copies every file under static/ into ASSETS_DIR
+# (static/dist) under a name carrying a hash of its content
+# ("css/main.3f2a1b4c5d6e.css"), concatenates and minifies the BUNDLES the
+# layout loads, writes .gz / .br siblings where they are smaller, and
+# records logical name -> hashed name in manifest.json.
+#
+# Templates get URLs through asset_url('img/front-splash.jpg') and
+# asset_urls('main.css'); without a manifest (or with ASSETS_DEBUG) they
+# point at the source files. Files under /static/dist never change, so they
+# are served with a year of immutable caching, precompressed when the
+# client accepts it. Earlier builds are left in place: pages cached or
+# rendered before a deploy keep working.
+#----------------------------------------------------------------------------#
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from flask import abort, current_app, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+# bundle -> source files under static/, in load order
+BUNDLES = {
+    'main.css': ['css/bootstrap.min.css', 'css/layout.main.css', 'css/main.css',
+                 'css/main.responsive.css', 'css/main.quickfix.css'],
+    # loaded synchronously in <head>
+    'head.js': ['js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'],
+    # deferred, after jQuery
+    'main.js': ['js/libs/bootstrap-3.1.1.min.js', 'js/plugins.js', 'js/script.js'],
+}
+
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = ('.css', '.js', '.map', '.json', '.svg', '.eot', '.otf', '.ttf')
+CACHE_CONTROL_MAX_AGE = 365 * 24 * 3600
+
+CSS_COMMENT = re.compile(r'/\*(?!!).*?\*/', re.S)
+CSS_SPACE = re.compile(r'\s*([{};,>])\s*')
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")?#]+)([^\'")]*)\1\s*\)')
+
+manifest = {}
+
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def hashed_name(name, data):
+    root, ext = os.path.splitext(name)
+    return '%s.%s%s' % (root, fingerprint(data), ext)
+
+
+def minify_css(text):
+    if rcssmin is not None:
+        return rcssmin.cssmin(text)
+    # comments (except /*! licences */) and the whitespace around punctuation
+    text = CSS_SPACE.sub(r'\1', CSS_COMMENT.sub('', text))
+    return re.sub(r'\s+', ' ', text).replace(';}', '}').strip()
+
+
+def minify_js(text):
+    if rjsmin is not None:
+        return rjsmin.jsmin(text)
+    return text.strip()
+
+
+def minify(name, text):
+    if name.endswith(('.min.css', '.min.js')):
+        return text.strip()
+    return minify_css(text) if name.endswith('.css') else minify_js(text)
+
+
+def rebase_urls(text, source, files):
+    # url()s relative to a source stylesheet, made absolute so they still
+    # resolve from the bundle; hashed when the target was copied
+    base = os.path.dirname(source)
+
+    def rebase(match):
+        quote, path, rest = match.groups()
+        if re.match(r'^([a-z]+:|/)', path):
+            return match.group(0)
+        target = os.path.normpath(os.path.join(base, path)).replace(os.sep, '/')
+        url = 'dist/' + files[target] if target in files else target
+        return 'url(%s/static/%s%s%s)' % (quote, url, rest, quote)
+
+    return CSS_URL.sub(rebase, text)
+
+
+def write(directory, name, data):
+    # the file and, for text formats, whichever compressed siblings are smaller
+    path = os.path.join(directory, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        return
+    with open(path, 'wb') as f:
+        f.write(data)
+    if not name.endswith(COMPRESSIBLE):
+        return
+    variants = [('.gz', gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data, quality=11)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(data):
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+
+
+def source_files(static_dir, output_dir):
+    for root, dirs, names in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != output_dir)
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            yield os.path.relpath(path, static_dir).replace(os.sep, '/'), path
+
+
+def build(app):
+    # returns the new manifest; existing hashed files are not rewritten
+    static_dir, output_dir = app.static_folder, app.config['ASSETS_DIR']
+    files = {}
+    for name, path in source_files(static_dir, output_dir):
+        with open(path, 'rb') as f:
+            data = f.read()
+        files[name] = hashed_name(name, data)
+        write(output_dir, files[name], data)
+    bundles = {}
+    for bundle, sources in BUNDLES.items():
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_dir, source), encoding='utf-8') as f:
+                text = minify(source, f.read())
+            if bundle.endswith('.css'):
+                text = rebase_urls(text, source, files)
+            parts.append(text)
+        # a statement may be left unterminated at the end of a script
+        data = (';\n' if bundle.endswith('.js') else '\n').join(parts).encode('utf-8')
+        bundles[bundle] = hashed_name('bundles/' + bundle, data)
+        write(output_dir, bundles[bundle], data)
+    result = {'files': files, 'bundles': bundles}
+    with open(os.path.join(output_dir, MANIFEST), 'w') as f:
+        json.dump(result, f, indent=1, sort_keys=True)
+    load(app)
+    return result
+
+
+def load(app):
+    global manifest
+    try:
+        with open(os.path.join(app.config['ASSETS_DIR'], MANIFEST)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        manifest = {}
+
+
+def version():
+    # changes with every build that changes an asset; part of page ETags
+    return fingerprint(json.dumps(manifest, sort_keys=True).encode('utf-8')) if manifest else None
+
+
+def use_manifest(app):
+    return bool(manifest) and not app.config['ASSETS_DEBUG']
+
+
+def asset_url(name):
+    hashed = manifest.get('files', {}).get(name) if use_manifest(current_app) else None
+    if hashed is None:
+        return url_for('static', filename=name)
+    return url_for('assets', filename=hashed)
+
+
+def asset_urls(bundle):
+    # the bundle's URL, or its source files' when it hasn't been built
+    hashed = manifest.get('bundles', {}).get(bundle) if use_manifest(current_app) else None
+    if hashed is None:
+        return [url_for('static', filename=source) for source in BUNDLES[bundle]]
+    return [url_for('assets', filename=hashed)]
+
+
+def accepted_encoding(path):
+    # the precompressed sibling the client takes, if one was written
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[encoding] and os.path.isfile(path + suffix):
+            return encoding, suffix
+    return None, ''
+
+
+def send(filename):
+    directory = current_app.config['ASSETS_DIR']
+    path = safe_join(directory, filename)
+    if path is None or filename == MANIFEST or filename.endswith(('.gz', '.br')) or not os.path.isfile(path):
+        abort(404)
+    encoding, suffix = accepted_encoding(path)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_from_directory(directory, filename + suffix, mimetype=mimetype,
+                                   max_age=CACHE_CONTROL_MAX_AGE)
+    if encoding is not None:
+        response.content_encoding = encoding
+    if filename.endswith(COMPRESSIBLE):
+        response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    app.config.setdefault('ASSETS_DIR', os.path.join(app.static_folder, 'dist'))
+    app.config.setdefault('ASSETS_DEBUG', False)
+    app.add_url_rule(app.static_url_path + '/dist/<path:filename>', 'assets', send)
+    app.jinja_env.globals.update(asset_url=asset_url, asset_urls=asset_urls)
+    load(app)
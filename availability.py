@@ -0,0 +1,47 @@
+#----------------------------------------------------------------------------#
+# Free time of venues and artists.
+#
+# Every show lasts SHOW_LENGTH_MINUTES (see scheduling.py), so the shows
+# overlapping a window [start, end) are exactly those starting in
+# (start - length, end): a range scan of the (venue_id, start_time) or
+# (artist_id, start_time) index of Show per venue or artist, which also
+# prunes the monthly partitions. It returns them in start order.
+#
+# With a fixed length the busy time covered so far only ever grows with
+# the start time, so the free slots of every venue or artist come out of
+# one pass over those rows: the gaps between the end of the time covered
+# so far and the next start, plus the ends of the window. Shows
+# overlapping each other (loaded before bookings were enforced) simply
+# extend the busy time.
+#----------------------------------------------------------------------------#
+
+
+def overlapping(column, start, end, length):
+    # criteria on a start_time column for the shows overlapping [start, end)
+    return [column > start - length, column < end]
+
+
+def free_slots(rows, start, end, length, minimum):
+    # {id: [(free_from, free_to)]} within [start, end), ids in the order of
+    # rows: (id, start_time) ordered by id and start_time, start_time None
+    # for an id without shows in the window (outer joined). Slots shorter
+    # than minimum are left out.
+    free = {}
+
+    def close(id, since, until):
+        if until - since >= minimum:
+            free[id].append((since, until))
+
+    current = since = None
+    for id, start_time in rows:
+        if id != current:
+            if current is not None:
+                close(current, since, end)
+            current, since = id, start
+            free[id] = []
+        if start_time is not None:
+            close(id, since, start_time)
+            since = max(since, start_time + length)
+    if current is not None:
+        close(current, since, end)
+    return free
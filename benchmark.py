@@ -0,0 +1,195 @@
+#----------------------------------------------------------------------------#
+# Route-level benchmarks.
+#
+# Drives a list of paths either in process through the Flask test client
+# (no network, one request at a time) or over HTTP against a running
+# server (persistent connections, optional concurrency), and reports
+# throughput and p50/p95/p99 latency per path; 5xx responses and failed
+# connections are counted as errors and left out of the latencies.
+# Results are plain JSON carrying the git commit and dataset size, so two
+# runs can be compared with compare().
+#
+# startup_profile() measures cold starts instead: fresh interpreters import
+# the app with -X importtime, and the time of each module it imports
+# directly is reported.
+#----------------------------------------------------------------------------#
+
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+PERCENTILES = (('p50', 0.50), ('p95', 0.95), ('p99', 0.99))
+
+
+def percentile(ordered, fraction):
+    # nearest-rank percentile of an already sorted list
+    if not ordered:
+        return None
+    rank = max(1, int(round(fraction * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(latencies, errors, wall):
+    # latencies of the successful requests only: a route failing fast
+    # must not look fast
+    ordered = sorted(latencies)
+    summary = {'requests': len(latencies) + errors, 'errors': errors,
+               'rps': round(len(latencies) / wall, 1) if wall else None,
+               'mean_ms': round(sum(ordered) / len(ordered) * 1000, 2) if ordered else None,
+               'max_ms': round(ordered[-1] * 1000, 2) if ordered else None}
+    for name, fraction in PERCENTILES:
+        value = percentile(ordered, fraction)
+        summary[name + '_ms'] = round(value * 1000, 2) if value is not None else None
+    return summary
+
+
+def run_client(app, paths, requests, warmup=5, progress=None):
+    client = app.test_client()
+    results = {}
+    for path in paths:
+        for _ in range(warmup):
+            client.get(path).close()
+        latencies, errors = [], 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            begin = time.perf_counter()
+            response = client.get(path)
+            response.get_data()
+            elapsed = time.perf_counter() - begin
+            if response.status_code >= 500:
+                errors += 1
+            else:
+                latencies.append(elapsed)
+            response.close()
+        results[path] = summarize(latencies, errors, time.perf_counter() - started)
+        if progress is not None:
+            progress(path, results[path])
+    return results
+
+
+def http_get(connection, path):
+    connection.request('GET', path)
+    response = connection.getresponse()
+    response.read()
+    return response.status
+
+
+def run_http(base_url, paths, requests, concurrency=1, warmup=5, progress=None):
+    parts = urlsplit(base_url)
+    factory = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    prefix = parts.path.rstrip('/')
+    results = {}
+    for path in paths:
+        latencies, errors, lock = [], [0], threading.Lock()
+        remaining = [requests]
+
+        def worker():
+            connection = factory(parts.netloc, timeout=60)
+            try:
+                for _ in range(warmup // concurrency or 1):
+                    http_get(connection, prefix + path)
+                while True:
+                    with lock:
+                        if remaining[0] <= 0:
+                            return
+                        remaining[0] -= 1
+                    begin = time.perf_counter()
+                    try:
+                        failed = http_get(connection, prefix + path) >= 500
+                    except (OSError, http.client.HTTPException):
+                        connection.close()
+                        connection = factory(parts.netloc, timeout=60)
+                        failed = True
+                    elapsed = time.perf_counter() - begin
+                    with lock:
+                        if failed:
+                            errors[0] += 1
+                        else:
+                            latencies.append(elapsed)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results[path] = summarize(latencies, errors[0], time.perf_counter() - started)
+        if progress is not None:
+            progress(path, results[path])
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(mode, routes, dataset, settings):
+    return {'commit': git_commit(), 'timestamp': datetime.utcnow().replace(microsecond=0).isoformat() + 'Z',
+            'mode': mode, 'dataset': dataset, 'settings': settings, 'routes': routes}
+
+
+def save(path, data):
+    with open(path, 'w', encoding='utf-8') as handle:
+        json.dump(data, handle, indent=2, sort_keys=True)
+        handle.write('\n')
+
+
+def compare(previous, current, metric='p95_ms'):
+    # one line per path present in both runs: old, new and relative change
+    lines = []
+    for path, now in sorted(current['routes'].items()):
+        before = previous['routes'].get(path)
+        if not before or before.get(metric) is None or now.get(metric) is None:
+            continue
+        change = (now[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+        lines.append('%-48s %9.2f -> %9.2f  %+6.1f%%' % (path, before[metric], now[metric], change))
+    return lines
+
+
+def import_profile(module, env, cwd=None):
+    # one fresh interpreter importing module: (seconds, {direct import: seconds})
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            env=env, cwd=cwd, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError('importing %s failed:\n%s' % (module, result.stderr[-2000:]))
+    children = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0:
+            # -X importtime lists a module after everything it imported
+            if name.strip() == module:
+                return int(cumulative) / 1e6, children
+            children = {}
+        elif depth == 1:
+            children[name.strip()] = int(cumulative) / 1e6
+    raise RuntimeError('no import time reported for %s' % module)
+
+
+def startup_profile(module, runs, env=None, cwd=None):
+    # medians over runs fresh interpreters; env is added to os.environ
+    environ = dict(os.environ)
+    environ.pop('FLASK_RUN_FROM_CLI', None)
+    environ.update(env or {})
+    totals, modules = [], {}
+    for _ in range(runs):
+        total, children = import_profile(module, environ, cwd)
+        totals.append(total)
+        for name, seconds in children.items():
+            modules.setdefault(name, []).append(seconds)
+    return statistics.median(totals), dict((name, statistics.median(times)) for name, times in modules.items())
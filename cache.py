@@ -0,0 +1,278 @@
+#----------------------------------------------------------------------------#
+# Page cache shared by all worker processes.
+#
+# Rendered GET responses are stored on local disk (CACHE_DIR) so every
+# worker on the host shares them, with a small in-process LRU in front.
+# Entries expire after CACHE_TTL seconds and the disk store is trimmed to
+# CACHE_MAX_BYTES, oldest first.
+#
+# Every entry is keyed by route, arguments and the current version of each
+# tag it depends on ('venues', 'venue:3', ...). Write handlers call
+# invalidate() after committing, which gives those tags fresh versions, so
+# no process can serve a page rendered before the write: its key is simply
+# never looked up again.
+#
+# conditional() adds ETag / Last-Modified validators computed from row and
+# table versions, and answers revalidations with 304 before rendering. A
+# page cached under a conditional() view is also keyed by its ETag, so a
+# body is never served under a validator newer than the one it was
+# rendered with.
+#----------------------------------------------------------------------------#
+
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import timezone
+from functools import wraps
+
+from flask import Response, current_app, g, request, session
+
+
+class DiskStore(object):
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.tag_directory = os.path.join(directory, 'tags')
+        self.max_bytes = max_bytes
+        self.writes = 0
+        os.makedirs(self.tag_directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.page')
+
+    def _write(self, path, data):
+        # atomic on POSIX: readers see the old file or the new one
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(data)
+        os.replace(tmp, path)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as handle:
+                expires, value = pickle.load(handle)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires < time.time():
+            self._remove(path)
+            return None
+        return expires, value
+
+    def set(self, key, expires, value):
+        self._write(self._path(key), pickle.dumps((expires, value), pickle.HIGHEST_PROTOCOL))
+        self.writes += 1
+        if self.writes % 64 == 0:
+            self.trim()
+
+    def trim(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.page'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.page'):
+                self._remove(entry.path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def tag_version(self, tag):
+        try:
+            with open(os.path.join(self.tag_directory, tag), 'r') as handle:
+                return handle.read()
+        except OSError:
+            return ''
+
+    def bump_tag(self, tag):
+        fd, tmp = tempfile.mkstemp(dir=self.tag_directory)
+        with os.fdopen(fd, 'w') as handle:
+            handle.write(uuid.uuid4().hex)
+        os.replace(tmp, os.path.join(self.tag_directory, tag))
+
+
+class PageCache(object):
+
+    def __init__(self, app=None):
+        self.store = None
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'invalidations': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_ENABLED', True)
+        app.config.setdefault('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'fyyur-cache'))
+        app.config.setdefault('CACHE_TTL', 60)
+        app.config.setdefault('CACHE_MAX_BYTES', 64 * 1024 * 1024)
+        app.config.setdefault('CACHE_MEMORY_ITEMS', 256)
+        self.app = app
+        self.store = DiskStore(app.config['CACHE_DIR'], app.config['CACHE_MAX_BYTES'])
+
+    def _safe_tag(self, tag):
+        return tag.replace(':', '-').replace('/', '-')
+
+    def key(self, tags, *parts):
+        versions = [self.store.tag_version(self._safe_tag(tag)) for tag in tags]
+        raw = repr((parts, tags, versions)).encode('utf-8')
+        return hashlib.sha1(raw).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None and entry[0] >= now:
+                self.memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return entry[1]
+        entry = self.store.get(key)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['disk_hits'] += 1
+        self._remember(key, entry)
+        return entry[1]
+
+    def set(self, key, value):
+        expires = time.time() + self.app.config['CACHE_TTL']
+        self.store.set(key, expires, value)
+        self._remember(key, (expires, value))
+
+    def _remember(self, key, entry):
+        with self.lock:
+            self.memory[key] = entry
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.app.config['CACHE_MEMORY_ITEMS']:
+                self.memory.popitem(last=False)
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.store.bump_tag(self._safe_tag(tag))
+        self.stats['invalidations'] += 1
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+        self.store.clear()
+
+    def active(self):
+        # only plain GETs are cached; a pending flash message is per user
+        return self.app.config['CACHE_ENABLED'] and request.method == 'GET' and not session.get('_flashes')
+
+    def request_key(self, tags, kwargs, vary=()):
+        # the key of the current request for a view cached with these options.
+        # The ETag conditional() computed is part of it: it also changes when
+        # a show moves from upcoming to past, which no write reports.
+        return self.key(sorted(tags(**kwargs)), request.endpoint, sorted(kwargs.items()),
+                        sorted(request.args.items(multi=True)), [str(part()) for part in vary],
+                        g.get('page_etag'))
+
+    def store_response(self, key, response):
+        if response.status_code == 200 and not response.is_streamed:
+            self.set(key, (response.get_data(), response.mimetype))
+
+    def cached(self, tags, vary=()):
+        # tags: callable receiving the view arguments, returning tag names;
+        # vary: callables whose results also go into the key (locale, ...)
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.active():
+                    return view(*args, **kwargs)
+                key = self.request_key(tags, kwargs, vary)
+                hit = self.get(key)
+                if hit is not None:
+                    body, mimetype = hit
+                    return Response(body, mimetype=mimetype)
+                response = self.app.make_response(view(*args, **kwargs))
+                self.store_response(key, response)
+                return response
+            # kept on the view for callers serving it another way (asgi.py)
+            wrapper.cache_tags, wrapper.cache_vary = tags, vary
+            return wrapper
+        return decorator
+
+    def prometheus(self):
+        lines = [
+            '# HELP fyyur_page_cache_requests_total Page cache lookups by outcome.',
+            '# TYPE fyyur_page_cache_requests_total counter',
+            'fyyur_page_cache_requests_total{outcome="memory_hit"} %d' % self.stats['memory_hits'],
+            'fyyur_page_cache_requests_total{outcome="disk_hit"} %d' % self.stats['disk_hits'],
+            'fyyur_page_cache_requests_total{outcome="miss"} %d' % self.stats['misses'],
+            '# HELP fyyur_page_cache_invalidations_total Invalidations issued by write handlers.',
+            '# TYPE fyyur_page_cache_invalidations_total counter',
+            'fyyur_page_cache_invalidations_total %d' % self.stats['invalidations'],
+            '# HELP fyyur_page_cache_memory_entries Entries held in the in-process LRU.',
+            '# TYPE fyyur_page_cache_memory_entries gauge',
+            'fyyur_page_cache_memory_entries %d' % len(self.memory),
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+def as_utc(value):
+    # row timestamps are naive UTC
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def not_modified(etag, last_modified):
+    # whether the request's If-None-Match / If-Modified-Since still hold;
+    # If-None-Match compares weakly (compressed responses carry W/ ETags)
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    return since is not None and last_modified is not None and last_modified.replace(microsecond=0) <= since
+
+
+def add_validators(response, etag, last_modified):
+    if response.status_code in (200, 304):
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.no_cache = True
+        response.vary.add('Accept-Language')
+    return response
+
+
+def conditional(validator):
+    # answer If-None-Match / If-Modified-Since without running the view;
+    # validator(**view_args) returns (etag, last_modified) or None to skip
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+            validators = validator(**kwargs)
+            if validators is None:
+                return view(*args, **kwargs)
+            etag, last_modified = validators[0], as_utc(validators[1])
+            g.page_etag = etag
+            if not_modified(etag, last_modified):
+                response = Response(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+            return add_validators(response, etag, last_modified)
+        wrapper.validator = validator
+        return wrapper
+    return decorator
@@ -0,0 +1,188 @@
+#----------------------------------------------------------------------------#
+# Response compression.
+#
+# Text responses of COMPRESS_MIN_SIZE bytes or more are compressed with
+# brotli (when installed) or gzip, whichever the client accepts first.
+# Responses carrying an ETag - the conditional listing and detail pages and
+# the API - are the cacheable ones: their compressed bytes are kept in an
+# in-process LRU keyed by encoding and a digest of the body, so a page
+# served again (from the page cache or re-rendered identically) is not
+# compressed again. Streamed responses are compressed chunk by chunk and
+# flushed after each one, so they keep streaming.
+#
+# A compressed response gets a weak ETag: the bytes differ from the
+# identity representation, but revalidation compares weakly and still
+# answers 304. Files sent by send_file (static/, the precompressed
+# static/dist) pass through untouched.
+#
+# Bytes in and out, CPU time and cache hits are counted per endpoint and
+# encoding and exported with the other metrics.
+#----------------------------------------------------------------------------#
+
+import hashlib
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from flask import request
+
+from metrics import Registry
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIMETYPES = ('text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+             'application/json', 'application/x-ndjson', 'image/svg+xml')
+
+
+class Compressor(object):
+
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.registry = Registry()
+        registry = self.registry
+        registry.describe('fyyur_compression_input_bytes_total', 'counter',
+                          'Response bytes before compression, by endpoint and encoding.')
+        registry.describe('fyyur_compression_output_bytes_total', 'counter',
+                          'Response bytes after compression, by endpoint and encoding.')
+        registry.describe('fyyur_compression_cpu_seconds_total', 'counter',
+                          'CPU time spent compressing, by endpoint and encoding.')
+        registry.describe('fyyur_compression_cache_hits_total', 'counter',
+                          'Responses whose compressed bytes came from the cache, by endpoint and encoding.')
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+        app.config.setdefault('COMPRESS_GZIP_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BROTLI_QUALITY', 5)
+        app.config.setdefault('COMPRESS_CACHE_BYTES', 32 * 1024 * 1024)
+        self.app = app
+        app.after_request(self._after_request)
+
+    def encoding(self):
+        # the client's preferred encoding among those available, or None
+        encodings = request.accept_encodings
+        offered = [name for name in (('br',) if brotli is not None else ()) + ('gzip',) if encodings[name]]
+        return max(offered, key=lambda name: encodings[name], default=None)
+
+    def compressor(self, encoding):
+        config = self.app.config
+        if encoding == 'br':
+            return brotli.Compressor(quality=config['COMPRESS_BROTLI_QUALITY'])
+        return zlib.compressobj(config['COMPRESS_GZIP_LEVEL'], zlib.DEFLATED, 31)
+
+    def compress(self, encoding, data):
+        compressor = self.compressor(encoding)
+        if encoding == 'br':
+            return compressor.process(data) + compressor.finish()
+        return compressor.compress(data) + compressor.flush()
+
+    def _count(self, endpoint, encoding, size, compressed, cpu, hit=False):
+        labels = (('endpoint', endpoint), ('encoding', encoding))
+        registry = self.registry
+        registry.observe('fyyur_compression_input_bytes_total', labels, size)
+        registry.observe('fyyur_compression_output_bytes_total', labels, compressed)
+        registry.observe('fyyur_compression_cpu_seconds_total', labels, cpu)
+        if hit:
+            registry.observe('fyyur_compression_cache_hits_total', labels, 1)
+
+    def _cached(self, key):
+        with self.lock:
+            data = self.cache.get(key)
+            if data is not None:
+                self.cache.move_to_end(key)
+            return data
+
+    def _remember(self, key, data):
+        limit = self.app.config['COMPRESS_CACHE_BYTES']
+        if len(data) > limit // 16:
+            return
+        with self.lock:
+            if key in self.cache:
+                return
+            self.cache[key] = data
+            self.cache_bytes += len(data)
+            while self.cache_bytes > limit:
+                _, evicted = self.cache.popitem(last=False)
+                self.cache_bytes -= len(evicted)
+
+    def _after_request(self, response):
+        if not self.app.config['COMPRESS_ENABLED'] or response.mimetype not in MIMETYPES:
+            return response
+        response.vary.add('Accept-Encoding')
+        if response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers \
+                or response.cache_control.no_transform:
+            return response
+        encoding = self.encoding()
+        if encoding is None:
+            return response
+        if response.is_streamed:
+            response.response = self.stream(response.response, encoding, request.endpoint or 'unmatched')
+            response.headers.pop('Content-Length', None)
+        elif not self.compress_body(response, encoding):
+            return response
+        response.content_encoding = encoding
+        etag, weak = response.get_etag()
+        if etag is not None and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def compress_body(self, response, encoding):
+        # False when the body is too small to be worth it
+        data = response.get_data()
+        if len(data) < self.app.config['COMPRESS_MIN_SIZE']:
+            return False
+        endpoint = request.endpoint or 'unmatched'
+        cacheable = response.get_etag()[0] is not None
+        key = (encoding, hashlib.sha1(data).digest()) if cacheable else None
+        compressed = self._cached(key) if cacheable else None
+        if compressed is not None:
+            self._count(endpoint, encoding, len(data), len(compressed), 0.0, hit=True)
+        else:
+            started = time.thread_time()
+            compressed = self.compress(encoding, data)
+            self._count(endpoint, encoding, len(data), len(compressed), time.thread_time() - started)
+            if cacheable:
+                self._remember(key, compressed)
+        response.set_data(compressed)
+        return True
+
+    def stream(self, chunks, encoding, endpoint):
+        # runs after the view has returned, possibly outside the request
+        compressor = self.compressor(encoding)
+        size = compressed = 0
+        cpu = 0.0
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                if not chunk:
+                    continue
+                started = time.thread_time()
+                if encoding == 'br':
+                    data = compressor.process(chunk) + compressor.flush()
+                else:
+                    data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                cpu += time.thread_time() - started
+                size += len(chunk)
+                compressed += len(data)
+                yield data
+            started = time.thread_time()
+            data = compressor.finish() if encoding == 'br' else compressor.flush()
+            cpu += time.thread_time() - started
+            compressed += len(data)
+            yield data
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+            self._count(endpoint, encoding, size, compressed, cpu)
+
+    def prometheus(self):
+        return self.registry.exposition()
@@ -0,0 +1,129 @@
+#----------------------------------------------------------------------------#
+# Synthetic datasets for benchmarking.
+#
+# Generates venues, artists and shows at any scale with the skew real
+# listings have: a handful of big cities hold most venues, a few genres
+# dominate, and show counts per venue and per artist follow a Zipf-like
+# curve, so some detail pages list thousands of shows and most list a few.
+# Start times spread over the year before and after now, in the evening.
+#
+# Rows are generated in batches and written with BulkLoader (COPY on
+# PostgreSQL), so memory stays bounded even for millions of shows. The
+# same seed always produces the same dataset.
+#----------------------------------------------------------------------------#
+
+import itertools
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+CITIES = [
+    ('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'), ('San Francisco', 'CA'),
+    ('Austin', 'TX'), ('Nashville', 'TN'), ('Seattle', 'WA'), ('New Orleans', 'LA'),
+    ('Atlanta', 'GA'), ('Denver', 'CO'), ('Portland', 'OR'), ('Boston', 'MA'),
+    ('Philadelphia', 'PA'), ('Detroit', 'MI'), ('Minneapolis', 'MN'), ('Miami', 'FL'),
+    ('Houston', 'TX'), ('Phoenix', 'AZ'), ('Las Vegas', 'NV'), ('Kansas City', 'MO'),
+    ('Salt Lake City', 'UT'), ('Albuquerque', 'NM'), ('Louisville', 'KY'), ('Omaha', 'NE'),
+]
+VENUE_WORDS = ['Hall', 'Room', 'Lounge', 'Theatre', 'Club', 'Garage', 'Ballroom', 'Tavern', 'Cellar', 'Stage']
+ADJECTIVES = ['Blue', 'Golden', 'Velvet', 'Electric', 'Crooked', 'Silver', 'Wild', 'Hidden', 'Lucky', 'Red',
+              'Midnight', 'Paper', 'Iron', 'Copper', 'Neon', 'Quiet', 'Broken', 'Little', 'Grand', 'Lonely']
+NOUNS = ['Owl', 'Moon', 'Rose', 'Harbor', 'Fox', 'River', 'Piano', 'Lantern', 'Crow', 'Engine',
+         'Garden', 'Comet', 'Anchor', 'Wolf', 'Rider', 'Echo', 'Tide', 'Ghost', 'Parade', 'Signal']
+STREETS = ['Main St', 'Market St', '2nd Ave', 'Broadway', 'Elm St', 'Oak Ave', 'Mission St', 'Union St']
+
+
+def zipf_weights(count, exponent=1.1):
+    # cumulative weights for random.choices: rank r gets 1 / r^exponent
+    return list(itertools.accumulate(1.0 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def phone(rng):
+    return '%03d-%03d-%04d' % (rng.randint(200, 999), rng.randint(200, 999), rng.randint(0, 9999))
+
+
+def pick_genres(rng, genres, weights):
+    return sorted(set(rng.choices(genres, cum_weights=weights, k=rng.randint(1, 3))))
+
+
+def venue_rows(rng, count, genres, start=0):
+    city_weights = zipf_weights(len(CITIES))
+    genre_weights = zipf_weights(len(genres))
+    for number in range(start, start + count):
+        city, state = rng.choices(CITIES, cum_weights=city_weights)[0]
+        seeking = rng.random() < 0.3
+        slug = 'venue%d' % number
+        yield {"name": 'The %s %s %s' % (rng.choice(ADJECTIVES), rng.choice(NOUNS), rng.choice(VENUE_WORDS)),
+               "city": city, "state": state,
+               "address": '%d %s' % (rng.randint(1, 9999), rng.choice(STREETS)),
+               "phone": phone(rng), "genres": pick_genres(rng, genres, genre_weights),
+               "image_link": 'https://picsum.photos/seed/%s/400/300' % slug,
+               "facebook_link": 'https://www.facebook.com/%s' % slug,
+               "website": 'https://www.%s.example' % slug, "seeking_talent": seeking,
+               "seeking_description": 'Looking for local acts on weeknights.' if seeking else ''}
+
+
+def artist_rows(rng, count, genres, start=0):
+    city_weights = zipf_weights(len(CITIES))
+    genre_weights = zipf_weights(len(genres))
+    for number in range(start, start + count):
+        city, state = rng.choices(CITIES, cum_weights=city_weights)[0]
+        seeking = rng.random() < 0.4
+        slug = 'artist%d' % number
+        name = '%s %s' % (rng.choice(ADJECTIVES), rng.choice(NOUNS))
+        if rng.random() < 0.5:
+            name = 'The %ss' % name
+        yield {"name": name, "city": city, "state": state, "phone": phone(rng),
+               "genres": pick_genres(rng, genres, genre_weights),
+               "image_link": 'https://picsum.photos/seed/%s/400/400' % slug,
+               "facebook_link": 'https://www.facebook.com/%s' % slug,
+               "website": 'https://%s.example' % slug, "seeking_venue": seeking,
+               "seeking_description": 'Touring next season, open to any stage.' if seeking else ''}
+
+
+def show_rows(rng, count, venue_ids, artist_ids, now=None):
+    # popular venues and artists are shuffled so popularity isn't tied to id
+    venue_ids, artist_ids = list(venue_ids), list(artist_ids)
+    rng.shuffle(venue_ids)
+    rng.shuffle(artist_ids)
+    venue_weights = zipf_weights(len(venue_ids))
+    artist_weights = zipf_weights(len(artist_ids))
+    now = (now or datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+    for _ in range(count):
+        day = rng.randint(-365, 365)
+        hour = rng.choice((18, 19, 19, 20, 20, 20, 21, 21, 22))
+        yield {"venue_id": rng.choices(venue_ids, cum_weights=venue_weights)[0],
+               "artist_id": rng.choices(artist_ids, cum_weights=artist_weights)[0],
+               "start_time": (now + timedelta(days=day)).replace(hour=hour)}
+
+
+def batches(rows, size):
+    iterator = iter(rows)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def load(db, loader, rows, batch_size, progress=None, settings=None):
+    # settings: PostgreSQL parameters set for each batch's transaction
+    count = 0
+    for batch in batches(rows, batch_size):
+        for name, value in (settings or {}).items():
+            db.session.execute(select(func.set_config(name, value, True)))
+        loader.load(batch)
+        db.session.commit()
+        count += len(batch)
+        if progress is not None:
+            progress(count)
+    return count
+
+
+def new_ids(db, table, after):
+    return [row[0] for row in db.session.execute(
+        select(table.c.id).where(table.c.id > after).order_by(table.c.id))]
+
+
+def max_id(db, table):
+    return db.session.execute(select(func.coalesce(func.max(table.c.id), 0))).scalar()
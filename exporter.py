@@ -0,0 +1,165 @@
+#----------------------------------------------------------------------------#
+# Consistent, streaming exports of the catalog.
+#
+# Tables are read inside one REPEATABLE READ, READ ONLY transaction, so an
+# export reflects a single snapshot of the database however long it runs.
+# Rows come through server-side cursors in batches, so memory stays flat
+# whatever the table size. Output is gzip-compressed NDJSON or CSV; list
+# values in CSV are joined with '|', the separator 'flask import' reads.
+#
+# export_catalog() writes one file per table plus a manifest holding the
+# table versions the snapshot saw. A rerun skips the tables the manifest
+# lists as complete as long as those versions are unchanged: nothing was
+# written in between, so the new snapshot holds the same data.
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import date, datetime
+
+from sqlalchemy import func, select, text
+
+FORMATS = ('ndjson', 'csv')
+MANIFEST = 'manifest.json'
+
+
+class Snapshot(object):
+    # a read-only REPEATABLE READ transaction on a connection of its own
+
+    def __init__(self, engine, batch_size):
+        self.batch_size = batch_size
+        self.connection = engine.connect().execution_options(isolation_level='REPEATABLE READ')
+        self.transaction = self.connection.begin()
+        self.connection.execute(text('SET TRANSACTION READ ONLY'))
+        # now() is the transaction start, i.e. the moment of the snapshot
+        self.taken_at = self.connection.execute(select(func.now())).scalar()
+
+    def versions(self, table):
+        return dict((row.name, row.version) for row in self.connection.execute(
+            select(table.c.name, table.c.version)))
+
+    def batches(self, table):
+        statement = select(table).order_by(*table.primary_key.columns)
+        result = self.connection.execute(statement.execution_options(stream_results=True))
+        for rows in result.partitions(self.batch_size):
+            yield rows
+
+    def close(self):
+        self.transaction.rollback()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+
+def json_dumps(data):
+    return json.dumps(data, default=json_default, separators=(',', ':')).encode('utf-8')
+
+
+def csv_value(value):
+    if isinstance(value, list):
+        return '|'.join(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def ndjson_chunks(batches, dumps):
+    for rows in batches:
+        yield b''.join(dumps(dict(row._mapping)) + b'\n' for row in rows)
+
+
+def csv_chunks(batches, table):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.name for column in table.columns])
+    for rows in batches:
+        writer.writerows([csv_value(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # empty table: the header alone
+        yield buffer.getvalue().encode('utf-8')
+
+
+def encode(fmt, batches, table, dumps=json_dumps):
+    if fmt == 'csv':
+        return csv_chunks(batches, table)
+    return ndjson_chunks(batches, dumps)
+
+
+def gzipped(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def counted(batches, counter):
+    for rows in batches:
+        counter[0] += len(rows)
+        yield rows
+
+
+def read_manifest(path):
+    try:
+        with open(path, encoding='utf-8') as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(path, manifest):
+    tmp = path + '.part'
+    with open(tmp, 'w', encoding='utf-8') as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def export_catalog(engine, tables, versions_table, directory, fmt, batch_size,
+                   dumps=json_dumps, restart=False, log=None):
+    # tables: {name: Table} in export order; returns the manifest
+    log = log or (lambda message: None)
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST)
+    previous = None if restart else read_manifest(manifest_path)
+    with Snapshot(engine, batch_size) as snapshot:
+        versions = snapshot.versions(versions_table)
+        if previous is not None and previous.get('format') == fmt and previous.get('versions') == versions:
+            manifest = previous
+        else:
+            if previous is not None:
+                log('data or format changed since the last run; exporting every table again')
+            manifest = {'format': fmt, 'versions': versions, 'snapshot_at': snapshot.taken_at.isoformat(),
+                        'tables': {}}
+        for name, table in tables.items():
+            if name in manifest['tables']:
+                log('%s: already exported' % name)
+                continue
+            filename = '%s.%s.gz' % (name, fmt)
+            path = os.path.join(directory, filename)
+            rows = [0]
+            chunks = encode(fmt, counted(snapshot.batches(table), rows), table, dumps)
+            with open(path + '.part', 'wb') as handle:
+                for data in gzipped(chunks):
+                    handle.write(data)
+            os.replace(path + '.part', path)
+            manifest['tables'][name] = {'file': filename, 'rows': rows[0]}
+            write_manifest(manifest_path, manifest)
+            log('%s: %d rows' % (name, rows[0]))
+    return manifest
@@ -27,6 +27,20 @@ def prepare():
     commit()
     push()
 
+# performance
+
+
+def seed(venues=10000, artists=100000, shows=5000000):
+    local("flask seed --venues {} --artists {} --shows {}".format(venues, artists, shows))
+
+
+def benchmark(compare=None):
+    local("flask benchmark" + (" --compare {}".format(compare) if compare else ""))
+
+
+def build():
+    local("flask assets build && flask templates compile")
+
 # deploy to heroku
 
 
@@ -0,0 +1,106 @@
+#----------------------------------------------------------------------------#
+# Date and time formatting.
+#
+# Formats native datetimes with babel without the str() / dateutil round
+# trip, caching compiled patterns, Locale objects and timezones. The locale
+# comes from the request's Accept-Language header and the timezone from a
+# 'tz' cookie, falling back to BABEL_DEFAULT_LOCALE / BABEL_DEFAULT_TIMEZONE.
+# With CLIENT_SIDE_DATETIMES on, the filter emits <time> elements carrying
+# ISO timestamps that static/js/script.js formats with moment.js instead.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+from functools import lru_cache
+
+from flask import current_app, g, has_request_context, request
+from markupsafe import Markup, escape
+
+# named formats: (babel pattern, equivalent moment.js format)
+FORMATS = {
+    'full': ("EEEE MMMM, d, y 'at' h:mma", "dddd MMMM, D, YYYY [at] h:mmA"),
+    'medium': ("EE MM, dd, y h:mma", "ddd MM, DD, YYYY h:mmA"),
+}
+
+
+@lru_cache(maxsize=64)
+def compiled_pattern(pattern):
+    # babel is imported on first use; CLI commands rarely format dates
+    from babel.dates import parse_pattern
+    return parse_pattern(pattern)
+
+
+@lru_cache(maxsize=32)
+def cached_locale(identifier):
+    from babel import Locale, UnknownLocaleError
+    try:
+        return Locale.parse(identifier)
+    except (ValueError, UnknownLocaleError):
+        return Locale.parse(current_app.config['BABEL_DEFAULT_LOCALE'])
+
+
+@lru_cache(maxsize=64)
+def cached_timezone(name):
+    from babel.dates import get_timezone
+    try:
+        return get_timezone(name)
+    except LookupError:
+        return get_timezone(current_app.config['BABEL_DEFAULT_TIMEZONE'])
+
+
+def request_locale():
+    config = current_app.config
+    if not has_request_context():
+        return cached_locale(config['BABEL_DEFAULT_LOCALE'])
+    if 'babel_locale' not in g:
+        best = request.accept_languages.best_match(config['LOCALES'])
+        g.babel_locale = cached_locale(best or config['BABEL_DEFAULT_LOCALE'])
+    return g.babel_locale
+
+
+def request_timezone():
+    config = current_app.config
+    if not has_request_context():
+        return cached_timezone(config['BABEL_DEFAULT_TIMEZONE'])
+    if 'babel_timezone' not in g:
+        g.babel_timezone = cached_timezone(request.cookies.get('tz') or config['BABEL_DEFAULT_TIMEZONE'])
+    return g.babel_timezone
+
+
+def to_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    # legacy callers still pass strings; only they pay for dateutil
+    import dateutil.parser
+    return dateutil.parser.parse(value)
+
+
+def localize(value, tzinfo):
+    # naive values from the database are stored as UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=cached_timezone('UTC'))
+    return value.astimezone(tzinfo)
+
+
+def format_datetime(value, format='medium', locale=None, tzinfo=None):
+    if value is None:
+        return ''
+    pattern = FORMATS.get(format, (format, None))[0]
+    value = localize(to_datetime(value), tzinfo or request_timezone())
+    return compiled_pattern(pattern).apply(value, locale or request_locale())
+
+
+def datetime_filter(value, format='medium'):
+    # Jinja 'datetime' filter; see CLIENT_SIDE_DATETIMES in config.py
+    text = format_datetime(value, format)
+    if not current_app.config['CLIENT_SIDE_DATETIMES'] or format not in FORMATS:
+        return text
+    iso = localize(to_datetime(value), cached_timezone('UTC')).isoformat()
+    return Markup('<time datetime="%s" data-format="%s">%s</time>') % (iso, FORMATS[format][1], escape(text))
+
+
+def init_app(app):
+    app.config.setdefault('BABEL_DEFAULT_LOCALE', 'en_US')
+    app.config.setdefault('BABEL_DEFAULT_TIMEZONE', 'UTC')
+    app.config.setdefault('LOCALES', ['en_US'])
+    app.config.setdefault('CLIENT_SIDE_DATETIMES', False)
+    app.jinja_env.filters['datetime'] = datetime_filter
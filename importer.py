@@ -0,0 +1,261 @@
+#----------------------------------------------------------------------------#
+# Bulk import of venues, artists and shows.
+#
+# Records are read from CSV or NDJSON, validated with the same WTForms
+# forms the create pages use, converted to table rows and written in
+# batches: a multi-row executemany by default, or PostgreSQL COPY into a
+# staging table. Only records that pass validation reach the database.
+# Every batch commits together with its checkpoint (the last input record
+# it covers), so an interrupted import resumes where it stopped. A batch
+# the database still rejects (a missing venue, a double booking) is
+# bisected under savepoints, so only the offending rows are reported and
+# the rest still load.
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+import os
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError
+from werkzeug.datastructures import MultiDict
+
+
+def detect_format(path):
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+
+def read_records(path, fmt):
+    # yields (record number, dict); CSV list values are separated by '|'
+    with open(path, newline='', encoding='utf-8') as handle:
+        if fmt == 'csv':
+            for number, record in enumerate(csv.DictReader(handle), 1):
+                yield number, record
+        else:
+            number = 0
+            for line in handle:
+                if line.strip():
+                    number += 1
+                    try:
+                        yield number, json.loads(line)
+                    except ValueError as e:
+                        yield number, e
+
+
+def field_values(record, name, is_list):
+    # the raw strings a form field receives for this record
+    value = record.get(name)
+    if value is None:
+        return ()
+    if isinstance(value, list):
+        values = value
+    elif is_list:
+        values = [item for item in str(value).split('|') if item]
+    else:
+        values = [value]
+    return tuple(item if isinstance(item, str) else str(item) for item in values)
+
+
+def formdata(record, list_fields):
+    data = MultiDict()
+    for key in record:
+        for item in field_values(record, key, key in list_fields):
+            data.add(key, item)
+    return data
+
+
+class FormValidator(object):
+    # one form instance is re-processed per record, which is far cheaper
+    # than constructing a form for every row. Fields are processed and
+    # validated one at a time and each field's result is remembered for
+    # its raw values: imports repeat the same genres, cities, states and
+    # ids over and over, so most fields are never run through WTForms
+    # again. Forms with inline validate_<field> methods (which may look
+    # at other fields) are validated whole, every record.
+
+    # remembered results per field
+    LIMIT = 4096
+
+    def __init__(self, form_class):
+        self.form = form_class(meta={'csrf': False})
+        self.list_fields = set(name for name, field in self.form._fields.items() if field.type == 'SelectMultipleField')
+        self.fields = [(name, field, name in self.list_fields, {}) for name, field in self.form._fields.items()]
+        self.per_field = not any(hasattr(self.form, 'validate_%s' % name) for name in self.form._fields)
+
+    def validate(self, record):
+        if not self.per_field:
+            form = self.form
+            form.process(formdata(record, self.list_fields))
+            if form.validate():
+                return form.data, None
+            return None, dict(form.errors)
+        data, errors, processed = {}, {}, None
+        for name, field, is_list, results in self.fields:
+            values = field_values(record, name, is_list)
+            result = results.get(values)
+            if result is None:
+                if processed is None:
+                    processed = formdata(record, self.list_fields)
+                field.process(processed)
+                field.validate(self.form)
+                result = (field.data, list(field.errors))
+                if len(results) < self.LIMIT:
+                    results[values] = result
+            value, problems = result
+            data[name] = list(value) if isinstance(value, list) else value
+            if problems:
+                errors[name] = list(problems)
+        if errors:
+            return None, errors
+        return data, None
+
+
+def error_message(error):
+    return str(getattr(error, 'orig', None) or error).strip().splitlines()[0]
+
+
+def pg_array(values):
+    return '{' + ','.join('"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"' for value in values) + '}'
+
+
+def copy_value(value):
+    if isinstance(value, list):
+        return pg_array(value)
+    return value
+
+
+class BulkLoader(object):
+
+    def __init__(self, db, table, use_copy=False):
+        self.db = db
+        self.table = table
+        self.use_copy = use_copy and db.engine.dialect.name == 'postgresql'
+        # COPY goes through the raw driver cursor, bypassing SQLAlchemy
+        self.errors = (DBAPIError, db.engine.dialect.dbapi.Error)
+
+    def load(self, rows):
+        if self.use_copy:
+            # every row comes from the same converter, so shares its keys
+            columns = list(rows[0])
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in rows:
+                writer.writerow([copy_value(row[column]) for column in columns])
+            buffer.seek(0)
+            # COPY into a temporary table of bare columns (no partitions,
+            # constraints or triggers), then one INSERT ... SELECT moves
+            # the batch into the table as a single set
+            names = ', '.join('"%s"' % column for column in columns)
+            stage = '"import_%s"' % self.table.name
+            cursor = self.db.session.connection().connection.cursor()
+            cursor.execute('CREATE TEMP TABLE IF NOT EXISTS %s ON COMMIT DELETE ROWS AS '
+                           'SELECT %s FROM "%s" WITH NO DATA' % (stage, names, self.table.name))
+            cursor.copy_expert('COPY %s (%s) FROM STDIN WITH (FORMAT csv)' % (stage, names), buffer)
+            cursor.execute('INSERT INTO "%s" (%s) SELECT %s FROM %s' % (
+                self.table.name, names, names, stage))
+            cursor.execute('TRUNCATE %s' % stage)
+        else:
+            self.db.session.execute(self.table.insert(), rows)
+
+    def load_each(self, rows, offset=0):
+        # [(index, message)] for the rows the database rejects: the batch is
+        # split in halves under savepoints until the failing rows are
+        # isolated, so a few bad rows cost O(k log n) statements, not n
+        savepoint = self.db.session.begin_nested()
+        try:
+            self.load(rows)
+            savepoint.commit()
+            return []
+        except self.errors as e:
+            savepoint.rollback()
+            if len(rows) == 1:
+                return [(offset, error_message(e))]
+        middle = len(rows) // 2
+        return self.load_each(rows[:middle], offset) + self.load_each(rows[middle:], offset + middle)
+
+
+class Checkpoints(object):
+
+    def __init__(self, db, table, source):
+        self.db = db
+        self.table = table
+        self.source = source
+
+    def last(self):
+        row = self.db.session.execute(
+            self.table.select().where(self.table.c.source == self.source)).first()
+        return row.record if row is not None else 0
+
+    def save(self, record):
+        statement = insert(self.table).values(source=self.source, record=record, updated_at=func.now())
+        self.db.session.execute(statement.on_conflict_do_update(
+            index_elements=[self.table.c.source],
+            set_={'record': statement.excluded.record, 'updated_at': statement.excluded.updated_at}))
+
+    def clear(self):
+        self.db.session.execute(self.table.delete().where(self.table.c.source == self.source))
+        self.db.session.commit()
+
+
+def run_import(db, records, validator, convert, loader, checkpoints, batch_size, report, loaded=None):
+    # returns a stats dict; report(number, errors) is called for every
+    # rejected record and loaded(rows) after every committed batch
+    stats = {'read': 0, 'skipped': 0, 'loaded': 0, 'rejected': 0}
+    resume_after = checkpoints.last()
+    batch, numbers = [], []
+
+    def flush(last_number):
+        if batch:
+            try:
+                loader.load(batch)
+                committed = list(batch)
+            except loader.errors:
+                db.session.rollback()
+                failures = dict(loader.load_each(batch))
+                for index, message in sorted(failures.items()):
+                    report(numbers[index], {'database': [message]})
+                stats['rejected'] += len(failures)
+                committed = [row for index, row in enumerate(batch) if index not in failures]
+            stats['loaded'] += len(committed)
+        else:
+            committed = []
+        checkpoints.save(last_number)
+        db.session.commit()
+        if loaded is not None and committed:
+            loaded(committed)
+        del batch[:], numbers[:]
+
+    number = resume_after
+    for number, record in records:
+        if number <= resume_after:
+            stats['skipped'] += 1
+            continue
+        stats['read'] += 1
+        if isinstance(record, Exception):
+            report(number, {'record': [str(record)]})
+            stats['rejected'] += 1
+            continue
+        data, errors = validator.validate(record)
+        if errors:
+            report(number, errors)
+            stats['rejected'] += 1
+            continue
+        try:
+            row = convert(data)
+        except ValueError as e:
+            report(number, {'record': [str(e)]})
+            stats['rejected'] += 1
+            continue
+        batch.append(row)
+        numbers.append(number)
+        if len(batch) >= batch_size:
+            flush(number)
+    if number > resume_after:
+        flush(number)
+    return stats
+
+
+def source_key(kind, path):
+    return '%s:%s' % (kind, os.path.abspath(path))
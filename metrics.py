@@ -0,0 +1,233 @@
+#----------------------------------------------------------------------------#
+# Per-request instrumentation, exported in Prometheus text format.
+#
+# SQLAlchemy cursor events time every statement and Flask's template
+# signals time rendering; both accumulate on flask.g for the current
+# request. When the request context is torn down (after the body is sent,
+# for streamed responses too) the totals go into per-endpoint histograms:
+# latency, queries, DB time, render time and response size.
+#
+# Each statement is also reduced to a fingerprint, its SQL with literals
+# and bind parameters folded, so 'SELECT ... WHERE id = 1' and '... = 2'
+# look the same. A fingerprint executed N_PLUS_ONE_THRESHOLD times or more
+# in one request is the N+1 pattern: it is counted per endpoint and logged
+# once per process with its SQL.
+#
+# Metrics are per process; with several workers, scrape each one or sum.
+#----------------------------------------------------------------------------#
+
+import bisect
+import hashlib
+import re
+import threading
+import time
+from functools import lru_cache
+
+from flask import g, has_request_context, request
+from flask import signals_available, before_render_template, template_rendered
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PARAMETERS = re.compile(r'%\(\w+\)s|%s|\?|:\w+')
+LISTS = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+SPACES = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement):
+    # (short hash, normalized SQL); cached because statements repeat verbatim
+    sql = SPACES.sub(' ', statement).strip()
+    sql = PARAMETERS.sub('?', LITERALS.sub('?', sql))
+    sql = LISTS.sub('(...)', sql)
+    return hashlib.sha1(sql.encode('utf-8')).hexdigest()[:10], sql
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('%s="%s"' % (name, escape_label(value)) for name, value in labels) + '}'
+
+
+class Histogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield '%s_bucket%s %d' % (name, format_labels(labels + (('le', repr(float(bound))),)), cumulative)
+        yield '%s_bucket%s %d' % (name, format_labels(labels + (('le', '+Inf'),)), self.count)
+        yield '%s_sum%s %s' % (name, format_labels(labels), repr(float(self.sum)))
+        yield '%s_count%s %d' % (name, format_labels(labels), self.count)
+
+
+class Registry(object):
+    # name -> (type, help, {labels: Histogram or number})
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.families = {}
+
+    def describe(self, name, kind, help, buckets=None):
+        self.families[name] = (kind, help, buckets, {})
+
+    def observe(self, name, labels, value):
+        kind, _, buckets, series = self.families[name]
+        with self.lock:
+            if kind == 'histogram':
+                if labels not in series:
+                    series[labels] = Histogram(buckets)
+                series[labels].observe(value)
+            else:
+                series[labels] = series.get(labels, 0) + value
+
+    def exposition(self):
+        lines = []
+        with self.lock:
+            for name in sorted(self.families):
+                kind, help, _, series = self.families[name]
+                lines.append('# HELP %s %s' % (name, help))
+                lines.append('# TYPE %s %s' % (name, kind))
+                for labels in sorted(series):
+                    if kind == 'histogram':
+                        lines.extend(series[labels].lines(name, labels))
+                    else:
+                        lines.append('%s%s %s' % (name, format_labels(labels), series[labels]))
+        return '\n'.join(lines) + '\n'
+
+
+class Metrics(object):
+
+    def __init__(self, app=None, engine=None):
+        self.registry = Registry()
+        self.reported = set()
+        self.collectors = []
+        registry = self.registry
+        registry.describe('fyyur_http_requests_total', 'counter', 'Requests by endpoint, method and status.')
+        registry.describe('fyyur_http_request_duration_seconds', 'histogram',
+                          'Time from request start to the last byte of the response.', LATENCY_BUCKETS)
+        registry.describe('fyyur_http_response_size_bytes', 'histogram',
+                          'Response body size, where known before sending.', SIZE_BUCKETS)
+        registry.describe('fyyur_db_queries_per_request', 'histogram',
+                          'SQL statements executed per request.', COUNT_BUCKETS)
+        registry.describe('fyyur_db_seconds_per_request', 'histogram',
+                          'Time spent executing SQL per request.', LATENCY_BUCKETS)
+        registry.describe('fyyur_template_render_seconds', 'histogram',
+                          'Time spent rendering templates per request.', LATENCY_BUCKETS)
+        registry.describe('fyyur_n_plus_one_total', 'counter',
+                          'Requests that repeated one statement fingerprint at least N_PLUS_ONE_THRESHOLD times.')
+        if app is not None:
+            self.init_app(app, engine)
+
+    def init_app(self, app, engine):
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('N_PLUS_ONE_THRESHOLD', 5)
+        self.app = app
+        if not app.config['METRICS_ENABLED']:
+            return
+        self.instrument(engine)
+        if signals_available:
+            before_render_template.connect(self._before_render, app)
+            template_rendered.connect(self._after_render, app)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def instrument(self, engine):
+        # time the statements of engine (another engine can be added later)
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+
+    def collector(self, function):
+        # function() returns extra exposition text (page cache, pool, ...)
+        self.collectors.append(function)
+        return function
+
+    def _before_request(self):
+        g.metrics = {'started': time.perf_counter(), 'queries': 0, 'db': 0.0, 'render': 0.0,
+                     'fingerprints': {}, 'status': None, 'size': None}
+
+    def _after_request(self, response):
+        state = g.get('metrics')
+        if state is not None:
+            state['status'] = response.status_code
+            if not response.is_streamed:
+                state['size'] = response.calculate_content_length()
+        return response
+
+    def _teardown_request(self, exc):
+        state = g.pop('metrics', None)
+        if state is None:
+            return
+        endpoint = request.endpoint or 'unmatched'
+        labels = (('endpoint', endpoint),)
+        registry = self.registry
+        status = state['status'] or (500 if exc is not None else 0)
+        registry.observe('fyyur_http_requests_total',
+                         labels + (('method', request.method), ('status', status)), 1)
+        registry.observe('fyyur_http_request_duration_seconds', labels, time.perf_counter() - state['started'])
+        if state['size'] is not None:
+            registry.observe('fyyur_http_response_size_bytes', labels, state['size'])
+        registry.observe('fyyur_db_queries_per_request', labels, state['queries'])
+        registry.observe('fyyur_db_seconds_per_request', labels, state['db'])
+        registry.observe('fyyur_template_render_seconds', labels, state['render'])
+        threshold = self.app.config['N_PLUS_ONE_THRESHOLD']
+        for (digest, sql), count in state['fingerprints'].items():
+            if count >= threshold:
+                registry.observe('fyyur_n_plus_one_total', labels + (('fingerprint', digest),), 1)
+                if (endpoint, digest) not in self.reported:
+                    self.reported.add((endpoint, digest))
+                    self.app.logger.warning('possible N+1 in %s: %d x [%s] %s', endpoint, count, digest, sql)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'metrics' in g:
+            conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('metrics_started')
+        if not started or not has_request_context():
+            return
+        state = g.get('metrics')
+        elapsed = time.perf_counter() - started.pop()
+        if state is None:
+            return
+        state['queries'] += 1
+        state['db'] += elapsed
+        key = fingerprint(statement)
+        state['fingerprints'][key] = state['fingerprints'].get(key, 0) + 1
+
+    def _handle_error(self, context):
+        # a failed statement never reaches after_cursor_execute
+        if context.connection is not None and context.connection.info.get('metrics_started'):
+            context.connection.info['metrics_started'].pop()
+
+    def _before_render(self, sender, template, context, **extra):
+        if 'metrics' in g:
+            g.metrics.setdefault('render_started', []).append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        state = g.get('metrics')
+        if state is not None and state.get('render_started'):
+            state['render'] += time.perf_counter() - state['render_started'].pop()
+
+    def exposition(self):
+        return self.registry.exposition() + ''.join(collector() for collector in self.collectors)
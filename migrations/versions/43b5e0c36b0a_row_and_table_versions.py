@@ -0,0 +1,123 @@
+"""Row versions, updated_at and table versions for conditional GET
+
+Revision ID: 43b5e0c36b0a
+Revises: f3ac996257a8
+Create Date: 2026-10-18 12:40:03.221958
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '43b5e0c36b0a'
+down_revision = 'f3ac996257a8'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('Venue', 'Artist', 'Show')
+
+# Every write bumps the row's version/updated_at and its table's entry in
+# table_versions. Show writes also touch the venue and artist they belong
+# to, and renaming a venue or artist touches the counterparts it appears
+# next to, so a detail page's validator only has to look at one row.
+TRIGGERS = """
+CREATE FUNCTION fyyur_touch_row() RETURNS trigger AS $$
+BEGIN
+  NEW.version := OLD.version + 1;
+  NEW.updated_at := now();
+  RETURN NEW;
+END $$ LANGUAGE plpgsql;
+
+CREATE FUNCTION fyyur_bump_table() RETURNS trigger AS $$
+BEGIN
+  UPDATE table_versions SET version = version + 1, updated_at = now() WHERE name = TG_TABLE_NAME;
+  RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+CREATE FUNCTION fyyur_touch_show_parents() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    UPDATE "Venue" SET version = version WHERE id = OLD.venue_id;
+    UPDATE "Artist" SET version = version WHERE id = OLD.artist_id;
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    UPDATE "Venue" SET version = version WHERE id = NEW.venue_id;
+    UPDATE "Artist" SET version = version WHERE id = NEW.artist_id;
+  END IF;
+  RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+CREATE FUNCTION fyyur_touch_venue_artists() RETURNS trigger AS $$
+BEGIN
+  UPDATE "Artist" SET version = version
+   WHERE id IN (SELECT artist_id FROM "Show" WHERE venue_id = NEW.id);
+  RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+CREATE FUNCTION fyyur_touch_artist_venues() RETURNS trigger AS $$
+BEGIN
+  UPDATE "Venue" SET version = version
+   WHERE id IN (SELECT venue_id FROM "Show" WHERE artist_id = NEW.id);
+  RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+CREATE TRIGGER venue_touch_row BEFORE UPDATE ON "Venue" FOR EACH ROW EXECUTE PROCEDURE fyyur_touch_row();
+CREATE TRIGGER artist_touch_row BEFORE UPDATE ON "Artist" FOR EACH ROW EXECUTE PROCEDURE fyyur_touch_row();
+CREATE TRIGGER show_touch_row BEFORE UPDATE ON "Show" FOR EACH ROW EXECUTE PROCEDURE fyyur_touch_row();
+
+CREATE TRIGGER venue_bump_table AFTER INSERT OR UPDATE OR DELETE ON "Venue" FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_bump_table();
+CREATE TRIGGER artist_bump_table AFTER INSERT OR UPDATE OR DELETE ON "Artist" FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_bump_table();
+CREATE TRIGGER show_bump_table AFTER INSERT OR UPDATE OR DELETE ON "Show" FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_bump_table();
+
+CREATE TRIGGER show_touch_parents AFTER INSERT OR UPDATE OR DELETE ON "Show" FOR EACH ROW EXECUTE PROCEDURE fyyur_touch_show_parents();
+
+CREATE TRIGGER venue_touch_artists AFTER UPDATE ON "Venue" FOR EACH ROW
+  WHEN (OLD.name IS DISTINCT FROM NEW.name OR OLD.image_link IS DISTINCT FROM NEW.image_link)
+  EXECUTE PROCEDURE fyyur_touch_venue_artists();
+CREATE TRIGGER artist_touch_venues AFTER UPDATE ON "Artist" FOR EACH ROW
+  WHEN (OLD.name IS DISTINCT FROM NEW.name OR OLD.image_link IS DISTINCT FROM NEW.image_link)
+  EXECUTE PROCEDURE fyyur_touch_artist_venues();
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS artist_touch_venues ON "Artist";
+DROP TRIGGER IF EXISTS venue_touch_artists ON "Venue";
+DROP TRIGGER IF EXISTS show_touch_parents ON "Show";
+DROP TRIGGER IF EXISTS show_bump_table ON "Show";
+DROP TRIGGER IF EXISTS artist_bump_table ON "Artist";
+DROP TRIGGER IF EXISTS venue_bump_table ON "Venue";
+DROP TRIGGER IF EXISTS show_touch_row ON "Show";
+DROP TRIGGER IF EXISTS artist_touch_row ON "Artist";
+DROP TRIGGER IF EXISTS venue_touch_row ON "Venue";
+DROP FUNCTION IF EXISTS fyyur_touch_artist_venues();
+DROP FUNCTION IF EXISTS fyyur_touch_venue_artists();
+DROP FUNCTION IF EXISTS fyyur_touch_show_parents();
+DROP FUNCTION IF EXISTS fyyur_bump_table();
+DROP FUNCTION IF EXISTS fyyur_touch_row();
+"""
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()))
+    table_versions = op.create_table('table_versions',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False, server_default='1'),
+    sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(table_versions, [{'name': table} for table in TABLES])
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(TRIGGERS)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(DROP_TRIGGERS)
+    op.drop_table('table_versions')
+    for table in TABLES:
+        op.drop_column(table, 'updated_at')
+        op.drop_column(table, 'version')
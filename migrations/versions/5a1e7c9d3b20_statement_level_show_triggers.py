@@ -0,0 +1,81 @@
+"""Touch show parents once per statement instead of once per row
+
+Revision ID: 5a1e7c9d3b20
+Revises: dcf19652b24b
+Create Date: 2026-10-18 14:41:09.518337
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5a1e7c9d3b20'
+down_revision = 'dcf19652b24b'
+branch_labels = None
+depends_on = None
+
+
+# The row-level show_touch_parents trigger updated the venue and artist of
+# every inserted show separately, which made bulk imports an order of
+# magnitude slower. Statement-level triggers with transition tables
+# (PostgreSQL 10+) touch each distinct parent once per statement instead.
+# A trigger with transition tables may only handle one event, hence three.
+TRIGGERS = """
+DROP TRIGGER IF EXISTS show_touch_parents ON "Show";
+DROP FUNCTION IF EXISTS fyyur_touch_show_parents();
+
+CREATE FUNCTION fyyur_touch_show_parents() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    UPDATE "Venue" SET version = version WHERE id IN (SELECT venue_id FROM old_shows);
+    UPDATE "Artist" SET version = version WHERE id IN (SELECT artist_id FROM old_shows);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    UPDATE "Venue" SET version = version WHERE id IN (SELECT venue_id FROM new_shows);
+    UPDATE "Artist" SET version = version WHERE id IN (SELECT artist_id FROM new_shows);
+  END IF;
+  RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+CREATE TRIGGER show_insert_touch_parents AFTER INSERT ON "Show"
+  REFERENCING NEW TABLE AS new_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_touch_show_parents();
+CREATE TRIGGER show_update_touch_parents AFTER UPDATE ON "Show"
+  REFERENCING OLD TABLE AS old_shows NEW TABLE AS new_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_touch_show_parents();
+CREATE TRIGGER show_delete_touch_parents AFTER DELETE ON "Show"
+  REFERENCING OLD TABLE AS old_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_touch_show_parents();
+"""
+
+ROW_TRIGGERS = """
+DROP TRIGGER IF EXISTS show_delete_touch_parents ON "Show";
+DROP TRIGGER IF EXISTS show_update_touch_parents ON "Show";
+DROP TRIGGER IF EXISTS show_insert_touch_parents ON "Show";
+DROP FUNCTION IF EXISTS fyyur_touch_show_parents();
+
+CREATE FUNCTION fyyur_touch_show_parents() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    UPDATE "Venue" SET version = version WHERE id = OLD.venue_id;
+    UPDATE "Artist" SET version = version WHERE id = OLD.artist_id;
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    UPDATE "Venue" SET version = version WHERE id = NEW.venue_id;
+    UPDATE "Artist" SET version = version WHERE id = NEW.artist_id;
+  END IF;
+  RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+CREATE TRIGGER show_touch_parents AFTER INSERT OR UPDATE OR DELETE ON "Show" FOR EACH ROW EXECUTE PROCEDURE fyyur_touch_show_parents();
+"""
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(TRIGGERS)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(ROW_TRIGGERS)
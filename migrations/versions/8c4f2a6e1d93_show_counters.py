@@ -0,0 +1,141 @@
+"""Upcoming and past show counters on Venue and Artist
+
+Revision ID: 8c4f2a6e1d93
+Revises: 5a1e7c9d3b20
+Create Date: 2026-10-18 15:26:40.184512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4f2a6e1d93'
+down_revision = '5a1e7c9d3b20'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('Venue', 'Artist')
+
+# Counters split shows at show_counters.rolled_to rather than at now():
+# shows starting at or after it are upcoming, earlier ones past. Statement
+# triggers on Show keep the counters exact for every insert, update and
+# delete, and fyyur_roll_show_counters() (run by 'flask roll-counters')
+# moves the shows that have started since the last run from upcoming to
+# past and advances rolled_to. Writers hold the show_counters row FOR
+# SHARE and the roll FOR UPDATE, so a show is never counted against a
+# boundary that moves underneath it.
+TRIGGERS = """
+CREATE FUNCTION fyyur_count_shows() RETURNS trigger AS $$
+DECLARE
+  boundary timestamp;
+BEGIN
+  SELECT rolled_to INTO boundary FROM show_counters WHERE id = 1 FOR SHARE;
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    UPDATE "Venue" v SET upcoming_shows_count = v.upcoming_shows_count - d.upcoming,
+                         past_shows_count = v.past_shows_count - d.past
+      FROM (SELECT venue_id, count(*) FILTER (WHERE start_time >= boundary) AS upcoming,
+                   count(*) FILTER (WHERE start_time < boundary) AS past
+              FROM old_shows GROUP BY venue_id) d
+     WHERE v.id = d.venue_id;
+    UPDATE "Artist" a SET upcoming_shows_count = a.upcoming_shows_count - d.upcoming,
+                          past_shows_count = a.past_shows_count - d.past
+      FROM (SELECT artist_id, count(*) FILTER (WHERE start_time >= boundary) AS upcoming,
+                   count(*) FILTER (WHERE start_time < boundary) AS past
+              FROM old_shows GROUP BY artist_id) d
+     WHERE a.id = d.artist_id;
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    UPDATE "Venue" v SET upcoming_shows_count = v.upcoming_shows_count + d.upcoming,
+                         past_shows_count = v.past_shows_count + d.past
+      FROM (SELECT venue_id, count(*) FILTER (WHERE start_time >= boundary) AS upcoming,
+                   count(*) FILTER (WHERE start_time < boundary) AS past
+              FROM new_shows GROUP BY venue_id) d
+     WHERE v.id = d.venue_id;
+    UPDATE "Artist" a SET upcoming_shows_count = a.upcoming_shows_count + d.upcoming,
+                          past_shows_count = a.past_shows_count + d.past
+      FROM (SELECT artist_id, count(*) FILTER (WHERE start_time >= boundary) AS upcoming,
+                   count(*) FILTER (WHERE start_time < boundary) AS past
+              FROM new_shows GROUP BY artist_id) d
+     WHERE a.id = d.artist_id;
+  END IF;
+  RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+CREATE TRIGGER show_insert_count AFTER INSERT ON "Show"
+  REFERENCING NEW TABLE AS new_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_count_shows();
+CREATE TRIGGER show_update_count AFTER UPDATE ON "Show"
+  REFERENCING OLD TABLE AS old_shows NEW TABLE AS new_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_count_shows();
+CREATE TRIGGER show_delete_count AFTER DELETE ON "Show"
+  REFERENCING OLD TABLE AS old_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_count_shows();
+
+CREATE FUNCTION fyyur_roll_show_counters() RETURNS bigint AS $$
+DECLARE
+  previous timestamp;
+  boundary timestamp := now();
+  moved bigint;
+BEGIN
+  SELECT rolled_to INTO previous FROM show_counters WHERE id = 1 FOR UPDATE;
+  IF boundary <= previous THEN
+    RETURN 0;
+  END IF;
+  UPDATE "Venue" v SET upcoming_shows_count = v.upcoming_shows_count - d.n,
+                       past_shows_count = v.past_shows_count + d.n
+    FROM (SELECT venue_id, count(*) AS n FROM "Show"
+           WHERE start_time >= previous AND start_time < boundary GROUP BY venue_id) d
+   WHERE v.id = d.venue_id;
+  UPDATE "Artist" a SET upcoming_shows_count = a.upcoming_shows_count - d.n,
+                        past_shows_count = a.past_shows_count + d.n
+    FROM (SELECT artist_id, count(*) AS n FROM "Show"
+           WHERE start_time >= previous AND start_time < boundary GROUP BY artist_id) d
+   WHERE a.id = d.artist_id;
+  SELECT count(*) INTO moved FROM "Show" WHERE start_time >= previous AND start_time < boundary;
+  UPDATE show_counters SET rolled_to = boundary WHERE id = 1;
+  RETURN moved;
+END $$ LANGUAGE plpgsql;
+"""
+
+DROP_TRIGGERS = """
+DROP FUNCTION IF EXISTS fyyur_roll_show_counters();
+DROP TRIGGER IF EXISTS show_delete_count ON "Show";
+DROP TRIGGER IF EXISTS show_update_count ON "Show";
+DROP TRIGGER IF EXISTS show_insert_count ON "Show";
+DROP FUNCTION IF EXISTS fyyur_count_shows();
+"""
+
+BACKFILL = """
+UPDATE "%(table)s" t SET upcoming_shows_count = d.upcoming, past_shows_count = d.past
+  FROM (SELECT %(key)s, count(*) FILTER (WHERE start_time >= c.rolled_to) AS upcoming,
+               count(*) FILTER (WHERE start_time < c.rolled_to) AS past
+          FROM "Show", show_counters c WHERE c.id = 1 GROUP BY %(key)s) d
+ WHERE t.id = d.%(key)s
+"""
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), nullable=False, server_default='0'))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), nullable=False, server_default='0'))
+    show_counters = op.create_table('show_counters',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('rolled_to', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(show_counters, [{'id': 1}])
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(TRIGGERS)
+        op.execute(BACKFILL % {'table': 'Venue', 'key': 'venue_id'})
+        op.execute(BACKFILL % {'table': 'Artist', 'key': 'artist_id'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(DROP_TRIGGERS)
+    op.drop_table('show_counters')
+    for table in TABLES:
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
@@ -0,0 +1,44 @@
+"""Search indexes for venues and artists
+
+Revision ID: 92095cde4302
+Revises: 55c8480a8602
+Create Date: 2026-10-18 10:12:41.503317
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '92095cde4302'
+down_revision = '55c8480a8602'
+branch_labels = None
+depends_on = None
+
+
+# the expressions must match search.Searcher exactly for the planner to use them
+INDEXES = [
+    ('ix_{table}_name_trgm', 'USING gin (name gin_trgm_ops)'),
+    ('ix_{table}_city_trgm', 'USING gin (city gin_trgm_ops)'),
+    ('ix_{table}_genres', 'USING gin (genres)'),
+    ('ix_{table}_search_document', "USING gin (to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(city, '')))"),
+    ('ix_{table}_name_prefix', '(lower(name) text_pattern_ops, id)'),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    # required: search.py ranks with word_similarity() and has no fallback,
+    # so a server without the contrib extensions stops here
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('Venue', 'Artist'):
+        for name, definition in INDEXES:
+            op.execute('CREATE INDEX {} ON "{}" {}'.format(name.format(table=table.lower()), table, definition))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in ('Venue', 'Artist'):
+        for name, definition in INDEXES:
+            op.execute('DROP INDEX IF EXISTS {}'.format(name.format(table=table.lower())))
@@ -0,0 +1,54 @@
+"""Store updated_at in UTC whatever the session time zone
+
+Revision ID: a6d2f8c3e915
+Revises: c5e8a1b4d7f2
+Create Date: 2026-10-18 22:15:48.904127
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d2f8c3e915'
+down_revision = 'c5e8a1b4d7f2'
+branch_labels = None
+depends_on = None
+
+
+# updated_at is timestamp without time zone and becomes Last-Modified as
+# UTC (see cache.py), but now() stored into it is the session's local
+# time. timezone('utc', now()) is UTC under any TimeZone setting.
+TABLES = ('Venue', 'Artist', 'Show', 'table_versions')
+
+FUNCTIONS = """
+CREATE OR REPLACE FUNCTION fyyur_touch_row() RETURNS trigger AS $$
+BEGIN
+  NEW.version := OLD.version + 1;
+  NEW.updated_at := {now};
+  RETURN NEW;
+END $$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fyyur_bump_table() RETURNS trigger AS $$
+BEGIN
+  UPDATE table_versions SET version = version + 1, updated_at = {now} WHERE name = TG_TABLE_NAME;
+  RETURN NULL;
+END $$ LANGUAGE plpgsql;
+"""
+
+
+def set_now(now):
+    op.execute(FUNCTIONS.format(now=now))
+    for table in TABLES:
+        op.execute('ALTER TABLE "{}" ALTER COLUMN updated_at SET DEFAULT {}'.format(table, now))
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    set_now("timezone('utc', now())")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    set_now('now()')
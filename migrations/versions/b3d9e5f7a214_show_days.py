@@ -0,0 +1,100 @@
+"""Per-day show buckets and a start_time range index
+
+Revision ID: b3d9e5f7a214
+Revises: 8c4f2a6e1d93
+Create Date: 2026-10-18 16:12:55.407736
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3d9e5f7a214'
+down_revision = '8c4f2a6e1d93'
+branch_labels = None
+depends_on = None
+
+
+# show_days holds the number of shows per venue and (UTC) day, kept exact
+# by statement triggers on Show, so a month of the /shows calendar is a
+# few hundred small rows whatever the size of the history.
+TRIGGERS = """
+CREATE FUNCTION fyyur_bucket_shows() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    UPDATE show_days b SET shows = b.shows - d.n
+      FROM (SELECT venue_id, start_time::date AS day, count(*) AS n FROM old_shows
+             WHERE venue_id IS NOT NULL AND start_time IS NOT NULL GROUP BY 1, 2) d
+     WHERE b.venue_id = d.venue_id AND b.day = d.day;
+    DELETE FROM show_days b USING (SELECT DISTINCT venue_id, start_time::date AS day FROM old_shows) d
+     WHERE b.venue_id = d.venue_id AND b.day = d.day AND b.shows <= 0;
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    INSERT INTO show_days (venue_id, day, shows)
+    SELECT venue_id, start_time::date, count(*) FROM new_shows
+     WHERE venue_id IS NOT NULL AND start_time IS NOT NULL GROUP BY 1, 2
+    ON CONFLICT (venue_id, day) DO UPDATE SET shows = show_days.shows + EXCLUDED.shows;
+  END IF;
+  RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+CREATE TRIGGER show_insert_bucket AFTER INSERT ON "Show"
+  REFERENCING NEW TABLE AS new_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_bucket_shows();
+CREATE TRIGGER show_update_bucket AFTER UPDATE ON "Show"
+  REFERENCING OLD TABLE AS old_shows NEW TABLE AS new_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_bucket_shows();
+CREATE TRIGGER show_delete_bucket AFTER DELETE ON "Show"
+  REFERENCING OLD TABLE AS old_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_bucket_shows();
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS show_delete_bucket ON "Show";
+DROP TRIGGER IF EXISTS show_update_bucket ON "Show";
+DROP TRIGGER IF EXISTS show_insert_bucket ON "Show";
+DROP FUNCTION IF EXISTS fyyur_bucket_shows();
+"""
+
+BACKFILL = """
+INSERT INTO show_days (venue_id, day, shows)
+SELECT venue_id, start_time::date, count(*) FROM "Show"
+ WHERE venue_id IS NOT NULL AND start_time IS NOT NULL GROUP BY 1, 2
+"""
+
+# ix_show_start_time_id (B-tree) already serves date ranges and keyset
+# pages. A large history inserted roughly in start_time order also gets a
+# BRIN index: a few pages in size, and it lets range aggregates over a
+# month skip everything outside it without walking the B-tree.
+BRIN_MIN_ROWS = 1000000
+BRIN_MIN_CORRELATION = 0.9
+
+
+def upgrade():
+    op.create_table('show_days',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('shows', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('venue_id', 'day')
+    )
+    op.create_index('ix_show_days_day_venue_id', 'show_days', ['day', 'venue_id'])
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute(TRIGGERS)
+        op.execute(BACKFILL)
+        row = bind.execute(sa.text(
+            "SELECT c.reltuples, s.correlation FROM pg_class c "
+            "LEFT JOIN pg_stats s ON s.tablename = c.relname AND s.attname = 'start_time' "
+            "WHERE c.relname = 'Show'")).first()
+        if row is not None and row[0] >= BRIN_MIN_ROWS and abs(row[1] or 0) >= BRIN_MIN_CORRELATION:
+            op.execute('CREATE INDEX ix_show_start_time_brin ON "Show" USING brin (start_time) '
+                       'WITH (pages_per_range = 32)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_show_start_time_brin')
+        op.execute(DROP_TRIGGERS)
+    op.drop_index('ix_show_days_day_venue_id', table_name='show_days')
+    op.drop_table('show_days')
@@ -0,0 +1,63 @@
+"""Drop the show parent touch triggers the show counters make redundant
+
+Revision ID: b8e2d4f6a371
+Revises: a6d2f8c3e915
+Create Date: 2026-10-18 23:02:17.415263
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e2d4f6a371'
+down_revision = 'a6d2f8c3e915'
+branch_labels = None
+depends_on = None
+
+
+# fyyur_count_shows() updates the counters of the venue and artist of every
+# inserted, updated or deleted show, and that update already bumps their
+# version and updated_at (fyyur_touch_row). The touch triggers rewrote the
+# same parent rows a second time in every statement, about a quarter of
+# the database time of a bulk show import.
+DROP = """
+DROP TRIGGER IF EXISTS show_insert_touch_parents ON "Show";
+DROP TRIGGER IF EXISTS show_update_touch_parents ON "Show";
+DROP TRIGGER IF EXISTS show_delete_touch_parents ON "Show";
+DROP FUNCTION IF EXISTS fyyur_touch_show_parents();
+"""
+
+TRIGGERS = """
+CREATE FUNCTION fyyur_touch_show_parents() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    UPDATE "Venue" SET version = version WHERE id IN (SELECT venue_id FROM old_shows);
+    UPDATE "Artist" SET version = version WHERE id IN (SELECT artist_id FROM old_shows);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    UPDATE "Venue" SET version = version WHERE id IN (SELECT venue_id FROM new_shows);
+    UPDATE "Artist" SET version = version WHERE id IN (SELECT artist_id FROM new_shows);
+  END IF;
+  RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+CREATE TRIGGER show_insert_touch_parents AFTER INSERT ON "Show"
+  REFERENCING NEW TABLE AS new_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_touch_show_parents();
+CREATE TRIGGER show_update_touch_parents AFTER UPDATE ON "Show"
+  REFERENCING OLD TABLE AS old_shows NEW TABLE AS new_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_touch_show_parents();
+CREATE TRIGGER show_delete_touch_parents AFTER DELETE ON "Show"
+  REFERENCING OLD TABLE AS old_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_touch_show_parents();
+"""
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(DROP)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(TRIGGERS)
@@ -0,0 +1,38 @@
+"""Name prefix indexes in C collation for autocomplete order
+
+Revision ID: c5e8a1b4d7f2
+Revises: e4a7c1f9b362
+Create Date: 2026-10-18 21:40:12.360114
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e8a1b4d7f2'
+down_revision = 'e4a7c1f9b362'
+branch_labels = None
+depends_on = None
+
+
+# A text_pattern_ops index finds the names with a prefix but can't return
+# them in lower(name) order under the database collation, so completing a
+# common prefix sorted every match. In C collation one index does both;
+# search.Searcher.complete_query() uses the same expression.
+TABLES = ('Venue', 'Artist')
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        op.execute('DROP INDEX IF EXISTS ix_{}_name_prefix'.format(table.lower()))
+        op.execute('CREATE INDEX ix_{}_name_prefix ON "{}" ((lower(name) COLLATE "C"), id)'.format(table.lower(), table))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        op.execute('DROP INDEX IF EXISTS ix_{}_name_prefix'.format(table.lower()))
+        op.execute('CREATE INDEX ix_{}_name_prefix ON "{}" (lower(name) text_pattern_ops, id)'.format(table.lower(), table))
@@ -0,0 +1,144 @@
+"""Partition Show by start_time month
+
+Revision ID: d71a0c4e9b58
+Revises: b3d9e5f7a214
+Create Date: 2026-10-18 17:03:21.662093
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd71a0c4e9b58'
+down_revision = 'b3d9e5f7a214'
+branch_labels = None
+depends_on = None
+
+
+# months of empty partitions created ahead of the current one; later
+# months are added by 'flask partitions ensure' (see partitioning.py)
+MONTHS_AHEAD = 12
+
+COLUMNS = 'id, venue_id, artist_id, start_time, version, updated_at'
+
+INDEXES = (
+    ('ix_show_venue_id_start_time', ['venue_id', 'start_time']),
+    ('ix_show_artist_id_start_time', ['artist_id', 'start_time']),
+    ('ix_show_start_time_id', ['start_time', 'id']),
+)
+
+# the Show triggers of the earlier migrations; they stay on the parent,
+# where statement triggers see the rows of every partition
+TRIGGERS = """
+CREATE TRIGGER show_touch_row BEFORE UPDATE ON "Show" FOR EACH ROW EXECUTE PROCEDURE fyyur_touch_row();
+CREATE TRIGGER show_bump_table AFTER INSERT OR UPDATE OR DELETE ON "Show" FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_bump_table();
+CREATE TRIGGER show_insert_touch_parents AFTER INSERT ON "Show"
+  REFERENCING NEW TABLE AS new_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_touch_show_parents();
+CREATE TRIGGER show_update_touch_parents AFTER UPDATE ON "Show"
+  REFERENCING OLD TABLE AS old_shows NEW TABLE AS new_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_touch_show_parents();
+CREATE TRIGGER show_delete_touch_parents AFTER DELETE ON "Show"
+  REFERENCING OLD TABLE AS old_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_touch_show_parents();
+CREATE TRIGGER show_insert_count AFTER INSERT ON "Show"
+  REFERENCING NEW TABLE AS new_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_count_shows();
+CREATE TRIGGER show_update_count AFTER UPDATE ON "Show"
+  REFERENCING OLD TABLE AS old_shows NEW TABLE AS new_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_count_shows();
+CREATE TRIGGER show_delete_count AFTER DELETE ON "Show"
+  REFERENCING OLD TABLE AS old_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_count_shows();
+CREATE TRIGGER show_insert_bucket AFTER INSERT ON "Show"
+  REFERENCING NEW TABLE AS new_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_bucket_shows();
+CREATE TRIGGER show_update_bucket AFTER UPDATE ON "Show"
+  REFERENCING OLD TABLE AS old_shows NEW TABLE AS new_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_bucket_shows();
+CREATE TRIGGER show_delete_bucket AFTER DELETE ON "Show"
+  REFERENCING OLD TABLE AS old_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_bucket_shows();
+"""
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return 'Show_y%04dm%02d' % (month.year, month.month)
+
+
+def rebuild(create_table, after_create):
+    # move "Show" aside, create its replacement, copy the rows across
+    # before any trigger exists (the counters and buckets already hold
+    # them), then restore indexes and triggers and drop the old table
+    op.execute('ALTER TABLE "Show" RENAME TO "Show_old"')
+    op.execute('ALTER TABLE "Show_old" RENAME CONSTRAINT "Show_pkey" TO "Show_old_pkey"')
+    op.execute('DROP INDEX IF EXISTS ix_show_start_time_brin')
+    for name, _ in INDEXES:
+        op.execute('DROP INDEX IF EXISTS %s' % name)
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+    op.execute(create_table)
+    after_create()
+    op.execute('INSERT INTO "Show" (%s) SELECT %s FROM "Show_old"' % (COLUMNS, COLUMNS))
+    for name, columns in INDEXES:
+        op.create_index(name, 'Show', columns)
+    op.execute('DROP TABLE "Show_old"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    op.execute(TRIGGERS)
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    missing = bind.execute(sa.text('SELECT count(*) FROM "Show" WHERE start_time IS NULL')).scalar()
+    if missing:
+        raise RuntimeError('%d show(s) have no start_time; set or delete them before partitioning' % missing)
+
+    def create_partitions():
+        months = set(row[0].date() for row in bind.execute(sa.text(
+            'SELECT DISTINCT date_trunc(\'month\', start_time) FROM "Show_old"')))
+        current = date.today().replace(day=1)
+        months.update(add_months(current, count) for count in range(MONTHS_AHEAD + 1))
+        for month in sorted(months):
+            op.execute('CREATE TABLE "%s" PARTITION OF "Show" FOR VALUES FROM (\'%s\') TO (\'%s\')' % (
+                partition_name(month), month.isoformat(), add_months(month, 1).isoformat()))
+        # anything outside the monthly partitions, until 'partitions ensure'
+        # gives it a month of its own
+        op.execute('CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT')
+
+    # unique constraints must include the partition key, hence (id, start_time)
+    rebuild("""
+CREATE TABLE "Show" (
+  id integer NOT NULL DEFAULT nextval('"Show_id_seq"'::regclass),
+  venue_id integer REFERENCES "Venue" (id),
+  artist_id integer REFERENCES "Artist" (id),
+  start_time timestamp without time zone NOT NULL,
+  version integer NOT NULL DEFAULT 1,
+  updated_at timestamp without time zone NOT NULL DEFAULT now(),
+  CONSTRAINT "Show_pkey" PRIMARY KEY (id, start_time)
+) PARTITION BY RANGE (start_time)
+""", create_partitions)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    rebuild("""
+CREATE TABLE "Show" (
+  id integer NOT NULL DEFAULT nextval('"Show_id_seq"'::regclass),
+  venue_id integer REFERENCES "Venue" (id),
+  artist_id integer REFERENCES "Artist" (id),
+  start_time timestamp without time zone,
+  version integer NOT NULL DEFAULT 1,
+  updated_at timestamp without time zone NOT NULL DEFAULT now(),
+  CONSTRAINT "Show_pkey" PRIMARY KEY (id)
+)
+""", lambda: None)
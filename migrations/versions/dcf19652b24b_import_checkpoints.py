@@ -0,0 +1,29 @@
+"""Checkpoints for resumable bulk imports
+
+Revision ID: dcf19652b24b
+Revises: 43b5e0c36b0a
+Create Date: 2026-10-18 14:05:52.630114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'dcf19652b24b'
+down_revision = '43b5e0c36b0a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('import_checkpoints',
+    sa.Column('source', sa.String(), nullable=False),
+    sa.Column('record', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    sa.PrimaryKeyConstraint('source')
+    )
+
+
+def downgrade():
+    op.drop_table('import_checkpoints')
@@ -0,0 +1,110 @@
+"""Show bookings with exclusion constraints against double booking
+
+Revision ID: e4a7c1f9b362
+Revises: d71a0c4e9b58
+Create Date: 2026-10-18 19:24:37.508116
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a7c1f9b362'
+down_revision = 'd71a0c4e9b58'
+branch_labels = None
+depends_on = None
+
+
+# A show books its venue and its artist for SHOW_LENGTH from its start
+# (config.SHOW_LENGTH_MINUTES must agree). Show is partitioned by month and
+# an exclusion constraint can't span partitions, so the bookings are kept
+# in show_bookings by statement triggers on Show, like the counters and
+# buckets, under two exclusion constraints: one venue, or one artist, never
+# has two overlapping bookings. Ids are compared as single-point int4ranges
+# so the built-in range operator classes suffice (no btree_gist).
+#
+# With fyyur.unchecked_bookings on, a show overlapping an existing booking
+# is still inserted but left unbooked (bulk loads of synthetic or
+# historical data). The backfill below books existing shows the same way,
+# oldest id first.
+SHOW_LENGTH = '3 hours'
+
+TABLE = """
+CREATE TABLE show_bookings (
+  show_id integer PRIMARY KEY,
+  venue_id integer,
+  artist_id integer,
+  during tsrange NOT NULL,
+  CONSTRAINT show_bookings_venue_excl EXCLUDE USING gist
+    (int4range(venue_id, venue_id, '[]') WITH &&, during WITH &&) WHERE (venue_id IS NOT NULL),
+  CONSTRAINT show_bookings_artist_excl EXCLUDE USING gist
+    (int4range(artist_id, artist_id, '[]') WITH &&, during WITH &&) WHERE (artist_id IS NOT NULL)
+)
+"""
+
+FUNCTIONS = """
+CREATE FUNCTION fyyur_show_during(start_time timestamp) RETURNS tsrange AS $$
+  SELECT tsrange(start_time, start_time + interval '%s')
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE FUNCTION fyyur_book_shows() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    DELETE FROM show_bookings b USING old_shows o WHERE b.show_id = o.id;
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    IF current_setting('fyyur.unchecked_bookings', true) = 'on' THEN
+      INSERT INTO show_bookings (show_id, venue_id, artist_id, during)
+      SELECT id, venue_id, artist_id, fyyur_show_during(start_time) FROM new_shows ORDER BY id
+      ON CONFLICT DO NOTHING;
+    ELSE
+      INSERT INTO show_bookings (show_id, venue_id, artist_id, during)
+      SELECT id, venue_id, artist_id, fyyur_show_during(start_time) FROM new_shows;
+    END IF;
+  END IF;
+  RETURN NULL;
+END $$ LANGUAGE plpgsql;
+""" % SHOW_LENGTH
+
+TRIGGERS = """
+CREATE TRIGGER show_insert_book AFTER INSERT ON "Show"
+  REFERENCING NEW TABLE AS new_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_book_shows();
+CREATE TRIGGER show_update_book AFTER UPDATE ON "Show"
+  REFERENCING OLD TABLE AS old_shows NEW TABLE AS new_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_book_shows();
+CREATE TRIGGER show_delete_book AFTER DELETE ON "Show"
+  REFERENCING OLD TABLE AS old_shows
+  FOR EACH STATEMENT EXECUTE PROCEDURE fyyur_book_shows();
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS show_delete_book ON "Show";
+DROP TRIGGER IF EXISTS show_update_book ON "Show";
+DROP TRIGGER IF EXISTS show_insert_book ON "Show";
+DROP FUNCTION IF EXISTS fyyur_book_shows();
+DROP FUNCTION IF EXISTS fyyur_show_during(timestamp);
+"""
+
+BACKFILL = """
+INSERT INTO show_bookings (show_id, venue_id, artist_id, during)
+SELECT id, venue_id, artist_id, fyyur_show_during(start_time) FROM "Show" ORDER BY id
+ON CONFLICT DO NOTHING
+"""
+
+
+def upgrade():
+    # other databases rely on the check in scheduling.py alone
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute(TABLE)
+    op.execute(FUNCTIONS)
+    op.execute(BACKFILL)
+    op.execute(TRIGGERS)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute(DROP_TRIGGERS)
+    op.execute('DROP TABLE show_bookings')
@@ -0,0 +1,31 @@
+"""Indexes for show lookups and listing order
+
+Revision ID: f3ac996257a8
+Revises: 92095cde4302
+Create Date: 2026-10-18 11:02:17.914270
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3ac996257a8'
+down_revision = '92095cde4302'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_show_venue_id_start_time', 'Show', ['venue_id', 'start_time'])
+    op.create_index('ix_show_artist_id_start_time', 'Show', ['artist_id', 'start_time'])
+    op.create_index('ix_show_start_time_id', 'Show', ['start_time', 'id'])
+    op.create_index('ix_venue_state_city_name_id', 'Venue', ['state', 'city', 'name', 'id'])
+    op.create_index('ix_artist_name_id', 'Artist', ['name', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_artist_name_id', table_name='Artist')
+    op.drop_index('ix_venue_state_city_name_id', table_name='Venue')
+    op.drop_index('ix_show_start_time_id', table_name='Show')
+    op.drop_index('ix_show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_show_venue_id_start_time', table_name='Show')
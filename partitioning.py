@@ -0,0 +1,140 @@
+#----------------------------------------------------------------------------#
+# Monthly partitions of Show.
+#
+# Show is range-partitioned on start_time, one partition per calendar month
+# ("Show_y2026m10") plus "Show_default" for anything no month covers yet
+# (see the partition_shows_by_month migration). ensure() creates the months
+# ahead and moves rows out of the default partition into their own month;
+# archive() takes whole past months out of the live table, keeping the
+# show counters, per-day buckets and bookings in step.
+#
+# Both work on the partitions directly: statements on a partition fire none
+# of the statement triggers defined on the parent, so moving rows between
+# partitions leaves counters, buckets and versions alone.
+#----------------------------------------------------------------------------#
+
+import re
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+DEFAULT = 'Show_default'
+ARCHIVE_SCHEMA = 'archive'
+
+BOUNDS = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def month_floor(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return 'Show_y%04dm%02d' % (month.year, month.month)
+
+
+def parse_month(value):
+    # 'YYYY-MM' (or a full ISO date) -> the first day of that month
+    return month_floor(datetime.strptime(value[:7], '%Y-%m'))
+
+
+def is_partitioned(connection):
+    return connection.execute(text(
+        "SELECT relkind FROM pg_class WHERE oid = to_regclass('\"Show\"')")).scalar() == 'p'
+
+
+def partitions(connection):
+    # [(name, first day, first day after)] of the monthly partitions, oldest first
+    rows = connection.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass('\"Show\"')"))
+    found = []
+    for name, bound in rows:
+        match = BOUNDS.search(bound)
+        if match:
+            found.append((name, parse_month(match.group(1)), parse_month(match.group(2))))
+    return sorted(found, key=lambda partition: partition[1])
+
+
+def default_rows(connection):
+    return connection.execute(text('SELECT count(*) FROM "%s"' % DEFAULT)).scalar()
+
+
+def create(connection, month):
+    # a new month's partition; rows of that month waiting in the default
+    # partition move into it before it is attached. Returns the rows moved.
+    name, first, last = partition_name(month), month.isoformat(), add_months(month, 1).isoformat()
+    connection.execute(text('LOCK TABLE "%s" IN EXCLUSIVE MODE' % DEFAULT))
+    waiting = connection.execute(text(
+        'SELECT count(*) FROM "%s" WHERE start_time >= :first AND start_time < :last' % DEFAULT),
+        {'first': first, 'last': last}).scalar()
+    if not waiting:
+        connection.execute(text('CREATE TABLE "%s" PARTITION OF "Show" FOR VALUES FROM (\'%s\') TO (\'%s\')'
+                                % (name, first, last)))
+        return 0
+    connection.execute(text('CREATE TABLE "%s" (LIKE "Show" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)' % name))
+    connection.execute(text(
+        'WITH moved AS (DELETE FROM "%s" WHERE start_time >= :first AND start_time < :last RETURNING *) '
+        'INSERT INTO "%s" SELECT * FROM moved' % (DEFAULT, name)), {'first': first, 'last': last})
+    connection.execute(text('ALTER TABLE "Show" ATTACH PARTITION "%s" FOR VALUES FROM (\'%s\') TO (\'%s\')'
+                            % (name, first, last)))
+    return waiting
+
+
+def ensure(connection, months_ahead, today=None):
+    # every month from the current one to months_ahead later, and every
+    # month with rows in the default partition, gets its partition.
+    # Returns [(name, rows moved)] for the partitions created.
+    current = month_floor(today or datetime.utcnow())
+    wanted = set(add_months(current, count) for count in range(months_ahead + 1))
+    wanted.update(month_floor(month) for (month,) in connection.execute(text(
+        'SELECT DISTINCT date_trunc(\'month\', start_time) FROM "%s"' % DEFAULT)))
+    existing = set(first for _, first, _ in partitions(connection))
+    return [(partition_name(month), create(connection, month)) for month in sorted(wanted - existing)]
+
+
+def archive(connection, before, drop=False):
+    # detach every monthly partition ending on or before `before`, then move
+    # it to the archive schema (or drop it). Its shows leave the past
+    # counters, the per-day buckets and the bookings, as if deleted. Returns [(name, rows)].
+    # Holding show_counters FOR UPDATE keeps Show writers and the counter
+    # roll out until the caller commits.
+    rolled_to = connection.execute(text(
+        'SELECT rolled_to FROM show_counters WHERE id = 1 FOR UPDATE')).scalar()
+    if before > rolled_to.date():
+        raise ValueError('shows before %s are not all counted as past yet (counters rolled to %s)'
+                         % (before, rolled_to))
+    archived = []
+    for name, first, last in partitions(connection):
+        if last > before:
+            continue
+        rows = connection.execute(text('SELECT count(*) FROM "%s"' % name)).scalar()
+        for table, key in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+            connection.execute(text(
+                'UPDATE "%(table)s" t SET past_shows_count = t.past_shows_count - d.n '
+                'FROM (SELECT %(key)s, count(*) AS n FROM "%(name)s" GROUP BY %(key)s) d '
+                'WHERE t.id = d.%(key)s' % {'table': table, 'key': key, 'name': name}))
+        connection.execute(text('DELETE FROM show_days WHERE day >= :first AND day < :last'),
+                           {'first': first, 'last': last})
+        connection.execute(text('DELETE FROM show_bookings b USING "%s" s WHERE b.show_id = s.id' % name))
+        connection.execute(text('ALTER TABLE "Show" DETACH PARTITION "%s"' % name))
+        if drop:
+            connection.execute(text('DROP TABLE "%s"' % name))
+        else:
+            # archived rows must not keep their venues and artists from being deleted
+            constraints = connection.execute(text(
+                "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:name) AND contype = 'f'"),
+                {'name': '"%s"' % name}).scalars().all()
+            for constraint in constraints:
+                connection.execute(text('ALTER TABLE "%s" DROP CONSTRAINT "%s"' % (name, constraint)))
+            connection.execute(text('CREATE SCHEMA IF NOT EXISTS %s' % ARCHIVE_SCHEMA))
+            connection.execute(text('ALTER TABLE "%s" SET SCHEMA %s' % (name, ARCHIVE_SCHEMA)))
+        archived.append((name, rows))
+    if archived:
+        connection.execute(text(
+            "UPDATE table_versions SET version = version + 1, updated_at = timezone('utc', now()) WHERE name = 'Show'"))
+    return archived
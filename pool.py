@@ -0,0 +1,197 @@
+#----------------------------------------------------------------------------#
+# Database engine configuration and connection pool instrumentation.
+#
+# engine_options() turns the DB_* settings in config.py (read from the
+# environment) into SQLAlchemy engine options. Pool checkouts are timed by
+# InstrumentedPool, and pool_stats() reports them together with the pool's
+# occupancy for /healthz and /readyz.
+#
+# With DB_PGBOUNCER on, PgBouncer is assumed to run in transaction pooling
+# mode: consecutive transactions may land on different server connections,
+# so no session state is relied on. statement_timeout is then set with
+# SET LOCAL at the start of each transaction rather than as a startup
+# parameter, which PgBouncer refuses.
+#
+# The readiness probe runs on a one-connection engine of its own, so it
+# never waits for, or takes, a connection meant for requests. It also
+# fails while an extension in DB_EXTENSIONS is not installed.
+#----------------------------------------------------------------------------#
+
+import threading
+import time
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+
+class InstrumentedPool(QueuePool):
+    # a QueuePool recording how long checkouts wait for a free connection
+
+    def __init__(self, *args, **kwargs):
+        super(InstrumentedPool, self).__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.stats = {'checkouts': 0, 'wait_seconds_total': 0.0, 'wait_seconds_max': 0.0,
+                      'timeouts': 0, 'connects': 0, 'invalidations': 0}
+        event.listen(self, 'connect', lambda *args: self._count('connects'))
+        event.listen(self, 'invalidate', lambda *args: self._count('invalidations'))
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def _do_get(self):
+        started = time.monotonic()
+        try:
+            connection = super(InstrumentedPool, self)._do_get()
+        except PoolTimeout:
+            self._count('timeouts')
+            raise
+        waited = time.monotonic() - started
+        with self.lock:
+            self.stats['checkouts'] += 1
+            self.stats['wait_seconds_total'] += waited
+            self.stats['wait_seconds_max'] = max(self.stats['wait_seconds_max'], waited)
+        return connection
+
+
+def engine_options(config):
+    options = {
+        'poolclass': InstrumentedPool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if config['DB_STATEMENT_TIMEOUT_MS'] and not config['DB_PGBOUNCER']:
+        options['connect_args'] = {'options': '-c statement_timeout=%d' % config['DB_STATEMENT_TIMEOUT_MS']}
+    return options
+
+
+def async_url(url, config):
+    # the same database through asyncpg (asgi.py); PgBouncer in transaction
+    # mode can't keep prepared statements across transactions
+    url = make_url(url).set(drivername='postgresql+asyncpg')
+    if config['DB_PGBOUNCER']:
+        url = url.update_query_dict({'prepared_statement_cache_size': '0'})
+    return url
+
+
+def async_engine_options(config):
+    # engine_options() for create_async_engine(); the pool is the default
+    # asyncio-aware QueuePool, and asyncpg takes startup settings its own way
+    options = engine_options(config)
+    del options['poolclass']
+    options.pop('connect_args', None)
+    if config['DB_PGBOUNCER']:
+        options['connect_args'] = {'statement_cache_size': 0}
+    elif config['DB_STATEMENT_TIMEOUT_MS']:
+        options['connect_args'] = {'server_settings': {'statement_timeout': str(config['DB_STATEMENT_TIMEOUT_MS'])}}
+    return options
+
+
+def set_local_timeout(engine, milliseconds):
+    # runs on the raw DBAPI connection, which opens the transaction itself
+    @event.listens_for(engine, 'begin')
+    def begin(connection):
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute('SET LOCAL statement_timeout = %d' % milliseconds)
+        finally:
+            cursor.close()
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {
+        'size': pool.size(),
+        'max_overflow': pool._max_overflow,
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        'overflow': max(pool.overflow(), 0),
+    }
+    if isinstance(pool, InstrumentedPool):
+        with pool.lock:
+            stats.update(pool.stats)
+    return stats
+
+
+def prometheus(engine):
+    stats = pool_stats(engine)
+    lines = [
+        '# HELP fyyur_db_pool_connections Pooled connections by state.',
+        '# TYPE fyyur_db_pool_connections gauge',
+        'fyyur_db_pool_connections{state="checked_out"} %d' % stats['checked_out'],
+        'fyyur_db_pool_connections{state="checked_in"} %d' % stats['checked_in'],
+        'fyyur_db_pool_connections{state="overflow"} %d' % stats['overflow'],
+    ]
+    if 'checkouts' in stats:
+        lines += [
+            '# HELP fyyur_db_pool_wait_seconds Time spent waiting for a pooled connection.',
+            '# TYPE fyyur_db_pool_wait_seconds summary',
+            'fyyur_db_pool_wait_seconds_sum %r' % stats['wait_seconds_total'],
+            'fyyur_db_pool_wait_seconds_count %d' % stats['checkouts'],
+            '# HELP fyyur_db_pool_timeouts_total Checkouts that gave up after DB_POOL_TIMEOUT.',
+            '# TYPE fyyur_db_pool_timeouts_total counter',
+            'fyyur_db_pool_timeouts_total %d' % stats['timeouts'],
+            '# HELP fyyur_db_pool_invalidations_total Connections discarded as broken or stale.',
+            '# TYPE fyyur_db_pool_invalidations_total counter',
+            'fyyur_db_pool_invalidations_total %d' % stats['invalidations'],
+        ]
+    return '\n'.join(lines) + '\n'
+
+
+MISSING_EXTENSIONS = text(
+    'SELECT name FROM unnest(CAST(:names AS text[])) AS name '
+    'WHERE name NOT IN (SELECT extname FROM pg_extension) ORDER BY name')
+
+
+def missing_extensions(connection, names):
+    return [name for (name,) in connection.execute(MISSING_EXTENSIONS, {'names': list(names)})]
+
+
+class ReadinessProbe(object):
+
+    def __init__(self, url, timeout_ms, pgbouncer=False, extensions=()):
+        seconds = max(1, -(-timeout_ms // 1000))
+        connect_args = {'connect_timeout': seconds}
+        if not pgbouncer:
+            connect_args['options'] = '-c statement_timeout=%d' % timeout_ms
+        self.engine = create_engine(url, pool_size=1, max_overflow=0, pool_timeout=seconds,
+                                    connect_args=connect_args)
+        self.extensions = list(extensions)
+
+    def check(self):
+        # (ok, details)
+        started = time.monotonic()
+        try:
+            with self.engine.connect() as connection:
+                missing = missing_extensions(connection, self.extensions)
+        except SQLAlchemyError as e:
+            return False, {'error': str(getattr(e, 'orig', None) or e).strip().splitlines()[0]}
+        if missing:
+            return False, {'error': 'missing extension(s): %s' % ', '.join(missing)}
+        return True, {'latency_ms': round((time.monotonic() - started) * 1000, 1)}
+
+
+def init_app(app, db):
+    config = app.config
+    config.setdefault('DB_POOL_SIZE', 5)
+    config.setdefault('DB_MAX_OVERFLOW', 10)
+    config.setdefault('DB_POOL_TIMEOUT', 30)
+    config.setdefault('DB_POOL_RECYCLE', 1800)
+    config.setdefault('DB_POOL_PRE_PING', True)
+    config.setdefault('DB_STATEMENT_TIMEOUT_MS', 0)
+    config.setdefault('DB_PGBOUNCER', False)
+    config.setdefault('DB_PROBE_TIMEOUT_MS', 1000)
+    config.setdefault('DB_EXTENSIONS', [])
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(engine_options(config), **config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    with app.app_context():
+        engine = db.engine
+    if config['DB_PGBOUNCER'] and config['DB_STATEMENT_TIMEOUT_MS']:
+        set_local_timeout(engine, config['DB_STATEMENT_TIMEOUT_MS'])
+    app.extensions['readiness_probe'] = ReadinessProbe(engine.url, config['DB_PROBE_TIMEOUT_MS'], config['DB_PGBOUNCER'],
+                                                       config['DB_EXTENSIONS'])
@@ -0,0 +1,146 @@
+#----------------------------------------------------------------------------#
+# Show scheduling without double bookings.
+#
+# A show books its venue and its artist for SHOW_LENGTH_MINUTES from its
+# start. On PostgreSQL every booking is also a row of show_bookings (see
+# the show_bookings migration), whose exclusion constraints reject two
+# overlapping bookings of one venue or one artist whichever way the shows
+# are written. A batch is checked as a whole before it is inserted, so
+# every conflicting row is reported rather than the first one the
+# constraint trips on.
+#
+# Rows are taken in batch order: a row conflicts when it overlaps an
+# existing booking or a row accepted earlier in the same batch. Existing
+# bookings are found by one query for the whole batch, an index probe per
+# row, so a batch costs the same however busy its venues already are.
+#----------------------------------------------------------------------------#
+
+import bisect
+from datetime import datetime, timezone
+
+from sqlalchemy import or_, select, text
+
+EXCLUSION_VIOLATION = '23P01'
+INSERT_CHUNK = 1000
+
+BOOKED = text("""
+WITH b AS (
+  SELECT * FROM unnest(CAST(:i AS integer[]), CAST(:venue_id AS integer[]),
+                       CAST(:artist_id AS integer[]), CAST(:start_time AS timestamp[]))
+    AS b(i, venue_id, artist_id, start_time)
+)
+SELECT b.i, 'venue' AS field, k.show_id, lower(k.during) AS start_time
+  FROM b JOIN show_bookings k
+    ON k.venue_id IS NOT NULL
+   AND int4range(k.venue_id, k.venue_id, '[]') && int4range(b.venue_id, b.venue_id, '[]')
+   AND k.during && fyyur_show_during(b.start_time)
+UNION ALL
+SELECT b.i, 'artist', k.show_id, lower(k.during)
+  FROM b JOIN show_bookings k
+    ON k.artist_id IS NOT NULL
+   AND int4range(k.artist_id, k.artist_id, '[]') && int4range(b.artist_id, b.artist_id, '[]')
+   AND k.during && fyyur_show_during(b.start_time)
+""")
+
+
+def parse(data):
+    # (row, errors) for one requested show; row is None when errors
+    if not isinstance(data, dict):
+        return None, {'show': ['Not an object.']}
+    row, errors = {}, {}
+    for field in ('venue_id', 'artist_id'):
+        value = data.get(field)
+        try:
+            if isinstance(value, (bool, float)):
+                raise TypeError(value)
+            row[field] = int(value)
+        except (TypeError, ValueError):
+            errors[field] = ['Not a valid id.']
+    try:
+        start_time = datetime.fromisoformat(data.get('start_time'))
+    except (TypeError, ValueError):
+        errors['start_time'] = ['Not a valid ISO 8601 date and time.']
+    else:
+        if start_time.tzinfo is not None:
+            start_time = start_time.astimezone(timezone.utc).replace(tzinfo=None)
+        row['start_time'] = start_time
+    return (None, errors) if errors else (row, {})
+
+
+def booked_conflicts(connection, table, rows, length):
+    # {index: [conflict]} for rows ({index: row}) overlapping existing shows
+    conflicts = {}
+    if connection.dialect.name == 'postgresql':
+        indexes = sorted(rows)
+        found = connection.execute(BOOKED, {
+            'i': indexes,
+            'venue_id': [rows[index]['venue_id'] for index in indexes],
+            'artist_id': [rows[index]['artist_id'] for index in indexes],
+            'start_time': [rows[index]['start_time'] for index in indexes]})
+        for index, field, show_id, start_time in found:
+            conflicts.setdefault(index, []).append(
+                {'on': field, 'show_id': show_id, 'start_time': start_time})
+    else:
+        # no bookings table: a range query on Show per row
+        for index, row in rows.items():
+            found = connection.execute(
+                select(table.c.id, table.c.venue_id, table.c.artist_id, table.c.start_time).where(
+                    table.c.start_time > row['start_time'] - length,
+                    table.c.start_time < row['start_time'] + length,
+                    or_(table.c.venue_id == row['venue_id'], table.c.artist_id == row['artist_id'])))
+            for show_id, venue_id, artist_id, start_time in found:
+                for field, value in (('venue', venue_id), ('artist', artist_id)):
+                    if value == row[field + '_id']:
+                        conflicts.setdefault(index, []).append(
+                            {'on': field, 'show_id': show_id, 'start_time': start_time})
+    for found in conflicts.values():
+        found.sort(key=lambda conflict: (conflict['start_time'], conflict['on']))
+    return conflicts
+
+
+def batch_conflicts(rows, length, rejected=()):
+    # {index: [conflict]} for rows overlapping a row accepted before them;
+    # rows in `rejected` are skipped and block nothing
+    accepted = {'venue': {}, 'artist': {}}
+    conflicts = {}
+    for index in sorted(rows):
+        if index in rejected:
+            continue
+        row = rows[index]
+        found = []
+        for field, booked in accepted.items():
+            # accepted starts of one venue or artist are at least `length`
+            # apart, so only the neighbours on either side can overlap
+            starts = booked.get(row[field + '_id'], [])
+            position = bisect.bisect_left(starts, (row['start_time'],))
+            for start_time, other in starts[max(position - 1, 0):position + 1]:
+                if abs(start_time - row['start_time']) < length:
+                    found.append({'on': field, 'index': other, 'start_time': start_time})
+        if found:
+            conflicts[index] = found
+            continue
+        for field, booked in accepted.items():
+            bisect.insort(booked.setdefault(row[field + '_id'], []), (row['start_time'], index))
+    return conflicts
+
+
+def insert(connection, table, rows):
+    # ids of the inserted rows, in order
+    if connection.dialect.name != 'postgresql':
+        return [connection.execute(table.insert().values(row)).inserted_primary_key[0] for row in rows]
+    ids = []
+    for start in range(0, len(rows), INSERT_CHUNK):
+        ids.extend(connection.execute(
+            table.insert().values(rows[start:start + INSERT_CHUNK]).returning(table.c.id)).scalars())
+    return ids
+
+
+def booking_length(connection):
+    # how long the show_bookings migration books a show for (PostgreSQL)
+    return connection.execute(text(
+        'SELECT upper(d) - lower(d) FROM fyyur_show_during(LOCALTIMESTAMP) AS d')).scalar()
+
+
+def is_conflict(error):
+    # an exclusion violation: someone booked the same slot since the check
+    return getattr(getattr(error, 'orig', None), 'pgcode', None) == EXCLUSION_VIOLATION
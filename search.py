@@ -0,0 +1,70 @@
+#----------------------------------------------------------------------------#
+# Venue and artist search.
+#
+# Searches are answered from the pg_trgm / tsvector / array indexes added
+# by the search indexes migration and ranked in the database. pg_trgm is
+# required: the migration refuses to run without it, and /readyz and
+# 'flask check-plans' report a database where it is missing (see
+# DB_EXTENSIONS in config.py).
+#----------------------------------------------------------------------------#
+
+from sqlalchemy import cast, func, literal_column, or_, select, Float, String
+from sqlalchemy.dialects.postgresql import array
+
+# constants of the indexed tsvector expression are inlined rather than
+# bound: drivers with server-side parameters (asyncpg, see asgi.py) would
+# otherwise send them typed, and neither to_tsvector() nor the expression
+# index would match
+SIMPLE = literal_column("'simple'")
+EMPTY = literal_column("''", String)
+SPACE = literal_column("' '", String)
+
+
+def like_escape(term):
+    # escape LIKE wildcards in user input; used with escape='\\'
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class Searcher(object):
+    # match/rank expressions for one model; rank is ascending (best first)
+
+    def __init__(self, db, model, genres=()):
+        self.db = db
+        self.model = model
+        self.genres = {genre.lower(): genre for genre in genres}
+
+    def document(self):
+        model = self.model
+        return func.to_tsvector(SIMPLE, func.coalesce(model.name, EMPTY) + SPACE + func.coalesce(model.city, EMPTY))
+
+    def search(self, term):
+        # (criterion, rank) expressions for term; rank is labelled 'rank'
+        # so it can serve as a keyset pagination key
+        model = self.model
+        pattern = '%' + like_escape(term) + '%'
+        query = func.plainto_tsquery(SIMPLE, term)
+        clauses = [
+            model.name.ilike(pattern, escape='\\'),
+            model.city.ilike(pattern, escape='\\'),
+            self.document().op('@@')(query),
+        ]
+        genre = self.genres.get(term.strip().lower())
+        if genre:
+            clauses.append(model.genres.op('@>')(cast(array([genre]), model.genres.type)))
+        score = func.coalesce(func.word_similarity(term, model.name), 0) + \
+            func.ts_rank(self.document(), query)
+        return or_(*clauses), cast(-score, Float).label('rank')
+
+    def complete_query(self, prefix, limit=10):
+        # the query behind complete()
+        # lower(name) in C collation, as indexed (see the name prefix migration)
+        model = self.model
+        key = func.lower(model.name).collate('C')
+        return select(model.id, model.name) \
+            .where(key.like(like_escape(prefix.lower()) + '%', escape='\\')) \
+            .order_by(key, model.id) \
+            .limit(limit)
+
+    def complete(self, prefix, limit=10):
+        # (id, name) pairs whose name starts with prefix, case-insensitively
+        return [(row.id, row.name) for row in self.db.session.execute(self.complete_query(prefix, limit))]
@@ -2,3 +2,11 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Format <time data-format> elements emitted when CLIENT_SIDE_DATETIMES is on.
+document.addEventListener('DOMContentLoaded', function() {
+  var times = document.querySelectorAll('time[data-format]');
+  for (var i = 0; i < times.length; i++) {
+    times[i].textContent = moment(times[i].getAttribute('datetime')).format(times[i].getAttribute('data-format'));
+  }
+});
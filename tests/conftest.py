@@ -0,0 +1,18 @@
+import os
+
+import pytest
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'postgresql: needs the migrated, seeded PostgreSQL database in DATABASE_URL')
+
+
+def pytest_collection_modifyitems(config, items):
+    # app.py connects to DATABASE_URL; without one pointing at PostgreSQL
+    # only the tests that need no database run
+    if os.environ.get('DATABASE_URL', '').startswith('postgresql'):
+        return
+    skip = pytest.mark.skip(reason='DATABASE_URL is not a PostgreSQL database')
+    for item in items:
+        if 'postgresql' in item.keywords:
+            item.add_marker(skip)
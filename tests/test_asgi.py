@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+
+import app as fyyur
+
+pytestmark = pytest.mark.postgresql
+
+
+@pytest.fixture(autouse=True)
+def no_page_cache(monkeypatch):
+    # otherwise one server would answer with the page the other cached
+    monkeypatch.setitem(fyyur.app.config, 'CACHE_ENABLED', False)
+
+
+def first_id(model):
+    with fyyur.app.app_context():
+        return fyyur.db.session.execute(select(func.min(model.id))).scalar()
+
+
+def asgi_get(path, query=''):
+    # (status, ETag, body) of a GET served by asgi.py's event loop routes
+    import asgi
+    messages = []
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': query.encode(), 'headers': []}
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    async def get():
+        try:
+            await asgi.application(scope, receive, send)
+        finally:
+            await asgi.application.reads.engine.dispose()
+
+    asyncio.run(get())
+    headers = dict(messages[0]['headers'])
+    etag = headers.get(b'etag')
+    return messages[0]['status'], etag.decode() if etag else None, b''.join(m.get('body', b'') for m in messages[1:])
+
+
+def wsgi_get(path, query=''):
+    response = fyyur.app.test_client().get(path, query_string=query)
+    return response.status_code, response.headers.get('ETag'), response.data
+
+
+@pytest.mark.parametrize('path, query', [
+    ('/venues', ''),
+    ('/venues/search', 'search_term=music'),
+    ('/artists/search', 'search_term=blue+wolf'),
+    ('/artists', 'limit=10'),
+    ('/shows', ''),
+    ('/search/autocomplete', 'q=a'),
+    ('/venues/0', ''),
+])
+def test_read_route_matches_wsgi(path, query):
+    assert asgi_get(path, query) == wsgi_get(path, query)
+
+
+@pytest.mark.parametrize('model, path', [(fyyur.Venue, '/venues/%d'), (fyyur.Artist, '/artists/%d')])
+def test_detail_page_matches_wsgi(model, path):
+    path = path % (first_id(model) or 0)
+    assert asgi_get(path) == wsgi_get(path)
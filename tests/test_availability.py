@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+from availability import free_slots
+
+START, END = datetime(2026, 1, 1), datetime(2026, 1, 2)
+HOURS = timedelta(hours=3)
+
+
+def at(hour):
+    return START + timedelta(hours=hour)
+
+
+def test_no_shows_is_one_free_slot():
+    assert free_slots([(1, None)], START, END, HOURS, HOURS) == {1: [(START, END)]}
+
+
+def test_gaps_between_shows():
+    rows = [(1, at(4)), (1, at(10)), (2, None)]
+    assert free_slots(rows, START, END, HOURS, HOURS) == {
+        1: [(START, at(4)), (at(7), at(10)), (at(13), END)],
+        2: [(START, END)],
+    }
+
+
+def test_short_gaps_left_out():
+    rows = [(1, at(2)), (1, at(7))]
+    assert free_slots(rows, START, END, HOURS, HOURS) == {1: [(at(10), END)]}
+    assert free_slots(rows, START, END, HOURS, timedelta(hours=1)) == {
+        1: [(START, at(2)), (at(5), at(7)), (at(10), END)]}
+
+
+def test_shows_crossing_the_window_edges():
+    rows = [(1, at(-1)), (1, at(22))]
+    assert free_slots(rows, START, END, HOURS, HOURS) == {1: [(at(2), at(22))]}
+
+
+def test_overlapping_shows_extend_the_busy_time():
+    rows = [(1, at(2)), (1, at(3)), (1, at(4))]
+    assert free_slots(rows, START, END, HOURS, HOURS) == {1: [(at(7), END)]}
+
+
+def test_no_rows():
+    assert free_slots([], START, END, HOURS, HOURS) == {}
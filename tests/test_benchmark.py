@@ -0,0 +1,31 @@
+from flask import Flask, abort
+
+import benchmark
+
+
+def test_percentile():
+    assert benchmark.percentile([], 0.5) is None
+    assert benchmark.percentile([1, 2, 3, 4], 0.5) == 2
+    assert benchmark.percentile([1, 2, 3, 4], 0.99) == 4
+
+
+def test_errors_left_out_of_latencies():
+    app = Flask(__name__)
+    calls = [0]
+
+    @app.route('/flaky')
+    def flaky():
+        calls[0] += 1
+        if calls[0] % 2:
+            abort(500)
+        return 'ok'
+
+    summary = benchmark.run_client(app, ['/flaky'], 10, warmup=0)['/flaky']
+    assert summary['requests'] == 10
+    assert summary['errors'] == 5
+    assert summary['p50_ms'] is not None
+
+
+def test_only_errors_has_no_latencies():
+    summary = benchmark.summarize([], 3, 1.0)
+    assert (summary['requests'], summary['errors'], summary['p99_ms'], summary['mean_ms']) == (3, 3, None, None)
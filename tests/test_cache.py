@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from flask import Flask
+
+from cache import PageCache, conditional
+
+
+@pytest.fixture
+def page(tmp_path):
+    # a page cached under conditional(), with its ETag and Last-Modified
+    # taken from `state`; `state['renders']` counts the view calls
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.config['CACHE_DIR'] = str(tmp_path)
+    cache = PageCache(app)
+    state = {'version': '1', 'modified': datetime(2026, 1, 1, 12), 'renders': 0}
+
+    @app.route('/page')
+    @conditional(lambda: (state['version'], state['modified']))
+    @cache.cached(lambda: ['page'])
+    def view():
+        state['renders'] += 1
+        return 'version ' + state['version']
+
+    return app.test_client(), state
+
+
+def test_cached_page(page):
+    client, state = page
+    assert client.get('/page').get_data(as_text=True) == 'version 1'
+    assert client.get('/page').get_data(as_text=True) == 'version 1'
+    assert state['renders'] == 1
+
+
+def test_revalidation_answered_with_304(page):
+    client, state = page
+    etag = client.get('/page').headers['ETag']
+    response = client.get('/page', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert state['renders'] == 1
+
+
+def test_new_validator_never_serves_the_cached_body(page):
+    # the version changes without an invalidate(), as when a show moves
+    # from upcoming to past
+    client, state = page
+    old = client.get('/page').headers['ETag']
+    state['version'] = '2'
+    response = client.get('/page', headers={'If-None-Match': old})
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == 'version 2'
+    assert response.headers['ETag'] == '"2"'
+    assert client.get('/page', headers={'If-None-Match': '"2"'}).status_code == 304
+
+
+@pytest.mark.parametrize('modified', [
+    datetime(2026, 1, 1, 12),
+    datetime(2026, 1, 1, 12, tzinfo=timezone.utc),
+    datetime(2026, 1, 1, 14, tzinfo=timezone(timedelta(hours=2))),
+])
+def test_last_modified_naive_or_aware(page, modified):
+    client, state = page
+    state['modified'] = modified
+    response = client.get('/page')
+    assert response.headers['Last-Modified'] == 'Thu, 01 Jan 2026 12:00:00 GMT'
+    since = response.headers['Last-Modified']
+    assert client.get('/page', headers={'If-Modified-Since': since}).status_code == 304
+    earlier = 'Thu, 01 Jan 2026 11:59:59 GMT'
+    assert client.get('/page', headers={'If-Modified-Since': earlier}).status_code == 200
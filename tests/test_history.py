@@ -0,0 +1,28 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import app as fyyur
+
+Entity = namedtuple('Entity', 'past_shows_count')
+
+
+def test_detail_pages_bound_past_shows_by_default():
+    (criterion,) = fyyur.history_criteria()
+    cutoff = criterion.right.value
+    expected = datetime.utcnow() - timedelta(days=fyyur.app.config['SHOW_HISTORY_DAYS'])
+    assert abs(cutoff - expected) < timedelta(minutes=1)
+
+
+def test_unbounded_history(monkeypatch):
+    monkeypatch.setitem(fyyur.app.config, 'SHOW_HISTORY_DAYS', None)
+    assert fyyur.history_criteria() == []
+    data = {"past_shows_count": 3}
+    fyyur.limit_history(data, Entity(40))
+    assert data == {"past_shows_count": 3}
+
+
+def test_limited_history_keeps_the_full_count(monkeypatch):
+    monkeypatch.setitem(fyyur.app.config, 'SHOW_HISTORY_DAYS', 30)
+    data = {"past_shows_count": 3}
+    fyyur.limit_history(data, Entity(40))
+    assert data == {"past_shows_count": 40, "past_shows_days": 30}
@@ -0,0 +1,33 @@
+from datetime import datetime
+
+import pytest
+from werkzeug.exceptions import BadRequest
+
+import app as fyyur
+
+
+def test_cursor_round_trip():
+    values = [datetime(2026, 5, 1, 20, 30), 42]
+    cursor = fyyur.encode_cursor('n', values)
+    assert '=' not in cursor
+    with fyyur.app.test_request_context():
+        assert fyyur.decode_cursor(cursor, fyyur.SHOW_KEYS) == (True, values)
+
+
+def test_cursor_backwards_with_null_key():
+    cursor = fyyur.encode_cursor('p', [None, 'Blue Owl', 7])
+    with fyyur.app.test_request_context():
+        assert fyyur.decode_cursor(cursor, fyyur.VENUE_KEYS[1:]) == (False, [None, 'Blue Owl', 7])
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64!',
+    fyyur.encode_cursor('x', [datetime(2026, 5, 1), 1]),
+    fyyur.encode_cursor('n', [1]),
+    fyyur.encode_cursor('n', ['yesterday', 1]),
+])
+def test_malformed_cursor(cursor):
+    with fyyur.app.test_request_context():
+        with pytest.raises(BadRequest):
+            fyyur.decode_cursor(cursor, fyyur.SHOW_KEYS)
+
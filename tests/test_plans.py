@@ -0,0 +1,12 @@
+import pytest
+
+import app as fyyur
+
+pytestmark = pytest.mark.postgresql
+
+
+def test_read_routes_use_indexes():
+    # 'flask check-plans' EXPLAINs every read route's queries with
+    # enable_seqscan off and fails on any sequential scan
+    result = fyyur.app.test_cli_runner().invoke(args=['check-plans'])
+    assert result.exit_code == 0, result.output
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+
+import pytest
+from werkzeug.exceptions import BadRequest
+
+import app as fyyur
+
+
+def args(query, function, *params):
+    with fyyur.app.test_request_context('/?' + query):
+        return function(*params)
+
+
+def test_datetime_arg_naive():
+    assert args('from=2026-01-01T20:00:00', fyyur.datetime_arg, 'from') == datetime(2026, 1, 1, 20)
+
+
+def test_datetime_arg_offset_becomes_naive_utc():
+    value = args('from=2026-01-01T20:00:00%2B02:00', fyyur.datetime_arg, 'from')
+    assert value == datetime(2026, 1, 1, 18)
+    assert value.tzinfo is None
+
+
+def test_datetime_arg_invalid():
+    with pytest.raises(BadRequest):
+        args('from=soon', fyyur.datetime_arg, 'from')
+
+
+def test_availability_args_mixed_offsets():
+    start, end, minimum = args('from=2026-01-01T00:00:00%2B01:00&to=2026-01-05', fyyur.availability_args)
+    assert (start, end) == (datetime(2025, 12, 31, 23), datetime(2026, 1, 6))
+    start, end, minimum = args('from=2026-01-01&to=2026-01-02T00:00:00-05:00', fyyur.availability_args)
+    assert (start, end) == (datetime(2026, 1, 1), datetime(2026, 1, 2, 5))
+    assert minimum == timedelta(minutes=fyyur.app.config['SHOW_LENGTH_MINUTES'])
+
+
+def test_availability_args_window_too_long():
+    with pytest.raises(BadRequest):
+        args('from=2026-01-01&to=2027-01-01', fyyur.availability_args)
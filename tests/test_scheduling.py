@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from scheduling import batch_conflicts, booking_length, parse
+
+HOURS = timedelta(hours=3)
+
+
+def show(venue_id, artist_id, hour):
+    return {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': datetime(2026, 1, 1) + timedelta(hours=hour)}
+
+
+def test_parse():
+    row, errors = parse({'venue_id': '1', 'artist_id': 2, 'start_time': '2026-01-01T20:00:00'})
+    assert errors == {}
+    assert row == {'venue_id': 1, 'artist_id': 2, 'start_time': datetime(2026, 1, 1, 20)}
+
+
+def test_parse_offset_becomes_naive_utc():
+    row, errors = parse({'venue_id': 1, 'artist_id': 2, 'start_time': '2026-01-01T20:00:00-05:00'})
+    assert row['start_time'] == datetime(2026, 1, 2, 1)
+    assert row['start_time'].tzinfo is None
+
+
+def test_parse_errors():
+    row, errors = parse({'venue_id': 1.5, 'artist_id': True, 'start_time': 'tonight'})
+    assert row is None
+    assert sorted(errors) == ['artist_id', 'start_time', 'venue_id']
+    assert parse([]) == (None, {'show': ['Not an object.']})
+
+
+def test_batch_without_conflicts():
+    rows = {0: show(1, 1, 0), 1: show(1, 2, 3), 2: show(2, 1, 3)}
+    assert batch_conflicts(rows, HOURS) == {}
+
+
+def test_batch_conflicts_in_batch_order():
+    rows = {0: show(1, 1, 10), 1: show(1, 2, 8), 2: show(2, 1, 12), 3: show(1, 3, 14)}
+    assert batch_conflicts(rows, HOURS) == {
+        1: [{'on': 'venue', 'index': 0, 'start_time': rows[0]['start_time']}],
+        2: [{'on': 'artist', 'index': 0, 'start_time': rows[0]['start_time']}],
+    }
+
+
+def test_conflicting_rows_block_nothing():
+    # row 1 is rejected, so row 2 only has to clear row 0
+    rows = {0: show(1, 1, 0), 1: show(1, 2, 2), 2: show(1, 3, 4)}
+    assert list(batch_conflicts(rows, HOURS)) == [1]
+
+
+def test_rejected_rows_are_skipped():
+    rows = {0: show(1, 1, 0), 1: show(1, 2, 1)}
+    assert batch_conflicts(rows, HOURS, rejected={0}) == {}
+
+
+@pytest.mark.postgresql
+def test_show_length_agrees_with_the_migration():
+    # the show_bookings migration fixes the length the exclusion
+    # constraints book a show for; it must be the one batches are checked with
+    import app as fyyur
+    with fyyur.app.app_context():
+        length = booking_length(fyyur.db.session.connection())
+        assert length == timedelta(minutes=fyyur.app.config['SHOW_LENGTH_MINUTES'])
@@ -0,0 +1,24 @@
+from collections import namedtuple
+
+import app as fyyur
+
+VenueRow = namedtuple('VenueRow', 'id name state city num_upcoming_shows')
+
+
+def test_group_venues_by_area():
+    rows = [
+        VenueRow(3, 'Park Square Live', 'CA', 'San Francisco', 1),
+        VenueRow(1, 'The Musical Hop', 'CA', 'San Francisco', 0),
+        VenueRow(2, 'The Dueling Pianos Bar', 'NY', 'New York', 2),
+    ]
+    assert fyyur.group_venues_by_area(rows) == [
+        {'city': 'San Francisco', 'state': 'CA', 'venues': [
+            {'id': 3, 'name': 'Park Square Live', 'num_upcoming_shows': 1},
+            {'id': 1, 'name': 'The Musical Hop', 'num_upcoming_shows': 0}]},
+        {'city': 'New York', 'state': 'NY', 'venues': [
+            {'id': 2, 'name': 'The Dueling Pianos Bar', 'num_upcoming_shows': 2}]},
+    ]
+
+
+def test_group_venues_by_area_empty():
+    assert fyyur.group_venues_by_area([]) == []
@@ -0,0 +1,69 @@
+#----------------------------------------------------------------------------#
+# Template bytecode cache and worker warm-up.
+#
+# Jinja compiles a template to Python source and then to bytecode the first
+# time a process loads it. With TEMPLATE_CACHE_DIR set, the bytecode is
+# kept on disk, so a new worker only unmarshals it. 'flask templates
+# compile' fills the cache for every template at deploy time, and
+# on_start() loads them all into the environment when a server starts,
+# before it takes requests, so no first request pays for either step.
+#
+# Jinja checks each cached entry against the template source and the
+# Python version, so stale entries are simply recompiled.
+#----------------------------------------------------------------------------#
+
+import os
+import time
+
+from jinja2 import FileSystemBytecodeCache
+
+
+def template_names(app):
+    return sorted(app.jinja_env.list_templates(extensions=['html']))
+
+
+def load_all(env, names):
+    # [(name, seconds)] to load each template into env
+    timings = []
+    for name in names:
+        started = time.perf_counter()
+        env.get_template(name)
+        timings.append((name, time.perf_counter() - started))
+    return timings
+
+
+def compile_all(app):
+    # rewrite the bytecode of every template; returns the timings of
+    # compiling from source and of loading the bytecode back
+    env, names = app.jinja_env, template_names(app)
+    cache = env.bytecode_cache
+    if cache is not None:
+        cache.clear()
+    compiled = load_all(env.overlay(cache_size=0), names)
+    loaded = load_all(env.overlay(cache_size=0), names) if cache is not None else None
+    return compiled, loaded
+
+
+def warm(app):
+    # load every template into the app's environment; returns the timings
+    started = time.perf_counter()
+    timings = load_all(app.jinja_env, template_names(app))
+    app.logger.info('loaded %d templates in %.1f ms (%s)', len(timings), (time.perf_counter() - started) * 1000,
+                    'bytecode cache' if app.jinja_env.bytecode_cache is not None else 'compiled')
+    return timings
+
+
+def on_start(app):
+    # called by the servers (app.py's __main__, asgi.py's lifespan startup)
+    # before they take requests; importing the app loads no templates
+    if app.config['TEMPLATE_WARMUP']:
+        warm(app)
+
+
+def init_app(app):
+    app.config.setdefault('TEMPLATE_CACHE_DIR', None)
+    app.config.setdefault('TEMPLATE_WARMUP', True)
+    directory = app.config['TEMPLATE_CACHE_DIR']
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)